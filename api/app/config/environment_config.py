@@ -25,3 +25,133 @@ class EnvironmentConfig:
             setattr(self, var, os.getenv(var))
         # 固定値も属性としてセット
         self.AZ_CONTAINER_NAME = "container-vr-dev"
+
+        # 任意の環境変数（未設定時はデフォルト値を使用）
+        self.UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 1024 * 1024))
+        self.UPLOAD_MAX_SIZE = int(os.getenv("UPLOAD_MAX_SIZE", 2 * 1024**3))
+        self.AUDIO_STREAMING_CONVERSION = (
+            os.getenv("AUDIO_STREAMING_CONVERSION", "true").lower() == "true"
+        )
+        self.AZ_BLOB_BLOCK_SIZE = int(os.getenv("AZ_BLOB_BLOCK_SIZE", 4 * 1024 * 1024))
+        self.AZ_BLOB_MAX_CONCURRENCY = int(os.getenv("AZ_BLOB_MAX_CONCURRENCY", 4))
+        # embedded: APIプロセス内でワーカーを起動 / external: app.worker を別プロセスで起動
+        self.JOB_WORKER_MODE = os.getenv("JOB_WORKER_MODE", "embedded")
+        # external の場合はワーカープロセスと共有するためSQLiteを既定にする
+        self.TASK_STORE_BACKEND = os.getenv(
+            "TASK_STORE_BACKEND",
+            "sqlite" if self.JOB_WORKER_MODE == "external" else "memory",
+        )
+        self.TASK_STORE_PATH = os.getenv("TASK_STORE_PATH", "tasks.sqlite3")
+        self.TASK_STORE_MAX_TASKS = int(os.getenv("TASK_STORE_MAX_TASKS", 1000))
+        self.TASK_STORE_TTL_SECONDS = float(os.getenv("TASK_STORE_TTL_SECONDS", 86400))
+        # 進捗イベント(SSE)のキープアライブ間隔。この間隔でタスクストアの状態も確認する
+        self.TASK_EVENT_KEEPALIVE_SECONDS = float(
+            os.getenv("TASK_EVENT_KEEPALIVE_SECONDS", 15)
+        )
+        # 進捗イベントの履歴を保持する時間(秒)とタスク数の上限
+        # 終了を別プロセスで迎えたタスクの履歴もこの範囲で破棄する
+        self.TASK_EVENT_HISTORY_TTL_SECONDS = float(
+            os.getenv("TASK_EVENT_HISTORY_TTL_SECONDS", 3600)
+        )
+        self.TASK_EVENT_HISTORY_MAX_TASKS = int(
+            os.getenv("TASK_EVENT_HISTORY_MAX_TASKS", 1000)
+        )
+        # 再起動後に処理中・未処理のジョブを再開できるようSQLiteを既定にする
+        self.JOB_QUEUE_BACKEND = os.getenv("JOB_QUEUE_BACKEND", "sqlite")
+        self.JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", "jobs.sqlite3")
+        if self.JOB_WORKER_MODE == "external":
+            # プロセス内のキュー・ストアは別プロセスのワーカーから見えず、ジョブが実行されない
+            memory_backends = [
+                name
+                for name in ("JOB_QUEUE_BACKEND", "TASK_STORE_BACKEND")
+                if getattr(self, name) == "memory"
+            ]
+            if memory_backends:
+                raise ValueError(
+                    "JOB_WORKER_MODE=external requires sqlite backends: "
+                    f"{', '.join(name + '=memory' for name in memory_backends)}"
+                )
+        self.JOB_WORKERS = int(os.getenv("JOB_WORKERS", 2))
+        self.JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+        self.JOB_RETRY_BACKOFF_SECONDS = float(os.getenv("JOB_RETRY_BACKOFF_SECONDS", 30))
+        # FFmpegの同時実行数はCPU数に応じた TRANSCODE_WORKERS で制限するため、既定では段階の制限をかけない
+        self.STAGE_LIMIT_FFMPEG = int(os.getenv("STAGE_LIMIT_FFMPEG", 0))
+        self.STAGE_LIMIT_SPEECH = int(os.getenv("STAGE_LIMIT_SPEECH", 10))
+        self.STAGE_LIMIT_OPENAI = int(os.getenv("STAGE_LIMIT_OPENAI", 4))
+        # 0の場合はCPU数を使用
+        self.TRANSCODE_WORKERS = int(os.getenv("TRANSCODE_WORKERS", 0))
+        self.TRANSCODE_MAX_QUEUE = int(os.getenv("TRANSCODE_MAX_QUEUE", 32))
+        self.TRANSCODE_TIMEOUT_SECONDS = float(os.getenv("TRANSCODE_TIMEOUT_SECONDS", 3600))
+        # 1の場合は分割せず1つのジョブで文字起こしする
+        self.TRANSCRIPTION_SEGMENTS = int(os.getenv("TRANSCRIPTION_SEGMENTS", 1))
+        self.TRANSCRIPTION_MIN_SEGMENT_SECONDS = float(
+            os.getenv("TRANSCRIPTION_MIN_SEGMENT_SECONDS", 600)
+        )
+        # 0の場合はバッチ化せず1音声につき1ジョブを作成する
+        self.TRANSCRIPTION_BATCH_WINDOW_SECONDS = float(
+            os.getenv("TRANSCRIPTION_BATCH_WINDOW_SECONDS", 0)
+        )
+        self.TRANSCRIPTION_BATCH_MAX_SIZE = int(
+            os.getenv("TRANSCRIPTION_BATCH_MAX_SIZE", 20)
+        )
+        self.SPEECH_SHARED_POLLER = (
+            os.getenv("SPEECH_SHARED_POLLER", "true").lower() == "true"
+        )
+        self.SPEECH_POLL_MIN_INTERVAL = float(os.getenv("SPEECH_POLL_MIN_INTERVAL", 2))
+        self.SPEECH_POLL_MAX_INTERVAL = float(os.getenv("SPEECH_POLL_MAX_INTERVAL", 30))
+        # 外部から到達可能な /webhooks/speech のURL。未設定の場合はポーリングのみ
+        self.SPEECH_WEBHOOK_URL = os.getenv("SPEECH_WEBHOOK_URL")
+        self.SPEECH_WEBHOOK_SECRET = os.getenv("SPEECH_WEBHOOK_SECRET")
+        self.SPEECH_WEBHOOK_FALLBACK_INTERVAL = float(
+            os.getenv("SPEECH_WEBHOOK_FALLBACK_INTERVAL", 300)
+        )
+        # ワーカーが共有ストアに届いたWebhookの通知を確認する間隔(秒)
+        self.SPEECH_WEBHOOK_CHECK_INTERVAL = float(
+            os.getenv("SPEECH_WEBHOOK_CHECK_INTERVAL", 1)
+        )
+        # アプリ全体でのOpenAI APIの同時リクエスト数の上限
+        self.OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", 10))
+        # Azure OpenAIデプロイのクォータ。0の場合は制限しない
+        self.OPENAI_TPM_LIMIT = int(os.getenv("OPENAI_TPM_LIMIT", 0))
+        self.OPENAI_RPM_LIMIT = int(os.getenv("OPENAI_RPM_LIMIT", 0))
+        # 指定した場合はこのSQLiteファイルでTPM/RPMの枠をワーカープロセス間で共有する
+        self.OPENAI_RATE_LIMIT_STORE_PATH = os.getenv("OPENAI_RATE_LIMIT_STORE_PATH", "")
+        # SharePointへの分割アップロードの1回あたりのサイズ(320KiBの倍数に切り下げる)
+        self.SHAREPOINT_UPLOAD_RANGE_SIZE = int(
+            os.getenv("SHAREPOINT_UPLOAD_RANGE_SIZE", 10 * 1024 * 1024)
+        )
+        # SharePointのサイト・フォルダ一覧のキャッシュ
+        self.SHAREPOINT_CACHE_TTL_SECONDS = float(
+            os.getenv("SHAREPOINT_CACHE_TTL_SECONDS", 60)
+        )
+        self.SHAREPOINT_CACHE_MAX_ENTRIES = int(
+            os.getenv("SHAREPOINT_CACHE_MAX_ENTRIES", 256)
+        )
+        # 元の音声ファイルもSharePointに保管するか
+        self.SHAREPOINT_ARCHIVE_AUDIO = (
+            os.getenv("SHAREPOINT_ARCHIVE_AUDIO", "false").lower() == "true"
+        )
+        # 要約チャンク間で重ねる話者ブロックのトークン数
+        self.SUMMARY_CHUNK_OVERLAP_TOKENS = int(
+            os.getenv("SUMMARY_CHUNK_OVERLAP_TOKENS", 0)
+        )
+        # Word文書のテンプレート(空文字の場合は既定の文書)
+        self.WORD_TEMPLATE_PATH = os.getenv("WORD_TEMPLATE_PATH", "")
+        # Word文書を生成するワーカースレッド数
+        self.WORD_RENDER_WORKERS = int(os.getenv("WORD_RENDER_WORKERS", 2))
+        # トレースの出力先: none / otlp(OTLP/HTTPのコレクター) / file(JSON Lines)
+        self.TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "none")
+        self.TRACING_OTLP_ENDPOINT = os.getenv(
+            "TRACING_OTLP_ENDPOINT", "http://localhost:4318/v1/traces"
+        )
+        self.TRACING_FILE_PATH = os.getenv("TRACING_FILE_PATH", "traces.jsonl")
+        self.TRACING_SERVICE_NAME = os.getenv("TRACING_SERVICE_NAME", "vr-api")
+        # ワーカーを動かすプロセスが状態のゲージ(キューの深さなど)を更新する間隔(秒)
+        self.METRICS_UPDATE_INTERVAL_SECONDS = float(
+            os.getenv("METRICS_UPDATE_INTERVAL_SECONDS", 5)
+        )
+        # 空文字の場合はキャッシュを無効化する
+        self.CONTENT_CACHE_PATH = os.getenv("CONTENT_CACHE_PATH", "content_cache.sqlite3")
+        self.CONTENT_CACHE_MAX_BYTES = int(
+            os.getenv("CONTENT_CACHE_MAX_BYTES", 512 * 1024 * 1024)
+        )
@@ -0,0 +1,302 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Any
+
+import aiohttp
+
+from app.config.get_config import get_config
+from app.infrastructure.az_client_factory import AzClientFactory
+from app.infrastructure.task_store import create_task_store
+from app.infrastructure.job_queue import create_job_queue
+from app.infrastructure.speech_notification_store import (
+    create_speech_notification_store,
+)
+from app.infrastructure.content_cache import ContentCache
+from app.infrastructure.rate_limit_store import create_rate_limit_store
+from app.services.task_managing_service import TaskManagingService
+from app.services.task_event_service import TaskEventService
+from app.services.job_worker_service import JobWorkerService
+from app.services.audio.mp4_processing_service import MP4ProcessingService
+from app.services.audio.transcoding_executor import TranscodingExecutor
+from app.services.audio.transcription_batcher import TranscriptionBatcher
+from app.services.word_generating_service import WordGeneratingService
+from app.usecases.audio_processing_usecase import AudioProcessingUseCase
+from app.utils.stage_limiter import StageLimiter
+from app.utils.rate_limiter import RateLimiter
+from app.utils.metrics import update_state_gauges
+from app.utils.token_chunking import get_encoding
+from app.utils.tracing import configure_tracing, task_context, tracer
+
+logger = logging.getLogger(__name__)
+
+# Webhookが有効であることを共有ストアに記録し直す間隔(期限はこの3倍)
+WEBHOOK_HEARTBEAT_SECONDS = 60.0
+
+
+async def init_app_state(
+    state: Any, run_workers: bool | None = None, serves_api: bool = True
+) -> None:
+    """
+    アプリケーション全体で共有するクライアント・サービスを生成する。
+    run_workers が None の場合は設定(JOB_WORKER_MODE)に従ってワーカーを起動する。
+    serves_api はこのプロセスがAPI(Webhookの受信を含む)を提供するか。Webhookの登録はこのプロセスのみで行う。
+    """
+    state.config = get_config()
+    state.tracer_provider = configure_tracing(
+        state.config.TRACING_EXPORTER,
+        service_name=state.config.TRACING_SERVICE_NAME,
+        otlp_endpoint=state.config.TRACING_OTLP_ENDPOINT,
+        file_path=state.config.TRACING_FILE_PATH,
+    )
+    state.session = aiohttp.ClientSession()
+    state.task_event_service = TaskEventService(
+        keepalive_seconds=state.config.TASK_EVENT_KEEPALIVE_SECONDS,
+        history_ttl_seconds=state.config.TASK_EVENT_HISTORY_TTL_SECONDS,
+        max_history_tasks=state.config.TASK_EVENT_HISTORY_MAX_TASKS,
+    )
+    state.task_managing_service = TaskManagingService(
+        task_store=create_task_store(
+            backend=state.config.TASK_STORE_BACKEND,
+            db_path=state.config.TASK_STORE_PATH,
+            max_tasks=state.config.TASK_STORE_MAX_TASKS,
+            ttl_seconds=state.config.TASK_STORE_TTL_SECONDS,
+        ),
+        task_event_service=state.task_event_service,
+    )
+    state.az_client_factory = AzClientFactory(
+        config=state.config, session=state.session
+    )
+    state.stage_limiter = StageLimiter(
+        {
+            "ffmpeg": state.config.STAGE_LIMIT_FFMPEG,
+            "speech": state.config.STAGE_LIMIT_SPEECH,
+            "openai": state.config.STAGE_LIMIT_OPENAI,
+        }
+    )
+    # 全タスクで共有し、429に応じて同時実行数を調整する
+    state.openai_rate_limiter = RateLimiter(
+        store=create_rate_limit_store(
+            state.config.OPENAI_RATE_LIMIT_STORE_PATH,
+            tokens_per_minute=state.config.OPENAI_TPM_LIMIT,
+            requests_per_minute=state.config.OPENAI_RPM_LIMIT,
+        ),
+        max_concurrency=state.config.OPENAI_MAX_CONCURRENCY,
+    )
+    # トークナイザの読み込みは重いため、起動時に1度だけ行う
+    try:
+        await asyncio.to_thread(get_encoding)
+    except Exception as e:
+        logger.warning(f"トークナイザの事前読み込み失敗: {e}")
+    state.content_cache = (
+        ContentCache(
+            state.config.CONTENT_CACHE_PATH,
+            max_bytes=state.config.CONTENT_CACHE_MAX_BYTES,
+        )
+        if state.config.CONTENT_CACHE_PATH
+        else None
+    )
+    # テンプレートの組み立てとワーカースレッドの起動は1度だけ行い、全タスクで共有する
+    state.word_generating_service = WordGeneratingService(
+        template_path=state.config.WORD_TEMPLATE_PATH or None,
+        max_workers=state.config.WORD_RENDER_WORKERS,
+    )
+    state.transcoding_executor = TranscodingExecutor(
+        max_workers=state.config.TRANSCODE_WORKERS or None,
+        max_queue=state.config.TRANSCODE_MAX_QUEUE,
+        timeout_seconds=state.config.TRANSCODE_TIMEOUT_SECONDS,
+    )
+    state.transcription_batcher = (
+        TranscriptionBatcher(
+            state.az_client_factory.create_az_speech_client(),
+            window_seconds=state.config.TRANSCRIPTION_BATCH_WINDOW_SECONDS,
+            max_batch_size=state.config.TRANSCRIPTION_BATCH_MAX_SIZE,
+        )
+        if state.config.TRANSCRIPTION_BATCH_WINDOW_SECONDS > 0
+        else None
+    )
+    state.job_queue = create_job_queue(
+        backend=state.config.JOB_QUEUE_BACKEND, db_path=state.config.JOB_QUEUE_PATH
+    )
+    state.job_worker_service = JobWorkerService(
+        job_queue=state.job_queue,
+        run_job=_create_job_runner(state),
+        num_workers=state.config.JOB_WORKERS,
+        max_attempts=state.config.JOB_MAX_ATTEMPTS,
+        retry_backoff_seconds=state.config.JOB_RETRY_BACKOFF_SECONDS,
+    )
+    # Webhookの通知はジョブキューと同じ場所に置き、ジョブを監視しているプロセスに渡す
+    state.speech_notification_store = create_speech_notification_store(
+        backend=state.config.JOB_QUEUE_BACKEND, db_path=state.config.JOB_QUEUE_PATH
+    )
+    if state.config.SPEECH_WEBHOOK_URL and serves_api:
+        state.webhook_registration = asyncio.create_task(_register_speech_webhook(state))
+    if run_workers is None:
+        run_workers = state.config.JOB_WORKER_MODE == "embedded"
+    if run_workers:
+        state.job_worker_service.start()
+        # ワーカーが別プロセスの場合、/metrics を返すプロセスからはワーカーの状態が見えない
+        state.metrics_updater = asyncio.create_task(_update_metrics(state))
+        if (
+            state.config.SPEECH_WEBHOOK_URL
+            and state.az_client_factory.transcription_poller is not None
+        ):
+            state.speech_notification_watcher = asyncio.create_task(
+                _watch_speech_notifications(state)
+            )
+
+
+async def close_app_state(state: Any) -> None:
+    """init_app_stateで生成したリソースを解放する"""
+    if hasattr(state, "metrics_updater"):
+        state.metrics_updater.cancel()
+    if hasattr(state, "speech_notification_watcher"):
+        state.speech_notification_watcher.cancel()
+    if hasattr(state, "webhook_registration"):
+        state.webhook_registration.cancel()
+        # このプロセスが止まるとWebhookを受信できないため、ワーカーを通常のポーリングに戻す
+        try:
+            await asyncio.to_thread(
+                state.speech_notification_store.set_webhook_active_until, 0.0
+            )
+        except Exception as e:
+            logger.warning(f"Webhookの状態の記録に失敗: {str(e)}")
+    if hasattr(state, "job_worker_service"):
+        await state.job_worker_service.stop()
+    if hasattr(state, "job_queue"):
+        state.job_queue.close()
+    if hasattr(state, "speech_notification_store"):
+        state.speech_notification_store.close()
+    if getattr(state, "transcription_batcher", None) is not None:
+        await state.transcription_batcher.close()
+    if hasattr(state, "az_client_factory"):
+        await state.az_client_factory.close()
+    if getattr(state, "content_cache", None) is not None:
+        state.content_cache.close()
+    if hasattr(state, "word_generating_service"):
+        state.word_generating_service.close()
+    if hasattr(state, "openai_rate_limiter"):
+        state.openai_rate_limiter.close()
+    if hasattr(state, "task_managing_service"):
+        state.task_managing_service.close()
+    if hasattr(state, "session"):
+        await state.session.close()
+    if getattr(state, "tracer_provider", None) is not None:
+        # 未送信のスパンを出力してから終了する
+        state.tracer_provider.shutdown()
+
+
+async def _register_speech_webhook(state: Any) -> None:
+    """
+    文字起こし完了通知のWebhookを登録する(失敗してもポーリングで動作は継続)。
+    登録に成功した場合は、このプロセスが動いている間Webhookが有効であることを共有ストアに記録し続ける。
+    記録が途切れるとワーカーのポーラーは通常の間隔のポーリングに戻る。
+    """
+    try:
+        az_speech_client = state.az_client_factory.create_az_speech_client()
+        webhook_url = await az_speech_client.register_webhook(
+            state.config.SPEECH_WEBHOOK_URL, state.config.SPEECH_WEBHOOK_SECRET
+        )
+        logger.info(f"Speech Webhookを登録: {webhook_url}")
+    except Exception as e:
+        logger.warning(f"Speech Webhookの登録に失敗、ポーリングのみで監視します: {str(e)}")
+        return
+
+    store = state.speech_notification_store
+    while True:
+        try:
+            await asyncio.to_thread(
+                store.set_webhook_active_until,
+                time.time() + WEBHOOK_HEARTBEAT_SECONDS * 3,
+            )
+        except Exception as e:
+            logger.warning(f"Webhookの状態の記録に失敗: {str(e)}")
+        await asyncio.sleep(WEBHOOK_HEARTBEAT_SECONDS)
+
+
+async def _update_metrics(state: Any) -> None:
+    """このプロセスの状態(キューの深さ・実行中の変換数など)を定期的にゲージに反映する"""
+    while True:
+        try:
+            await update_state_gauges(state)
+        except Exception as e:
+            logger.warning(f"メトリクスの更新に失敗: {str(e)}")
+        await asyncio.sleep(state.config.METRICS_UPDATE_INTERVAL_SECONDS)
+
+
+async def _watch_speech_notifications(state: Any) -> None:
+    """
+    共有ストアに届いたWebhookの通知を読み、このプロセスのポーラーにすぐ状態を確認させる。
+    あわせてWebhookが有効かを確認し、ポーラーのポーリング間隔を切り替える。
+    """
+    poller = state.az_client_factory.transcription_poller
+    store = state.speech_notification_store
+    last_id: int | None = None
+    while True:
+        try:
+            if last_id is None:
+                last_id = await asyncio.to_thread(store.latest_id)
+            for notification_id, job_url in await asyncio.to_thread(
+                store.read_after, last_id
+            ):
+                last_id = notification_id
+                poller.poll_now(job_url)
+            poller.set_webhook_active(await asyncio.to_thread(store.is_webhook_active))
+        except Exception as e:
+            logger.warning(f"Webhookの通知の確認に失敗: {str(e)}")
+        await asyncio.sleep(state.config.SPEECH_WEBHOOK_CHECK_INTERVAL)
+
+
+def create_audio_usecase(state: Any) -> AudioProcessingUseCase:
+    """AudioProcessingUseCaseのインスタンスを生成する"""
+    az_client_factory = state.az_client_factory
+    return AudioProcessingUseCase(
+        task_managing_service=state.task_managing_service,
+        mp4_processing_service=MP4ProcessingService(
+            streaming=state.config.AUDIO_STREAMING_CONVERSION,
+            transcoding_executor=state.transcoding_executor,
+            segment_count=state.config.TRANSCRIPTION_SEGMENTS,
+            min_segment_seconds=state.config.TRANSCRIPTION_MIN_SEGMENT_SECONDS,
+        ),
+        word_generating_service=state.word_generating_service,
+        az_blob_client=az_client_factory.create_az_blob_client(),
+        az_speech_client=az_client_factory.create_az_speech_client(),
+        az_openai_client=az_client_factory.create_az_openai_client(),
+        ms_sharepoint_client=az_client_factory.create_ms_sharepoint_client(),
+        stage_limiter=state.stage_limiter,
+        transcription_batcher=state.transcription_batcher,
+        openai_rate_limiter=state.openai_rate_limiter,
+        content_cache=state.content_cache,
+        summary_overlap_tokens=state.config.SUMMARY_CHUNK_OVERLAP_TOKENS,
+        archive_audio=state.config.SHAREPOINT_ARCHIVE_AUDIO,
+    )
+
+
+def _create_job_runner(state: Any):
+    """キューから取り出したジョブを実行する関数を生成する"""
+
+    async def run_job(payload: dict[str, Any], is_last_attempt: bool) -> None:
+        usecase = create_audio_usecase(state)
+        # 登録時のリクエストのトレースの続きとして実行する
+        job_args = {k: v for k, v in payload.items() if k != "trace_context"}
+        try:
+            with task_context(payload["task_id"], payload.get("trace_context")):
+                with tracer.start_as_current_span("audio_processing.job"):
+                    await usecase.execute(**job_args, mark_failed=is_last_attempt)
+        except Exception:
+            if is_last_attempt:
+                _remove_uploaded_file(payload["file_path"])
+            raise
+        _remove_uploaded_file(payload["file_path"])
+
+    return run_job
+
+
+def _remove_uploaded_file(file_path: str) -> None:
+    """処理が終わったアップロードファイルを削除する"""
+    try:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+    except OSError as e:
+        logger.warning(f"アップロードファイル削除失敗: {file_path} ({e})")
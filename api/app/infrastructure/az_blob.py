@@ -1,34 +1,156 @@
-from azure.storage.blob import BlobServiceClient
+import asyncio
+import base64
+from typing import IO, AsyncIterator, Callable
+from azure.storage.blob import BlobBlock
+from azure.storage.blob.aio import BlobServiceClient, BlobClient
 from fastapi import HTTPException
 
+DEFAULT_BLOCK_SIZE = 4 * 1024 * 1024
+DEFAULT_MAX_CONCURRENCY = 4
+
 
 class AzBlobClient:
     """Azure Blob Storageとの通信を担当するクライアントクラス"""
 
-    def __init__(self, az_blob_connection: str, az_container_name: str) -> None:
+    def __init__(
+        self,
+        az_blob_connection: str,
+        az_container_name: str,
+        block_size: int = DEFAULT_BLOCK_SIZE,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    ) -> None:
         self._az_blob_service = BlobServiceClient.from_connection_string(
-            az_blob_connection
+            az_blob_connection,
+            max_block_size=block_size,
+            max_single_put_size=block_size,
         )
         self._az_container = self._az_blob_service.get_container_client(
             az_container_name
         )
+        self._block_size = block_size
+        self._max_concurrency = max_concurrency
+
+    async def close(self) -> None:
+        """HTTPパイプラインを閉じる"""
+        await self._az_blob_service.close()
 
-    async def upload_blob(self, file_name: str, file_data: bytes) -> str:
-        """ファイルをBlobストレージにアップロードする"""
+    async def upload_blob(self, file_name: str, file_data: bytes | IO[bytes]) -> str:
+        """ファイルをBlobストレージにアップロードする(大きなファイルは並列ブロックで送信)"""
         try:
             blob = self._az_container.get_blob_client(blob=file_name)
-            blob.upload_blob(file_data, overwrite=True)
+            await blob.upload_blob(
+                file_data, overwrite=True, max_concurrency=self._max_concurrency
+            )
             return blob.url
         except Exception as e:
             raise HTTPException(
                 status_code=500, detail=f"Blobのアップロードに失敗しました: {str(e)}"
             ) from e
 
+    async def upload_blob_from_stream(
+        self,
+        file_name: str,
+        stream: AsyncIterator[bytes],
+        rewrite_first_block: Callable[[bytes, int], bytes] | None = None,
+    ) -> str:
+        """
+        非同期ストリームをブロック単位で並列にステージングしながらアップロードする。
+        rewrite_first_block が指定された場合、先頭ブロックは総サイズ確定後に補正して送信する。
+        """
+        try:
+            blob = self._az_container.get_blob_client(blob=file_name)
+            block_ids: list[str] = []
+            first_block: bytes | None = None
+            total_size = 0
+            semaphore = asyncio.Semaphore(self._max_concurrency)
+            tasks: list[asyncio.Task] = []
+
+            try:
+                async for block in self._iter_blocks(stream):
+                    block_id = self._make_block_id(len(block_ids))
+                    block_ids.append(block_id)
+                    total_size += len(block)
+                    if rewrite_first_block is not None and first_block is None:
+                        first_block = block
+                        continue
+                    tasks.append(
+                        await self._start_stage_block(blob, block_id, block, semaphore)
+                    )
+                    self._raise_if_failed(tasks)
+
+                if first_block is not None:
+                    tasks.append(
+                        await self._start_stage_block(
+                            blob,
+                            block_ids[0],
+                            rewrite_first_block(first_block, total_size),
+                            semaphore,
+                        )
+                    )
+                await asyncio.gather(*tasks)
+            except BaseException:
+                for task in tasks:
+                    task.cancel()
+                raise
+
+            await blob.commit_block_list([BlobBlock(block_id=b) for b in block_ids])
+            return blob.url
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(
+                status_code=500, detail=f"Blobのアップロードに失敗しました: {str(e)}"
+            ) from e
+
+    async def _start_stage_block(
+        self,
+        blob: BlobClient,
+        block_id: str,
+        block: bytes,
+        semaphore: asyncio.Semaphore,
+    ) -> asyncio.Task:
+        """
+        同時送信数の空きを待ってからブロック送信タスクを開始する。
+        空きを待つ間はストリームの読み出しも止まるため、メモリ使用量が一定に保たれる。
+        """
+        await semaphore.acquire()
+
+        async def stage() -> None:
+            try:
+                await blob.stage_block(block_id, block)
+            finally:
+                semaphore.release()
+
+        return asyncio.create_task(stage())
+
+    @staticmethod
+    def _raise_if_failed(tasks: list[asyncio.Task]) -> None:
+        """失敗済みのブロック送信があれば即座に例外を送出する"""
+        for task in tasks:
+            if task.done() and not task.cancelled() and task.exception():
+                raise task.exception()
+
+    async def _iter_blocks(self, stream: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        """ストリームをブロックサイズ単位にまとめ直す"""
+        buffer = bytearray()
+        async for chunk in stream:
+            buffer.extend(chunk)
+            while len(buffer) >= self._block_size:
+                yield bytes(buffer[: self._block_size])
+                del buffer[: self._block_size]
+        if buffer:
+            yield bytes(buffer)
+
+    @staticmethod
+    def _make_block_id(index: int) -> str:
+        """ブロックIDを生成する(全ブロックで同じ長さにする必要がある)"""
+        return base64.b64encode(f"{index:08d}".encode()).decode()
+
     async def delete_blob(self, blob_name: str) -> None:
         """
         指定されたBlobを削除する"""
         try:
-            self._az_container.delete_blob(blob_name)
+            await self._az_container.delete_blob(blob_name)
         except Exception as e:
             raise HTTPException(
                 status_code=500, detail=f"Blobの削除に失敗しました: {str(e)}"
@@ -1,5 +1,6 @@
 from app.infrastructure.az_blob import AzBlobClient
 from app.infrastructure.az_speech import AzSpeechClient
+from app.infrastructure.az_speech_poller import TranscriptionPoller
 from app.infrastructure.az_openai import AzOpenAIClient
 from app.infrastructure.ms_sharepoint import MsSharePointClient
 from app.config.environment_config import EnvironmentConfig
@@ -7,32 +8,85 @@ from aiohttp import ClientSession
 
 
 class AzClientFactory:
+    """
+    外部サービスのクライアントを保持するレジストリ。
+    クライアントは起動時(lifespan)に1度だけ生成して接続プールと同時実行数の上限を全体で共有し、
+    終了時に close() でまとめて閉じる。create_* は保持しているインスタンスを返す。
+    """
+
     def __init__(self, config: EnvironmentConfig, session: ClientSession):
         self.config = config
         self.session = session
-
-    def create_az_blob_client(self) -> AzBlobClient:
-        return AzBlobClient(
+        # Blobクライアントは接続プールを共有するためアプリ全体で1つだけ生成する
+        self._az_blob_client = AzBlobClient(
             az_blob_connection=self.config.AZ_BLOB_CONNECTION,
             az_container_name=self.config.AZ_CONTAINER_NAME,
+            block_size=self.config.AZ_BLOB_BLOCK_SIZE,
+            max_concurrency=self.config.AZ_BLOB_MAX_CONCURRENCY,
         )
-
-    def create_az_speech_client(self) -> AzSpeechClient:
-        return AzSpeechClient(
+        # SharePointクライアントはアクセストークンをキャッシュするためアプリ全体で共有する
+        self._ms_sharepoint_client = MsSharePointClient(
+            session=self.session,
+            client_id=self.config.CLIENT_ID,
+            client_secret=self.config.CLIENT_SECRET,
+            tenant_id=self.config.TENANT_ID,
+            upload_range_size=self.config.SHAREPOINT_UPLOAD_RANGE_SIZE,
+            directory_cache_ttl=self.config.SHAREPOINT_CACHE_TTL_SECONDS,
+            directory_cache_max_entries=self.config.SHAREPOINT_CACHE_MAX_ENTRIES,
+        )
+        # 文字起こしジョブの状態監視は全リクエストで1つのポーラーに集約する
+        self._transcription_poller = (
+            TranscriptionPoller(
+                AzSpeechClient(
+                    session=self.session,
+                    az_speech_key=self.config.AZ_SPEECH_KEY,
+                    az_speech_endpoint=self.config.AZ_SPEECH_ENDPOINT,
+                ),
+                min_interval=self.config.SPEECH_POLL_MIN_INTERVAL,
+                max_interval=self.config.SPEECH_POLL_MAX_INTERVAL,
+                # Webhookの通知が届いている間のみ、この間隔の保険に切り替える
+                webhook_interval=(
+                    self.config.SPEECH_WEBHOOK_FALLBACK_INTERVAL
+                    if self.config.SPEECH_WEBHOOK_URL
+                    else None
+                ),
+            )
+            if self.config.SPEECH_SHARED_POLLER
+            else None
+        )
+        self._az_speech_client = AzSpeechClient(
             session=self.session,
             az_speech_key=self.config.AZ_SPEECH_KEY,
             az_speech_endpoint=self.config.AZ_SPEECH_ENDPOINT,
+            transcription_poller=self._transcription_poller,
         )
-
-    def create_az_openai_client(self) -> AzOpenAIClient:
-        return AzOpenAIClient(
+        # 同時実行数の上限をアプリ全体で効かせるため、OpenAIクライアントも1つだけ生成する
+        self._az_openai_client = AzOpenAIClient(
             az_openai_key=self.config.AZ_OPENAI_KEY,
             az_openai_endpoint=self.config.AZ_OPENAI_ENDPOINT,
+            max_concurrent=self.config.OPENAI_MAX_CONCURRENCY,
         )
 
+    @property
+    def transcription_poller(self) -> TranscriptionPoller | None:
+        return self._transcription_poller
+
+    async def close(self) -> None:
+        """共有クライアントを閉じる"""
+        if self._transcription_poller is not None:
+            await self._transcription_poller.close()
+        await self._az_openai_client.close()
+        await self._ms_sharepoint_client.close()
+        await self._az_blob_client.close()
+
+    def create_az_blob_client(self) -> AzBlobClient:
+        return self._az_blob_client
+
+    def create_az_speech_client(self) -> AzSpeechClient:
+        return self._az_speech_client
+
+    def create_az_openai_client(self) -> AzOpenAIClient:
+        return self._az_openai_client
+
     def create_ms_sharepoint_client(self) -> MsSharePointClient:
-        return MsSharePointClient(
-            client_id=self.config.CLIENT_ID,
-            client_secret=self.config.CLIENT_SECRET,
-            tenant_id=self.config.TENANT_ID,
-        )
+        return self._ms_sharepoint_client
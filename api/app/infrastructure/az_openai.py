@@ -1,7 +1,17 @@
-from openai import AsyncAzureOpenAI
+from openai import AsyncAzureOpenAI, APIError, APIStatusError, APIConnectionError
+from opentelemetry.trace import SpanKind
 from fastapi import HTTPException
 import asyncio
-from typing import Any
+from typing import Any, Callable, Mapping
+
+from app.utils.tracing import tracer
+
+
+class OpenAIAPIError(HTTPException):
+    """
+    OpenAIのAPIが返したエラー・接続エラー。
+    コード内の不具合をラップした500と区別し、再試行するかの判定に使う。
+    """
 
 
 class AzOpenAIClient:
@@ -11,24 +21,101 @@ class AzOpenAIClient:
         az_openai_endpoint: str,
         api_version: str = "2024-02-01",
         max_concurrent: int = 10,
+        max_output_tokens: int = 3000,
+        model: str = "gpt-4o",
     ):
         """Azure OpenAI クライアントの初期化"""
         self.client = AsyncAzureOpenAI(
             api_key=az_openai_key,
             azure_endpoint=az_openai_endpoint,
             api_version=api_version,
+            # 再試行は呼び出し側のスケジューラで行う
+            max_retries=0,
         )
         self.semaphore = asyncio.Semaphore(max_concurrent)
+        self.max_output_tokens = max_output_tokens
+        self.model = model
+
+    async def close(self) -> None:
+        """HTTP接続プールを閉じる"""
+        await self.client.close()
 
-    async def get_summary(self, prompt_messages: list[dict[str, Any]]) -> str:
-        """要約を取得する"""
+    async def get_summary(
+        self,
+        prompt_messages: list[dict[str, Any]],
+        on_token: Callable[[str], None] | None = None,
+        on_headers: Callable[[Mapping[str, str]], None] | None = None,
+    ) -> str:
+        """
+        要約を取得する。
+        on_token を指定した場合はストリーミングで受信し、届いたトークンごとに呼び出す。
+        on_headers には応答ヘッダー(x-ratelimit-remaining-* など)を渡す。
+        APIのエラーはステータスコード(429/5xxなど)とRetry-Afterを保持したOpenAIAPIErrorとして送出する。
+        """
         async with self.semaphore:
-            try:
-                response = await self.client.chat.completions.create(
-                    model="gpt-4o",
-                    max_tokens=3000,
-                    messages=prompt_messages,
-                )
-                return response.choices[0].message.content.strip()
-            except Exception as e:
-                raise HTTPException(status_code=500, detail=f"OpenAIエラー: {str(e)}")
+            with tracer.start_as_current_span(
+                "openai.chat_completion",
+                kind=SpanKind.CLIENT,
+                attributes={
+                    "gen_ai.request.model": self.model,
+                    "openai.stream": on_token is not None,
+                },
+            ) as span:
+                try:
+                    if on_token is not None:
+                        return await self._stream_summary(
+                            prompt_messages, on_token, on_headers
+                        )
+                    raw = await self.client.chat.completions.with_raw_response.create(
+                        model=self.model,
+                        max_tokens=self.max_output_tokens,
+                        messages=prompt_messages,
+                    )
+                    if on_headers is not None:
+                        on_headers(raw.headers)
+                    response = raw.parse()
+                    return response.choices[0].message.content.strip()
+                except APIStatusError as e:
+                    span.set_attribute("http.response.status_code", e.status_code)
+                    if on_headers is not None:
+                        on_headers(e.response.headers)
+                    retry_after = e.response.headers.get("retry-after")
+                    raise OpenAIAPIError(
+                        status_code=e.status_code,
+                        detail=f"OpenAIエラー: {str(e)}",
+                        headers={"Retry-After": retry_after} if retry_after else None,
+                    )
+                except APIConnectionError as e:
+                    raise OpenAIAPIError(status_code=503, detail=f"OpenAI接続エラー: {str(e)}")
+                except APIError as e:
+                    # ストリーミングの途中でエラーが返された場合など
+                    raise OpenAIAPIError(status_code=502, detail=f"OpenAI応答エラー: {str(e)}")
+                except Exception as e:
+                    raise HTTPException(status_code=500, detail=f"OpenAIエラー: {str(e)}")
+
+    async def _stream_summary(
+        self,
+        prompt_messages: list[dict[str, Any]],
+        on_token: Callable[[str], None],
+        on_headers: Callable[[Mapping[str, str]], None] | None = None,
+    ) -> str:
+        """ストリーミングで要約を受信する"""
+        raw = await self.client.chat.completions.with_raw_response.create(
+            model=self.model,
+            max_tokens=self.max_output_tokens,
+            messages=prompt_messages,
+            stream=True,
+        )
+        if on_headers is not None:
+            on_headers(raw.headers)
+        stream = raw.parse()
+        parts = []
+        async for chunk in stream:
+            # Azureでは最初のチャンクがフィルタ結果のみでchoicesが空の場合がある
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                parts.append(delta)
+                on_token(delta)
+        return "".join(parts).strip()
@@ -1,24 +1,35 @@
 import asyncio
 import aiohttp
+from opentelemetry.trace import SpanKind
 from fastapi import HTTPException
 from typing import Any
 import logging
 
+from app.infrastructure.az_speech_poller import TranscriptionPoller
+from app.utils.transcript import Transcript
+from app.utils.metrics import PIPELINE_STAGE_SECONDS
+from app.utils.tracing import record_span, tracer
+
 logger = logging.getLogger(__name__)
 
 
 class AzSpeechClient:
-    """Azure Speech Servicesのクライアントクラス"""
+    """
+    Azure Speech Servicesのクライアントクラス。
+    session はアプリケーション全体で共有するため、このクライアントでは閉じない(生成元が閉じる)。
+    """
 
     def __init__(
         self,
         session: aiohttp.ClientSession,
         az_speech_key: str,
         az_speech_endpoint: str,
+        transcription_poller: TranscriptionPoller | None = None,
     ):
         self._session = session
         self._endpoint = az_speech_endpoint.rstrip("/")
         self._headers = self._create_headers(az_speech_key)
+        self._transcription_poller = transcription_poller
 
     def _create_headers(self, az_speech_key: str) -> dict[str, str]:
         return {
@@ -29,27 +40,29 @@ class AzSpeechClient:
             "X-Japan-Force": "True",
         }
 
-    async def close(self) -> None:
-        if not self._session.closed:
-            await self._session.close()
-
     async def create_transcription_job(
         self, blob_url: str, display_name: str | None = None
     ) -> str:
         """文字起こしジョブを作成する"""
-        body = self._create_transcription_config(blob_url, display_name)
+        return await self.create_batch_transcription_job([blob_url], display_name)
+
+    async def create_batch_transcription_job(
+        self, blob_urls: list[str], display_name: str | None = None
+    ) -> str:
+        """複数の音声をまとめて1つの文字起こしジョブを作成する"""
+        body = self._create_transcription_config(blob_urls, display_name)
         transcription_url = f"{self._endpoint}/speechtotext/v3.2/transcriptions"
         response_data = await self._post(transcription_url, body)
         return response_data["self"]
 
     def _create_transcription_config(
-        self, blob_url: str, display_name: str | None = None
+        self, blob_urls: list[str], display_name: str | None = None
     ) -> dict[str, Any]:
         """文字起こし設定を作成する"""
         return {
             "displayName": display_name or "Transcription",
             "locale": "ja-JP",
-            "contentUrls": [blob_url],
+            "contentUrls": blob_urls,
             "properties": {
                 "audioLocale": "ja-JP",
                 "defaultLanguageCode": "ja-JP",
@@ -59,65 +72,124 @@ class AzSpeechClient:
             },
         }
 
+    async def register_webhook(self, web_url: str, secret: str | None = None) -> str:
+        """
+        文字起こし完了を通知するWebhookを登録する。
+        同じURLのWebhookが登録済みの場合はそれを再利用する。
+        """
+        webhooks_url = f"{self._endpoint}/speechtotext/v3.2/webhooks"
+        next_url: str | None = webhooks_url
+        while next_url:
+            webhooks = await self._get(next_url)
+            for webhook in webhooks.get("values", []):
+                if webhook.get("webUrl") == web_url:
+                    return webhook["self"]
+            next_url = webhooks.get("@nextLink")
+
+        body: dict[str, Any] = {
+            "displayName": "TranscriptionCompletion",
+            "webUrl": web_url,
+            "events": {"transcriptionCompletion": True},
+        }
+        if secret:
+            body["properties"] = {"secret": secret}
+        response_data = await self._post(webhooks_url, body)
+        return response_data["self"]
+
+    async def get_transcription_status(self, job_url: str) -> dict[str, Any]:
+        """文字起こしジョブの状態を1回取得する"""
+        return await self._get(job_url)
+
     async def poll_transcription_status(
-        self, job_url: str, timeout_seconds: int = 7200, interval: int = 15
+        self,
+        job_url: str,
+        timeout_seconds: int = 7200,
+        interval: int = 15,
+        audio_duration: float | None = None,
     ) -> str:
-        """文字起こしジョブの状態を監視する"""
-        end_time = asyncio.get_event_loop().time() + timeout_seconds
+        """
+        文字起こしジョブの状態を監視する。
+        共有ポーラーが設定されている場合は、そちらに監視を任せて完了を待つ。
+        """
+        if self._transcription_poller is not None:
+            return await self._transcription_poller.wait(
+                job_url, audio_duration=audio_duration, timeout_seconds=timeout_seconds
+            )
+
+        started_at = asyncio.get_event_loop().time()
+        end_time = started_at + timeout_seconds
+        running_at = None
 
         while True:
             status_data = await self._get(job_url)
             status = status_data.get("status")
+            now = asyncio.get_event_loop().time()
+
+            # 待ち時間と実行時間はポーリング間隔の精度で計測する
+            if status == "Running" and running_at is None:
+                running_at = now
+                PIPELINE_STAGE_SECONDS.labels(stage="speech_queue").observe(
+                    running_at - started_at
+                )
 
             if status == "Succeeded":
+                if running_at is not None:
+                    PIPELINE_STAGE_SECONDS.labels(stage="speech_run").observe(
+                        now - running_at
+                    )
+                    record_span("speech.queued", started_at, running_at)
+                    record_span("speech.running", running_at, now)
                 return status_data["links"]["files"]
 
             if status in ["Failed", "Cancelled"]:
                 raise HTTPException(500, f"ジョブ失敗: {status}")
 
-            if asyncio.get_event_loop().time() > end_time:
+            if now > end_time:
                 raise HTTPException(500, "ジョブのタイムアウト")
 
             await asyncio.sleep(interval)
 
     async def get_transcription_result_url(self, file_url: str) -> str:
         """文字起こし結果のURLを取得する"""
-        file_data = await self._get(file_url)
-        return file_data["values"][0]["links"]["contentUrl"]
+        return (await self.get_transcription_result_urls(file_url))[0]
+
+    async def get_transcription_result_urls(self, file_url: str) -> list[str]:
+        """
+        文字起こし結果のURLをすべて取得する(レポートファイルは除く)。
+        結果が複数ページに分かれている場合は@nextLinkをたどる。
+        """
+        content_urls: list[str] = []
+        next_url: str | None = file_url
+        while next_url:
+            file_data = await self._get(next_url)
+            content_urls.extend(
+                value["links"]["contentUrl"]
+                for value in file_data.get("values", [])
+                if value.get("kind", "Transcription") == "Transcription"
+            )
+            next_url = file_data.get("@nextLink")
+        if not content_urls:
+            raise HTTPException(500, "文字起こし結果が見つかりません")
+        return content_urls
+
+    async def get_transcription_content(self, content_url: str) -> dict[str, Any]:
+        """文字起こし結果(source, recognizedPhrases など)を取得する"""
+        return await self._get(content_url)
+
+    async def get_recognized_phrases(self, content_url: str) -> list[dict[str, Any]]:
+        """文字起こし結果の認識フレーズ一覧を取得する"""
+        content_data = await self.get_transcription_content(content_url)
+        return content_data.get("recognizedPhrases", [])
 
     async def get_transcription_by_speaker(self, content_url: str) -> str:
         """話者ごとに文字起こし結果を整形する"""
-        content_data = await self._get(content_url)
-        recognized_phrases = content_data.get("recognizedPhrases", [])
+        recognized_phrases = await self.get_recognized_phrases(content_url)
 
-        return self._format_transcription_by_speaker(recognized_phrases)
+        return self.format_transcription_by_speaker(recognized_phrases)
 
-    def _format_transcription_by_speaker(self, recognized_phrases: list) -> str:
+    def format_transcription_by_speaker(self, recognized_phrases: list) -> str:
         """話者ごとに文字起こし結果をブロック分けする"""
-        result_blocks = []
-        current_speaker = None
-        current_block = []
-
-        for phrase in recognized_phrases:
-            speaker = phrase.get("speaker", 0)
-            text = phrase.get("nBest", [{}])[0].get("display", "")
-
-            if speaker != current_speaker:
-                if current_block:
-                    result_blocks.append(
-                        f"[話者{current_speaker}]\n" + "\n".join(current_block)
-                    )
-                current_speaker = speaker
-                current_block = [text]
-            else:
-                current_block.append(text)
-
-        if current_block:
-            result_blocks.append(
-                f"[話者{current_speaker}]\n" + "\n".join(current_block)
-            )
-
-        final_result = "\n\n".join(result_blocks)
+        final_result = Transcript.from_recognized_phrases(recognized_phrases).to_text()
         logger.info(f"時系列話者テキスト:\n{final_result}")
         return final_result
 
@@ -140,16 +212,29 @@ class AzSpeechClient:
         self, method: str, url: str, json_body: dict[str, Any] | None = None
     ) -> dict[str, Any]:
         """HTTPリクエストを実行する"""
+        with tracer.start_as_current_span(
+            f"speech {method}",
+            kind=SpanKind.CLIENT,
+            attributes={"http.request.method": method, "url.full": url},
+        ) as span:
+            return await self._send_request(span, method, url, json_body)
+
+    async def _send_request(
+        self, span: Any, method: str, url: str, json_body: dict[str, Any] | None
+    ) -> dict[str, Any]:
         try:
             async with self._session.request(
                 method, url, headers=self._headers, json=json_body
             ) as response:
+                span.set_attribute("http.response.status_code", response.status)
                 expected_status = 201 if method == "POST" else 200
                 if response.status != expected_status:
                     error_msg = "ジョブの作成" if method == "POST" else "リクエスト"
+                    retry_after = response.headers.get("Retry-After")
                     raise HTTPException(
                         status_code=response.status,
                         detail=f"{error_msg}に失敗しました: {await response.text()}",
+                        headers={"Retry-After": retry_after} if retry_after else None,
                     )
                 return await response.json()
         except asyncio.TimeoutError:
@@ -0,0 +1,270 @@
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Any, TYPE_CHECKING
+
+import aiohttp
+from fastapi import HTTPException
+
+from app.utils.metrics import PIPELINE_STAGE_SECONDS
+from app.utils.tracing import record_span
+
+if TYPE_CHECKING:
+    from app.infrastructure.az_speech import AzSpeechClient
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _PollEntry:
+    future: asyncio.Future
+    started_at: float
+    deadline: float
+    next_poll_at: float
+    audio_duration: float | None = None
+    # 状態が Running になったことを最初に確認した時刻(待ち時間と実行時間の計測用)
+    running_at: float | None = None
+    waiters: int = field(default=1)
+    poll_requested: bool = False
+
+
+class TranscriptionPoller:
+    """
+    未完了の文字起こしジョブをまとめて監視する共有ポーラー。
+    ジョブごとの待機ループの代わりに1つのループで状態を確認し、完了時にFutureで待機側を起こす。
+    ポーリング間隔は経過時間と音声の長さに応じて伸ばし、Retry-Afterが返された場合はそれに従う。
+    Webhookの完了通知がこのポーラーに届いている間(set_webhook_active)は、
+    ポーリングを webhook_interval 間隔の保険のみにする。
+    """
+
+    def __init__(
+        self,
+        az_speech_client: "AzSpeechClient",
+        min_interval: float = 2.0,
+        max_interval: float = 30.0,
+        backoff_ratio: float = 0.2,
+        max_concurrent_polls: int = 10,
+        webhook_interval: float | None = None,
+    ):
+        self._az_speech_client = az_speech_client
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff_ratio = backoff_ratio
+        self.webhook_interval = webhook_interval
+        self._webhook_active = False
+        self._poll_semaphore = asyncio.Semaphore(max_concurrent_polls)
+        self._entries: dict[str, _PollEntry] = {}
+        self._wakeup = asyncio.Event()
+        self._loop_task: asyncio.Task | None = None
+
+    async def wait(
+        self,
+        job_url: str,
+        audio_duration: float | None = None,
+        timeout_seconds: float = 7200,
+    ) -> str:
+        """ジョブの完了を待機し、結果ファイル一覧のURLを返す"""
+        loop = asyncio.get_running_loop()
+        entry = self._entries.get(job_url)
+        if entry is None:
+            now = loop.time()
+            entry = _PollEntry(
+                future=loop.create_future(),
+                started_at=now,
+                deadline=now + timeout_seconds,
+                next_poll_at=now + self.min_interval,
+                audio_duration=audio_duration,
+            )
+            self._entries[job_url] = entry
+        else:
+            entry.waiters += 1
+        self._ensure_loop()
+        self._wakeup.set()
+
+        try:
+            files_url = await asyncio.shield(entry.future)
+            # 待機側のトレースに、ポーリングで確認したジョブの待ち時間と実行時間を記録する
+            if entry.running_at is not None:
+                record_span("speech.queued", entry.started_at, entry.running_at)
+                record_span("speech.running", entry.running_at, loop.time())
+            return files_url
+        finally:
+            entry.waiters -= 1
+            if entry.waiters <= 0 and not entry.future.done():
+                # 待機側がいなくなったジョブは監視を止める
+                entry.future.cancel()
+                self._entries.pop(job_url, None)
+
+    def poll_now(self, job_url: str) -> bool:
+        """
+        外部(Webhookなど)からの通知を受け、指定ジョブの状態をすぐに確認させる。
+        URLの表記ゆれを避けるため、末尾のジョブIDで照合する。監視中のジョブであればTrue
+        """
+        job_id = self._job_id(job_url)
+        for url, entry in self._entries.items():
+            if self._job_id(url) == job_id:
+                entry.poll_requested = True
+                entry.next_poll_at = 0.0
+                self._wakeup.set()
+                return True
+        return False
+
+    def set_webhook_active(self, active: bool) -> None:
+        """
+        Webhookの完了通知がこのポーラーに届くかを設定する。
+        無効になった場合は、低頻度に延ばしていた次回の確認を通常の間隔に戻す。
+        """
+        active = active and self.webhook_interval is not None
+        if active == self._webhook_active:
+            return
+        self._webhook_active = active
+        if not active:
+            now = asyncio.get_running_loop().time()
+            for entry in self._entries.values():
+                entry.next_poll_at = min(entry.next_poll_at, now + self.min_interval)
+            self._wakeup.set()
+
+    @staticmethod
+    def _job_id(job_url: str) -> str:
+        return job_url.split("?")[0].rstrip("/").rsplit("/", 1)[-1].lower()
+
+    def complete(self, job_url: str, files_url: str) -> bool:
+        """外部(Webhookなど)からジョブの完了を通知する。監視中のジョブであればTrue"""
+        entry = self._entries.pop(job_url, None)
+        if entry is None or entry.future.done():
+            return False
+        if entry.running_at is not None:
+            PIPELINE_STAGE_SECONDS.labels(stage="speech_run").observe(
+                asyncio.get_running_loop().time() - entry.running_at
+            )
+        entry.future.set_result(files_url)
+        return True
+
+    def fail(self, job_url: str, error: Exception) -> bool:
+        """外部からジョブの失敗を通知する。監視中のジョブであればTrue"""
+        entry = self._entries.pop(job_url, None)
+        if entry is None or entry.future.done():
+            return False
+        entry.future.set_exception(error)
+        return True
+
+    @property
+    def pending_count(self) -> int:
+        """監視中のジョブ数"""
+        return len(self._entries)
+
+    async def close(self) -> None:
+        """監視ループを停止し、待機中のジョブをキャンセルする"""
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            await asyncio.gather(self._loop_task, return_exceptions=True)
+            self._loop_task = None
+        for entry in self._entries.values():
+            entry.future.cancel()
+        self._entries.clear()
+
+    def _ensure_loop(self) -> None:
+        if self._loop_task is None or self._loop_task.done():
+            self._loop_task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            self._wakeup.clear()
+            now = loop.time()
+            due = [
+                (job_url, entry)
+                for job_url, entry in self._entries.items()
+                if entry.next_poll_at <= now
+            ]
+            if due:
+                await asyncio.gather(
+                    *[self._poll(job_url, entry) for job_url, entry in due]
+                )
+                continue
+
+            if self._entries:
+                sleep_for = min(e.next_poll_at for e in self._entries.values()) - now
+            else:
+                sleep_for = None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=sleep_for)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _poll(self, job_url: str, entry: _PollEntry) -> None:
+        loop = asyncio.get_running_loop()
+        retry_after: float | None = None
+        entry.poll_requested = False
+        try:
+            async with self._poll_semaphore:
+                status_data = await self._az_speech_client.get_transcription_status(
+                    job_url
+                )
+            if self._resolve(job_url, entry, status_data):
+                return
+        except HTTPException as e:
+            if e.status_code != 429 and e.status_code < 500:
+                self.fail(job_url, e)
+                return
+            retry_after = self._parse_retry_after(e.headers)
+            logger.warning(f"ジョブ状態の取得に失敗、再試行します: {job_url} ({e.detail})")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            # 接続断・応答の途中切断などは一時的な失敗として再試行する
+            logger.warning(f"ジョブ状態の取得に失敗、再試行します: {job_url} ({e!r})")
+        except Exception as e:
+            # 不正な応答などはこのジョブのみ失敗させ、他のジョブの監視は続ける
+            logger.exception(f"ジョブ状態の確認に失敗: {job_url}")
+            self.fail(job_url, HTTPException(500, f"ジョブ状態の確認に失敗: {e!r}"))
+            return
+
+        now = loop.time()
+        if now > entry.deadline:
+            self.fail(job_url, HTTPException(500, "ジョブのタイムアウト"))
+            return
+        if entry.poll_requested:
+            # 状態取得中に完了通知が届いた場合はすぐに再確認する
+            entry.next_poll_at = now
+        else:
+            entry.next_poll_at = now + (retry_after or self._next_interval(entry, now))
+
+    def _resolve(
+        self, job_url: str, entry: _PollEntry, status_data: dict[str, Any]
+    ) -> bool:
+        """ジョブが終了していれば待機側に結果を返す"""
+        status = status_data.get("status")
+        if status == "Running" and entry.running_at is None:
+            entry.running_at = asyncio.get_running_loop().time()
+            PIPELINE_STAGE_SECONDS.labels(stage="speech_queue").observe(
+                entry.running_at - entry.started_at
+            )
+        if status == "Succeeded":
+            self.complete(job_url, status_data["links"]["files"])
+            return True
+        if status in ["Failed", "Cancelled"]:
+            self.fail(job_url, HTTPException(500, f"ジョブ失敗: {status}"))
+            return True
+        return False
+
+    def _next_interval(self, entry: _PollEntry, now: float) -> float:
+        """
+        経過時間に比例して間隔を伸ばす。音声の長さが分かっている場合は
+        短い音声ほど上限を小さくし、完了を早く検知する。
+        """
+        if self._webhook_active:
+            return self.webhook_interval
+        elapsed = now - entry.started_at
+        interval = max(self.min_interval, elapsed * self.backoff_ratio)
+        if entry.audio_duration is not None:
+            interval = min(interval, max(self.min_interval, entry.audio_duration * 0.05))
+        return min(interval, self.max_interval)
+
+    @staticmethod
+    def _parse_retry_after(headers: dict[str, str] | None) -> float | None:
+        if not headers:
+            return None
+        value = headers.get("Retry-After")
+        try:
+            return float(value) if value is not None else None
+        except ValueError:
+            return None
@@ -0,0 +1,166 @@
+import hashlib
+import io
+import json
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import IO, Any, Iterator
+
+# writer の一時ファイルからSQLiteにコピーする単位
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class ContentCache:
+    """
+    内容のハッシュをキーとするSQLiteキャッシュ。
+    音声のハッシュから文字起こし結果、プロンプトとモデルのハッシュから要約結果を引く。
+    合計サイズが上限を超えた場合は最後に参照された時刻が古い順に削除する。
+    """
+
+    def __init__(self, db_path: str, max_bytes: int = 512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._stats: dict[str, dict[str, int]] = defaultdict(
+            lambda: {"hits": 0, "misses": 0}
+        )
+        self._conn = sqlite3.connect(
+            db_path, check_same_thread=False, isolation_level=None, timeout=30
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_entries_accessed ON entries (accessed_at)"
+        )
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """任意の値の組からキャッシュキー(SHA-256)を生成する"""
+        payload = json.dumps(parts, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, namespace: str, key: str) -> str | None:
+        """キャッシュを取得する。存在しない場合はNone"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM entries WHERE namespace = ? AND key = ?",
+                (namespace, key),
+            ).fetchone()
+            if row is None:
+                self._stats[namespace]["misses"] += 1
+                return None
+            self._conn.execute(
+                "UPDATE entries SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                (time.time(), namespace, key),
+            )
+            self._stats[namespace]["hits"] += 1
+            # writer で保存した値はBLOBとして格納されている
+            value = row[0]
+            return value.decode() if isinstance(value, bytes) else value
+
+    def set(self, namespace: str, key: str, value: str) -> None:
+        """キャッシュを保存し、上限を超えた分を削除する"""
+        size = len(value.encode())
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (namespace, key, value, size, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (namespace, key, value, size, time.time()),
+            )
+            self._evict()
+
+    @contextmanager
+    def writer(self, namespace: str, key: str) -> Iterator[IO[str]]:
+        """
+        値を少しずつ書き込んで保存する。with ブロックを例外なく抜けた場合のみ保存する。
+        書き込んだ内容は一時ファイルに置き、SQLiteにもチャンク単位でコピーするため値全体をメモリに持たない。
+        """
+        with tempfile.TemporaryFile() as file:
+            text = io.TextIOWrapper(file, encoding="utf-8", newline="")
+            yield text
+            text.flush()
+            size = file.tell()
+            if size > self.max_bytes:
+                return
+            file.seek(0)
+            with self._lock:
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    cursor = self._conn.execute(
+                        "INSERT OR REPLACE INTO entries "
+                        "(namespace, key, value, size, accessed_at) "
+                        "VALUES (?, ?, zeroblob(?), ?, ?)",
+                        (namespace, key, size, size, time.time()),
+                    )
+                    with self._conn.blobopen("entries", "value", cursor.lastrowid) as blob:
+                        while chunk := file.read(COPY_CHUNK_SIZE):
+                            blob.write(chunk)
+                    self._conn.execute("COMMIT")
+                except Exception:
+                    self._conn.execute("ROLLBACK")
+                    raise
+                self._evict()
+
+    def metrics(self) -> dict[str, Any]:
+        """名前空間ごとのヒット・ミス数と使用量を返す"""
+        with self._lock:
+            entries, total_bytes = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+            stats = {
+                namespace: {
+                    **counts,
+                    "hit_ratio": (
+                        counts["hits"] / (counts["hits"] + counts["misses"])
+                        if counts["hits"] + counts["misses"]
+                        else 0.0
+                    ),
+                }
+                for namespace, counts in self._stats.items()
+            }
+        return {
+            "entries": entries,
+            "total_bytes": total_bytes,
+            "max_bytes": self.max_bytes,
+            "namespaces": stats,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _evict(self) -> None:
+        """合計サイズが上限以下になるまで参照が古いエントリを削除する"""
+        (total,) = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute(
+            "SELECT namespace, key, size FROM entries ORDER BY accessed_at"
+        )
+        to_delete = []
+        for namespace, key, size in rows:
+            if total <= self.max_bytes:
+                break
+            to_delete.append((namespace, key))
+            total -= size
+        self._conn.executemany(
+            "DELETE FROM entries WHERE namespace = ? AND key = ?", to_delete
+        )
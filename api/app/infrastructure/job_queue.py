@@ -0,0 +1,210 @@
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any
+
+
+class JobQueue(ABC):
+    """
+    文字起こしジョブのキューのインターフェース。
+    取り出したジョブにはリース期限を付け、期限切れのジョブは再び取り出し可能になる。
+    これにより、ワーカーが停止しても処理中のジョブは再起動後に再開される。
+    """
+
+    @abstractmethod
+    def enqueue(self, job_id: str, payload: dict[str, Any]) -> None:
+        """ジョブを追加する"""
+
+    @abstractmethod
+    def claim(self, worker_id: str, lease_seconds: float) -> dict[str, Any] | None:
+        """実行可能なジョブを1件取り出す。なければNone"""
+
+    @abstractmethod
+    def renew(self, job_id: str, worker_id: str, lease_seconds: float) -> None:
+        """処理中ジョブのリースを延長する"""
+
+    @abstractmethod
+    def complete(self, job_id: str) -> None:
+        """ジョブを完了としてキューから削除する"""
+
+    @abstractmethod
+    def retry(self, job_id: str, delay_seconds: float, error: str) -> None:
+        """ジョブを遅延付きでキューに戻す"""
+
+    @abstractmethod
+    def depth(self) -> int:
+        """未完了のジョブ数を返す"""
+
+    def close(self) -> None:
+        """キューが保持するリソースを解放する"""
+
+
+class InMemoryJobQueue(JobQueue):
+    """プロセス内のみで有効なジョブキュー(テスト・単一プロセス向け)"""
+
+    def __init__(self):
+        self._jobs: dict[str, dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def enqueue(self, job_id: str, payload: dict[str, Any]) -> None:
+        with self._lock:
+            self._jobs[job_id] = {
+                "job_id": job_id,
+                "payload": payload,
+                "attempts": 0,
+                "available_at": time.time(),
+                "locked_by": None,
+                "locked_until": 0.0,
+                "enqueued_at": time.time(),
+            }
+
+    def claim(self, worker_id: str, lease_seconds: float) -> dict[str, Any] | None:
+        now = time.time()
+        with self._lock:
+            candidates = [
+                job
+                for job in self._jobs.values()
+                if job["available_at"] <= now and job["locked_until"] <= now
+            ]
+            if not candidates:
+                return None
+            job = min(candidates, key=lambda j: j["enqueued_at"])
+            job["attempts"] += 1
+            job["locked_by"] = worker_id
+            job["locked_until"] = now + lease_seconds
+            return {
+                "job_id": job["job_id"],
+                "payload": job["payload"],
+                "attempts": job["attempts"],
+            }
+
+    def renew(self, job_id: str, worker_id: str, lease_seconds: float) -> None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job["locked_by"] == worker_id:
+                job["locked_until"] = time.time() + lease_seconds
+
+    def complete(self, job_id: str) -> None:
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def retry(self, job_id: str, delay_seconds: float, error: str) -> None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job["available_at"] = time.time() + delay_seconds
+                job["locked_by"] = None
+                job["locked_until"] = 0.0
+                job["last_error"] = error
+
+    def depth(self) -> int:
+        with self._lock:
+            return len(self._jobs)
+
+
+class SqliteJobQueue(JobQueue):
+    """
+    SQLiteファイルに保存する永続ジョブキュー。
+    APIプロセスが追加したジョブを別プロセスのワーカーが取り出せる。
+    """
+
+    def __init__(self, db_path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            db_path, check_same_thread=False, isolation_level=None, timeout=30
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                available_at REAL NOT NULL,
+                locked_by TEXT,
+                locked_until REAL NOT NULL DEFAULT 0,
+                last_error TEXT,
+                enqueued_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_jobs_available "
+            "ON jobs (available_at, locked_until)"
+        )
+
+    def enqueue(self, job_id: str, payload: dict[str, Any]) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO jobs (job_id, payload, available_at, enqueued_at) "
+                "VALUES (?, ?, ?, ?)",
+                (job_id, json.dumps(payload), now, now),
+            )
+
+    def claim(self, worker_id: str, lease_seconds: float) -> dict[str, Any] | None:
+        now = time.time()
+        with self._lock:
+            # 複数プロセスから同時に取り出されないよう書き込みロックを先に取る
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT job_id, payload, attempts FROM jobs "
+                    "WHERE available_at <= ? AND locked_until <= ? "
+                    "ORDER BY enqueued_at LIMIT 1",
+                    (now, now),
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                job_id, payload, attempts = row
+                self._conn.execute(
+                    "UPDATE jobs SET attempts = ?, locked_by = ?, locked_until = ? "
+                    "WHERE job_id = ?",
+                    (attempts + 1, worker_id, now + lease_seconds, job_id),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return {"job_id": job_id, "payload": json.loads(payload), "attempts": attempts + 1}
+
+    def renew(self, job_id: str, worker_id: str, lease_seconds: float) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET locked_until = ? WHERE job_id = ? AND locked_by = ?",
+                (time.time() + lease_seconds, job_id, worker_id),
+            )
+
+    def complete(self, job_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+
+    def retry(self, job_id: str, delay_seconds: float, error: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET available_at = ?, locked_by = NULL, locked_until = 0, "
+                "last_error = ? WHERE job_id = ?",
+                (time.time() + delay_seconds, error, job_id),
+            )
+
+    def depth(self) -> int:
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM jobs").fetchone()
+        return count
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def create_job_queue(backend: str, db_path: str) -> JobQueue:
+    """設定に応じたジョブキューを生成する"""
+    if backend == "sqlite":
+        return SqliteJobQueue(db_path)
+    if backend == "memory":
+        return InMemoryJobQueue()
+    raise ValueError(f"不明なジョブキュー: {backend}")
@@ -1,103 +1,216 @@
-import msal
-import requests
-from functools import cache
-from typing import Any
+import asyncio
+import logging
+import os
+import random
+import time
 from pathlib import Path
+from typing import Any, Awaitable, BinaryIO, Callable
 
+import aiohttp
+from aiofiles import open as aio_open
+from fastapi import HTTPException
+from opentelemetry.trace import SpanKind
 
-class MsSharePointClient:
-    def __init__(self, client_id: str, client_secret: str, tenant_id: str):
-        """SharePointクライアントの初期化"""
-        self.client_id = client_id
-        self.client_secret = client_secret
-        self.tenant_id = tenant_id
-        self.authority = f"https://login.microsoftonline.com/{tenant_id}"
-        self.scope = ["https://graph.microsoft.com/.default"]
-        self.access_token: str | None = None
-        self._get_access_token()
-
-    def _get_access_token(self) -> None:
-        """MSALを使用してアクセストークンを取得"""
-        app = msal.ConfidentialClientApplication(
-            self.client_id,
-            authority=self.authority,
-            client_credential=self.client_secret,
-        )
-        result = app.acquire_token_for_client(scopes=self.scope)
+from app.utils.tracing import tracer
+from app.utils.ttl_cache import AsyncTTLCache
+
+logger = logging.getLogger(__name__)
+
+GRAPH_ENDPOINT = "https://graph.microsoft.com/v1.0"
+AUTHORITY_HOST = "https://login.microsoftonline.com"
+# アップロードセッションの分割サイズは320KiBの倍数である必要がある
+UPLOAD_RANGE_UNIT = 320 * 1024
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class GraphTokenProvider:
+    """
+    クライアント資格情報フローでGraph APIのアクセストークンを取得し、有効期限までキャッシュする。
+    期限の refresh_margin 秒前からは現在のトークンを返しつつバックグラウンドで更新し、
+    期限切れ直前(expiry_margin 秒前)以降は更新の完了を待つ。同時の更新要求は1回にまとめる。
+    """
 
+    def __init__(
+        self,
+        session: aiohttp.ClientSession,
+        client_id: str,
+        client_secret: str,
+        tenant_id: str,
+        authority_host: str = AUTHORITY_HOST,
+        refresh_margin: float = 300.0,
+        expiry_margin: float = 30.0,
+    ):
+        self._session = session
+        self._client_id = client_id
+        self._client_secret = client_secret
+        self._token_url = f"{authority_host}/{tenant_id}/oauth2/v2.0/token"
+        self.refresh_margin = refresh_margin
+        self.expiry_margin = expiry_margin
+        self._access_token: str | None = None
+        self._expires_at = 0.0
+        self._refresh_task: asyncio.Task | None = None
+
+    async def get_token(self) -> str:
+        """有効なアクセストークンを返す"""
+        remaining = self._expires_at - time.monotonic()
+        if self._access_token is not None and remaining > self.expiry_margin:
+            if remaining <= self.refresh_margin:
+                self._start_refresh()
+            return self._access_token
+        await asyncio.shield(self._start_refresh())
+        return self._access_token
+
+    async def close(self) -> None:
+        if self._refresh_task is not None and not self._refresh_task.done():
+            self._refresh_task.cancel()
+
+    def _start_refresh(self) -> asyncio.Task:
+        """トークンの更新を開始する(更新中の場合はそのタスクを返す)"""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh())
+            self._refresh_task.add_done_callback(self._log_refresh_error)
+        return self._refresh_task
+
+    async def _refresh(self) -> None:
+        """トークンエンドポイントからアクセストークンを取得する"""
+        form = {
+            "grant_type": "client_credentials",
+            "client_id": self._client_id,
+            "client_secret": self._client_secret,
+            "scope": "https://graph.microsoft.com/.default",
+        }
+        try:
+            async with self._session.post(self._token_url, data=form) as response:
+                if response.status != 200:
+                    raise HTTPException(
+                        status_code=response.status,
+                        detail=f"アクセストークンの取得に失敗しました: {await response.text()}",
+                    )
+                result = await response.json(content_type=None)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise HTTPException(502, f"アクセストークンの取得に失敗しました: {str(e)}")
         if "access_token" not in result:
             raise ValueError("アクセストークンの取得に失敗しました")
+        self._access_token = result["access_token"]
+        self._expires_at = time.monotonic() + float(result.get("expires_in", 3600))
 
-        self.access_token = result["access_token"]
+    @staticmethod
+    def _log_refresh_error(task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Graphトークンの更新に失敗: {task.exception()}")
 
-    def _validate_token(self) -> None:
-        """アクセストークンの有無を確認"""
-        if self.access_token is None:
-            raise ValueError("アクセストークンが設定されていません")
 
-    @cache
-    def graph_api_get(self, endpoint: str) -> requests.Response | None:
-        """Graph APIのGETリクエストを実行"""
-        self._validate_token()
-        return requests.get(
-            endpoint, headers={"Authorization": f"Bearer {self.access_token}"}
+class MsSharePointClient:
+    """
+    SharePoint(Microsoft Graph API)のクライアント。
+    アプリ全体のaiohttpセッションを共有し、アクセストークンは GraphTokenProvider でキャッシュする。
+    サイト・フォルダ一覧は有効期限付きでキャッシュし、アップロード先のフォルダはアップロード後に破棄する。
+    """
+
+    def __init__(
+        self,
+        session: aiohttp.ClientSession,
+        client_id: str,
+        client_secret: str,
+        tenant_id: str,
+        graph_endpoint: str = GRAPH_ENDPOINT,
+        authority_host: str = AUTHORITY_HOST,
+        simple_upload_max_size: int = 4 * 1024 * 1024,
+        upload_range_size: int = 32 * UPLOAD_RANGE_UNIT,
+        upload_max_retries: int = 5,
+        upload_max_session_restarts: int = 2,
+        directory_cache_ttl: float = 60.0,
+        directory_cache_max_entries: int = 256,
+    ):
+        """SharePointクライアントの初期化(トークンは初回のリクエスト時に取得する)"""
+        self._session = session
+        self.graph_endpoint = graph_endpoint
+        self.simple_upload_max_size = simple_upload_max_size
+        # 分割サイズは320KiB単位に切り下げる(最低320KiB)
+        self.upload_range_size = max(
+            UPLOAD_RANGE_UNIT, upload_range_size // UPLOAD_RANGE_UNIT * UPLOAD_RANGE_UNIT
+        )
+        self.upload_max_retries = upload_max_retries
+        # セッションの作り直しは範囲の再試行とは別に数える
+        self.upload_max_session_restarts = upload_max_session_restarts
+        self.directory_cache = AsyncTTLCache(
+            ttl_seconds=directory_cache_ttl, max_entries=directory_cache_max_entries
+        )
+        self._token_provider = GraphTokenProvider(
+            session,
+            client_id=client_id,
+            client_secret=client_secret,
+            tenant_id=tenant_id,
+            authority_host=authority_host,
         )
 
-    def graph_api_put(self, endpoint: str, data: Any) -> requests.Response | None:
+    async def close(self) -> None:
+        await self._token_provider.close()
+
+    async def graph_api_get(self, endpoint: str) -> dict[str, Any]:
+        """Graph APIのGETリクエストを実行"""
+        return await self._make_request("GET", endpoint)
+
+    async def graph_api_put(self, endpoint: str, data: Any) -> dict[str, Any]:
         """Graph APIのPUTリクエストを実行"""
-        self._validate_token()
-        return requests.put(
-            url=endpoint,
-            headers={"Authorization": f"Bearer {self.access_token}"},
-            data=data,
-        )
+        return await self._make_request("PUT", endpoint, data=data)
+
+    def invalidate_directory_cache(
+        self, site_id: str | None = None, folder_id: str | None = None
+    ) -> None:
+        """
+        サイト・フォルダ一覧のキャッシュを破棄する。
+        site_id と folder_id を指定した場合はそのフォルダの一覧、site_id のみの場合はサイト配下すべて。
+        """
+        if site_id is None:
+            self.directory_cache.clear()
+        elif folder_id is None:
+            self.directory_cache.invalidate_where(
+                lambda key: key[0] == "children" and key[1] == site_id
+            )
+        else:
+            self.directory_cache.invalidate(("children", site_id, folder_id))
 
-    def get_sites(self) -> dict:
+    async def get_sites(self) -> dict:
         """SharePointのサイト一覧を取得"""
-        response = self.graph_api_get("https://graph.microsoft.com/v1.0/sites")
-        return response.json()
+        return await self.directory_cache.get_or_load(
+            ("sites",), lambda: self.graph_api_get(f"{self.graph_endpoint}/sites")
+        )
 
-    def get_site_id(self, site_name: str) -> str | None:
+    async def get_site_id(self, site_name: str) -> str | None:
         """サイト名からサイトIDを取得"""
-        sites = self.get_sites()
+        sites = await self.get_sites()
         for site in sites["value"]:
             if site["name"] == site_name:
                 return site["id"]
         return None
 
-    def get_folders(self, site_id: str, folder_id: str = "root") -> dict | None:
+    async def get_folders(self, site_id: str, folder_id: str = "root") -> dict | None:
         """指定したサイトのフォルダ一覧を取得"""
-        response = self.graph_api_get(
-            f"https://graph.microsoft.com/v1.0/sites/{site_id}/drive/items/{folder_id}/children"
+        data = await self.directory_cache.get_or_load(
+            ("children", site_id, folder_id),
+            lambda: self.graph_api_get(
+                f"{self.graph_endpoint}/sites/{site_id}/drive/items/{folder_id}/children"
+            ),
         )
-        if response is None:
-            return None
-
-        data = response.json()
         if "value" not in data:
             return data
 
-        data["value"] = [item for item in data["value"] if "folder" in item]
-        return data
+        # キャッシュした値は変更せず、絞り込んだ結果を新しく作って返す
+        return {**data, "value": [item for item in data["value"] if "folder" in item]}
 
-    def get_folder_id(
+    async def get_folder_id(
         self, site_id: str, folder_name: str, folder_id: str = "root"
     ) -> str | None:
         """フォルダ名からフォルダIDを取得"""
-        folders = self.get_folders(site_id, folder_id)
-        if folders is None:
-            return None
-
-        for folder in folders["value"]:
-            if folder["name"] == folder_name:
-                return folder["id"]
-        return None
+        folder = await self.get_folder(site_id, folder_name, folder_id)
+        return folder["id"] if folder is not None else None
 
-    def get_folder(
+    async def get_folder(
         self, site_id: str, folder_name: str, folder_id: str = "root"
     ) -> dict | None:
         """フォルダ名からフォルダ情報を取得"""
-        folders = self.get_folders(site_id, folder_id)
+        folders = await self.get_folders(site_id, folder_id)
         if folders is None:
             return None
 
@@ -106,22 +219,271 @@ class MsSharePointClient:
                 return folder
         return None
 
-    def get_folder_id_from_tree(
+    async def get_folder_id_from_tree(
         self, site_id: str, sharepoint_directory: str, folder_id: str = "root"
     ) -> str | None:
         """ディレクトリツリーの最下層フォルダIDを取得"""
-        return self.get_folder_id(site_id, sharepoint_directory, folder_id)
+        return await self.get_folder_id(site_id, sharepoint_directory, folder_id)
 
-    def get_subfolders(self, site_id: str, folder_id: str) -> dict | None:
+    async def get_subfolders(self, site_id: str, folder_id: str) -> dict | None:
         """指定フォルダ内のサブフォルダ一覧を取得"""
-        return self.get_folders(site_id, folder_id)
+        return await self.get_folders(site_id, folder_id)
+
+    async def upload_file(
+        self,
+        target_site_id: str,
+        folder_id: str,
+        file_path: Path,
+        on_progress: Callable[[int, int], Awaitable[None]] | None = None,
+    ) -> dict[str, Any]:
+        """
+        ファイルをアップロードし、作成されたドライブアイテムを返す。
+        simple_upload_max_size を超えるファイルはアップロードセッションで分割して送信する。
+        on_progress には(送信済みバイト数, 全体のバイト数)を渡す。
+        """
+        file_path = Path(file_path)
+        async with aio_open(file_path, "rb") as f:
 
-    def upload_file(self, target_site_id: str, folder_id: str, file_path: Path) -> None:
-        """ファイルをアップロード"""
+            async def read_range(offset: int, length: int) -> bytes:
+                await f.seek(offset)
+                return await f.read(length)
+
+            return await self._upload(
+                target_site_id,
+                folder_id,
+                file_path.name,
+                os.path.getsize(file_path),
+                read_range,
+                on_progress,
+            )
+
+    async def upload_fileobj(
+        self,
+        target_site_id: str,
+        folder_id: str,
+        file_name: str,
+        file: BinaryIO,
+        size: int,
+        on_progress: Callable[[int, int], Awaitable[None]] | None = None,
+    ) -> dict[str, Any]:
+        """メモリ上(SpooledTemporaryFile など)のファイルをアップロードする"""
+
+        def read(offset: int, length: int) -> bytes:
+            file.seek(offset)
+            return file.read(length)
+
+        async def read_range(offset: int, length: int) -> bytes:
+            return await asyncio.to_thread(read, offset, length)
+
+        return await self._upload(
+            target_site_id, folder_id, file_name, size, read_range, on_progress
+        )
+
+    async def _upload(
+        self,
+        target_site_id: str,
+        folder_id: str,
+        file_name: str,
+        total_size: int,
+        read_range: Callable[[int, int], Awaitable[bytes]],
+        on_progress: Callable[[int, int], Awaitable[None]] | None,
+    ) -> dict[str, Any]:
+        """サイズに応じて単純アップロードかアップロードセッションで送信する"""
         if not folder_id:
             raise ValueError("フォルダが見つかりません")
 
-        url = f"https://graph.microsoft.com/v1.0/sites/{target_site_id}/drive/items/{folder_id}:/{file_path.name}:/content"
+        item_path = f"{self.graph_endpoint}/sites/{target_site_id}/drive/items/{folder_id}:/{file_name}:"
+        simple = total_size <= self.simple_upload_max_size
+
+        with tracer.start_as_current_span(
+            "sharepoint.upload",
+            attributes={
+                "sharepoint.file_name": file_name,
+                "sharepoint.size": total_size,
+                "sharepoint.upload_mode": "simple" if simple else "session",
+            },
+        ):
+            try:
+                if simple:
+                    item = await self.graph_api_put(
+                        f"{item_path}/content", await read_range(0, total_size)
+                    )
+                    if on_progress is not None:
+                        await on_progress(total_size, total_size)
+                    return item
+
+                return await self._upload_with_session(
+                    item_path, read_range, total_size, on_progress
+                )
+            finally:
+                # 途中で失敗した場合もフォルダの中身は変わり得るため破棄する
+                self.invalidate_directory_cache(target_site_id, folder_id)
+
+    async def _upload_with_session(
+        self,
+        item_path: str,
+        read_range: Callable[[int, int], Awaitable[bytes]],
+        total_size: int,
+        on_progress: Callable[[int, int], Awaitable[None]] | None,
+    ) -> dict[str, Any]:
+        """
+        アップロードセッションを作成し、固定サイズの範囲を順に送信する。
+        Graphは範囲を先頭から順に受け付けるため、送信は1範囲ずつ行う。
+        一時的なエラーの後はセッションに次の送信位置を問い合わせて再開し、
+        セッションが失効した場合は作り直して先頭から送信する(進捗も0に戻して通知する)。
+        """
+        upload_url = await self._create_upload_session(item_path)
+        offset = 0
+        attempt = 0
+        session_restarts = 0
+        while True:
+            end = min(offset + self.upload_range_size, total_size) - 1
+            data = await read_range(offset, end - offset + 1)
+            try:
+                status, result = await self._put_range(
+                    upload_url, data, offset, end, total_size
+                )
+            except HTTPException as e:
+                if e.status_code == 404:
+                    # セッションの失効。最初から作り直す
+                    session_restarts += 1
+                    if session_restarts > self.upload_max_session_restarts:
+                        raise
+                    logger.warning("アップロードセッションが失効したため作り直します")
+                    upload_url = await self._create_upload_session(item_path)
+                    offset = 0
+                    attempt = 0
+                    if on_progress is not None:
+                        await on_progress(0, total_size)
+                    continue
+                attempt += 1
+                if attempt > self.upload_max_retries:
+                    raise
+                if e.status_code not in RETRYABLE_STATUS_CODES:
+                    raise
+                await asyncio.sleep(self._upload_retry_delay(attempt, e.headers))
+                offset = await self._next_expected_offset(upload_url, offset)
+                logger.warning(f"アップロードを {offset} バイト目から再開します")
+                continue
+
+            attempt = 0
+            if status in (200, 201):
+                if on_progress is not None:
+                    await on_progress(total_size, total_size)
+                return result
+            offset = self._parse_next_offset(result, end + 1)
+            if on_progress is not None:
+                await on_progress(offset, total_size)
+
+    async def _create_upload_session(self, item_path: str) -> str:
+        """アップロードセッションを作成し、アップロード先URLを返す"""
+        token = await self._token_provider.get_token()
+        try:
+            async with self._session.post(
+                f"{item_path}/createUploadSession",
+                headers={"Authorization": f"Bearer {token}"},
+                json={"item": {"@microsoft.graph.conflictBehavior": "replace"}},
+            ) as response:
+                if response.status != 200:
+                    raise HTTPException(
+                        status_code=response.status,
+                        detail=f"アップロードセッションの作成に失敗しました: {await response.text()}",
+                    )
+                return (await response.json(content_type=None))["uploadUrl"]
+        except asyncio.TimeoutError:
+            raise HTTPException(504, "Graph APIへの接続がタイムアウトしました")
+        except aiohttp.ClientError as e:
+            raise HTTPException(502, f"HTTPエラー: {str(e)}")
+
+    async def _put_range(
+        self, upload_url: str, data: bytes, start: int, end: int, total_size: int
+    ) -> tuple[int, dict[str, Any]]:
+        """
+        1範囲を送信する。アップロードURLは事前認証済みのためAuthorizationヘッダは付けない。
+        """
+        with tracer.start_as_current_span(
+            "sharepoint.upload_range",
+            kind=SpanKind.CLIENT,
+            attributes={"sharepoint.range_start": start, "sharepoint.range_end": end},
+        ):
+            return await self._send_range(upload_url, data, start, end, total_size)
+
+    async def _send_range(
+        self, upload_url: str, data: bytes, start: int, end: int, total_size: int
+    ) -> tuple[int, dict[str, Any]]:
+        try:
+            async with self._session.put(
+                upload_url,
+                data=data,
+                headers={
+                    "Content-Length": str(len(data)),
+                    "Content-Range": f"bytes {start}-{end}/{total_size}",
+                },
+            ) as response:
+                if response.status >= 400:
+                    retry_after = response.headers.get("Retry-After")
+                    raise HTTPException(
+                        status_code=response.status,
+                        detail=f"ファイルの送信に失敗しました: {await response.text()}",
+                        headers={"Retry-After": retry_after} if retry_after else None,
+                    )
+                return response.status, await response.json(content_type=None)
+        except asyncio.TimeoutError:
+            raise HTTPException(504, "Graph APIへの接続がタイムアウトしました")
+        except aiohttp.ClientError as e:
+            raise HTTPException(503, f"HTTPエラー: {str(e)}")
+
+    async def _next_expected_offset(self, upload_url: str, fallback: int) -> int:
+        """セッションの状態から次に送信すべき位置を取得する(取得できなければ fallback)"""
+        try:
+            async with self._session.get(upload_url) as response:
+                if response.status != 200:
+                    return fallback
+                return self._parse_next_offset(
+                    await response.json(content_type=None), fallback
+                )
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            return fallback
+
+    @staticmethod
+    def _parse_next_offset(result: dict[str, Any], fallback: int) -> int:
+        """nextExpectedRanges(例: ["26214400-"])の先頭から次の送信位置を取り出す"""
+        ranges = result.get("nextExpectedRanges") or []
+        if not ranges:
+            return fallback
+        return int(ranges[0].split("-")[0])
+
+    @staticmethod
+    def _upload_retry_delay(attempt: int, headers: dict[str, str] | None) -> float:
+        """Retry-Afterがあればそれを優先し、なければジッター付きの指数バックオフ"""
+        retry_after = (headers or {}).get("Retry-After")
+        if retry_after is not None:
+            try:
+                return float(retry_after)
+            except ValueError:
+                pass
+        return random.uniform(0, min(30.0, 2**attempt))
 
-        with open(file_path, "rb") as f:
-            self.graph_api_put(url, f)
+    async def _make_request(
+        self, method: str, url: str, data: Any = None
+    ) -> dict[str, Any]:
+        """Graph APIへのリクエストを実行する"""
+        token = await self._token_provider.get_token()
+        try:
+            async with self._session.request(
+                method, url, headers={"Authorization": f"Bearer {token}"}, data=data
+            ) as response:
+                if response.status >= 400:
+                    retry_after = response.headers.get("Retry-After")
+                    raise HTTPException(
+                        status_code=response.status,
+                        detail=f"Graph APIのリクエストに失敗しました: {await response.text()}",
+                        headers={"Retry-After": retry_after} if retry_after else None,
+                    )
+                if response.status == 204:
+                    return {}
+                return await response.json(content_type=None)
+        except asyncio.TimeoutError:
+            raise HTTPException(504, "Graph APIへの接続がタイムアウトしました")
+        except aiohttp.ClientError as e:
+            raise HTTPException(502, f"HTTPエラー: {str(e)}")
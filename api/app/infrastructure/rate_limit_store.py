@@ -0,0 +1,219 @@
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Callable, TypeVar
+
+T = TypeVar("T")
+
+
+@dataclass
+class TokenBucket:
+    """
+    1分あたりのトークン数(TPM)とリクエスト数(RPM)のバケットの状態。
+    時刻は複数プロセスで共有できるよう time.time() を使う。
+    """
+    tokens: float
+    requests: float
+    updated_at: float
+    paused_until: float = 0.0
+
+    def refill(self, now: float, tokens_per_minute: int, requests_per_minute: int) -> None:
+        elapsed = max(0.0, now - self.updated_at)
+        self.updated_at = now
+        if tokens_per_minute > 0:
+            self.tokens = min(
+                float(tokens_per_minute),
+                self.tokens + elapsed * tokens_per_minute / 60,
+            )
+        if requests_per_minute > 0:
+            self.requests = min(
+                float(requests_per_minute),
+                self.requests + elapsed * requests_per_minute / 60,
+            )
+
+    def wait_seconds(
+        self, now: float, tokens: int, tokens_per_minute: int, requests_per_minute: int
+    ) -> float:
+        """枠が空くまでの待機秒数(0以下なら即時実行可能)"""
+        wait = self.paused_until - now
+        if tokens_per_minute > 0:
+            needed = min(tokens, tokens_per_minute) - self.tokens
+            wait = max(wait, needed * 60 / tokens_per_minute)
+        if requests_per_minute > 0:
+            needed = 1 - self.requests
+            wait = max(wait, needed * 60 / requests_per_minute)
+        return wait
+
+    def consume(self, tokens: int, tokens_per_minute: int, requests_per_minute: int) -> None:
+        if tokens_per_minute > 0:
+            self.tokens -= min(tokens, tokens_per_minute)
+        if requests_per_minute > 0:
+            self.requests -= 1
+
+    def clamp(
+        self, remaining_tokens: int | None, remaining_requests: int | None
+    ) -> None:
+        """サーバーが返した残量の方が少なければそれに合わせる"""
+        if remaining_tokens is not None:
+            self.tokens = min(self.tokens, float(remaining_tokens))
+        if remaining_requests is not None:
+            self.requests = min(self.requests, float(remaining_requests))
+
+
+class RateLimitStore(ABC):
+    """
+    レート制限のバケットを保持するストアのインターフェース。
+    上限に0以下を指定した項目は制限しない。
+    """
+
+    def __init__(self, tokens_per_minute: int = 0, requests_per_minute: int = 0):
+        self.tokens_per_minute = tokens_per_minute
+        self.requests_per_minute = requests_per_minute
+
+    @abstractmethod
+    def try_consume(self, tokens: int) -> float:
+        """枠があれば確保して0を返し、なければ確保せずに待機秒数を返す"""
+
+    @abstractmethod
+    def clamp(self, remaining_tokens: int | None, remaining_requests: int | None) -> None:
+        """x-ratelimit-remaining-* ヘッダーの残量でバケットを補正する"""
+
+    @abstractmethod
+    def pause(self, seconds: float) -> None:
+        """指定秒数の間、すべての呼び出しを止める"""
+
+    def close(self) -> None:
+        pass
+
+    def _new_bucket(self, now: float) -> TokenBucket:
+        return TokenBucket(
+            tokens=float(self.tokens_per_minute),
+            requests=float(self.requests_per_minute),
+            updated_at=now,
+        )
+
+
+class InMemoryRateLimitStore(RateLimitStore):
+    """プロセス内のみで共有するバケット"""
+
+    def __init__(self, tokens_per_minute: int = 0, requests_per_minute: int = 0):
+        super().__init__(tokens_per_minute, requests_per_minute)
+        self._bucket = self._new_bucket(time.time())
+
+    def try_consume(self, tokens: int) -> float:
+        now = time.time()
+        self._bucket.refill(now, self.tokens_per_minute, self.requests_per_minute)
+        wait = self._bucket.wait_seconds(
+            now, tokens, self.tokens_per_minute, self.requests_per_minute
+        )
+        if wait <= 0:
+            self._bucket.consume(tokens, self.tokens_per_minute, self.requests_per_minute)
+        return wait
+
+    def clamp(self, remaining_tokens: int | None, remaining_requests: int | None) -> None:
+        self._bucket.refill(time.time(), self.tokens_per_minute, self.requests_per_minute)
+        self._bucket.clamp(remaining_tokens, remaining_requests)
+
+    def pause(self, seconds: float) -> None:
+        self._bucket.paused_until = max(self._bucket.paused_until, time.time() + seconds)
+
+
+class SqliteRateLimitStore(RateLimitStore):
+    """
+    SQLiteファイルに保存するバケット。
+    同じファイルを指定したAPIプロセスとワーカープロセスで1つの枠を共有する。
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        tokens_per_minute: int = 0,
+        requests_per_minute: int = 0,
+        name: str = "openai",
+    ):
+        super().__init__(tokens_per_minute, requests_per_minute)
+        self._name = name
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            db_path, check_same_thread=False, isolation_level=None, timeout=30
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS rate_limits (
+                name TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                requests REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                paused_until REAL NOT NULL DEFAULT 0
+            )
+            """
+        )
+
+    def try_consume(self, tokens: int) -> float:
+        def update(bucket: TokenBucket, now: float) -> float:
+            wait = bucket.wait_seconds(
+                now, tokens, self.tokens_per_minute, self.requests_per_minute
+            )
+            if wait <= 0:
+                bucket.consume(tokens, self.tokens_per_minute, self.requests_per_minute)
+            return wait
+
+        return self._update(update)
+
+    def clamp(self, remaining_tokens: int | None, remaining_requests: int | None) -> None:
+        self._update(lambda bucket, now: bucket.clamp(remaining_tokens, remaining_requests))
+
+    def pause(self, seconds: float) -> None:
+        def update(bucket: TokenBucket, now: float) -> None:
+            bucket.paused_until = max(bucket.paused_until, now + seconds)
+
+        self._update(update)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _update(self, update: Callable[[TokenBucket, float], T]) -> T:
+        """バケットを読み込んで補充し、update を適用して書き戻す(他プロセスと排他)"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT tokens, requests, updated_at, paused_until "
+                    "FROM rate_limits WHERE name = ?",
+                    (self._name,),
+                ).fetchone()
+                bucket = TokenBucket(*row) if row is not None else self._new_bucket(now)
+                bucket.refill(now, self.tokens_per_minute, self.requests_per_minute)
+                result = update(bucket, now)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO rate_limits "
+                    "(name, tokens, requests, updated_at, paused_until) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (
+                        self._name,
+                        bucket.tokens,
+                        bucket.requests,
+                        bucket.updated_at,
+                        bucket.paused_until,
+                    ),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return result
+
+
+def create_rate_limit_store(
+    db_path: str, tokens_per_minute: int = 0, requests_per_minute: int = 0
+) -> RateLimitStore:
+    """db_path を指定した場合はプロセス間で共有するSQLiteストアを生成する"""
+    if db_path:
+        return SqliteRateLimitStore(db_path, tokens_per_minute, requests_per_minute)
+    return InMemoryRateLimitStore(tokens_per_minute, requests_per_minute)
@@ -0,0 +1,170 @@
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+
+
+class SpeechNotificationStore(ABC):
+    """
+    Speech Webhookで受け取った完了通知を、ジョブを監視しているプロセスに渡すストアのインターフェース。
+    WebhookはAPIプロセスが受け取り、ジョブはワーカープロセスのポーラーが監視しているため、
+    通知は共有のストアに追記し、各プロセスは前回読んだ位置以降を読み出す。
+    Webhookの登録に成功したAPIプロセスは、有効期限付きで「Webhookが有効」であることも記録する。
+    """
+
+    def __init__(self, retention_seconds: float = 3600):
+        self.retention_seconds = retention_seconds
+
+    @abstractmethod
+    def push(self, job_url: str) -> None:
+        """完了通知を追記する(保持期間を過ぎた通知は削除する)"""
+
+    @abstractmethod
+    def read_after(self, last_id: int) -> list[tuple[int, str]]:
+        """last_id より後の通知を (通知ID, ジョブURL) の組で古い順に返す"""
+
+    @abstractmethod
+    def latest_id(self) -> int:
+        """最後の通知IDを返す。通知がなければ0"""
+
+    @abstractmethod
+    def set_webhook_active_until(self, until: float) -> None:
+        """Webhookで通知を受け取れる期限(time.time())を記録する。0で無効にする"""
+
+    @abstractmethod
+    def is_webhook_active(self) -> bool:
+        """Webhookで通知を受け取れる期限内か"""
+
+    def close(self) -> None:
+        """ストアが保持するリソースを解放する"""
+
+
+class InMemorySpeechNotificationStore(SpeechNotificationStore):
+    """プロセス内のみで有効なストア(APIプロセス内でワーカーを動かす場合)"""
+
+    def __init__(self, retention_seconds: float = 3600):
+        super().__init__(retention_seconds)
+        self._notifications: deque[tuple[int, float, str]] = deque()
+        self._last_id = 0
+        self._active_until = 0.0
+        self._lock = threading.Lock()
+
+    def push(self, job_url: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._last_id += 1
+            self._notifications.append((self._last_id, now, job_url))
+            while self._notifications and (
+                self._notifications[0][1] < now - self.retention_seconds
+            ):
+                self._notifications.popleft()
+
+    def read_after(self, last_id: int) -> list[tuple[int, str]]:
+        with self._lock:
+            return [
+                (notification_id, job_url)
+                for notification_id, _, job_url in self._notifications
+                if notification_id > last_id
+            ]
+
+    def latest_id(self) -> int:
+        with self._lock:
+            return self._last_id
+
+    def set_webhook_active_until(self, until: float) -> None:
+        with self._lock:
+            self._active_until = until
+
+    def is_webhook_active(self) -> bool:
+        with self._lock:
+            return self._active_until > time.time()
+
+
+class SqliteSpeechNotificationStore(SpeechNotificationStore):
+    """
+    SQLiteファイルに保存するストア。
+    ジョブキューと同じファイルを指定し、APIプロセスと全ワーカープロセスで共有する。
+    """
+
+    def __init__(self, db_path: str, retention_seconds: float = 3600):
+        super().__init__(retention_seconds)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            db_path, check_same_thread=False, isolation_level=None, timeout=30
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS speech_notifications (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                job_url TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS speech_webhook (
+                name TEXT PRIMARY KEY,
+                active_until REAL NOT NULL
+            )
+            """
+        )
+
+    def push(self, job_url: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO speech_notifications (job_url, created_at) VALUES (?, ?)",
+                (job_url, now),
+            )
+            self._conn.execute(
+                "DELETE FROM speech_notifications WHERE created_at < ?",
+                (now - self.retention_seconds,),
+            )
+
+    def read_after(self, last_id: int) -> list[tuple[int, str]]:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT id, job_url FROM speech_notifications WHERE id > ? ORDER BY id",
+                (last_id,),
+            ).fetchall()
+
+    def latest_id(self) -> int:
+        with self._lock:
+            (last_id,) = self._conn.execute(
+                "SELECT COALESCE(MAX(id), 0) FROM speech_notifications"
+            ).fetchone()
+        return last_id
+
+    def set_webhook_active_until(self, until: float) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO speech_webhook (name, active_until) "
+                "VALUES ('speech', ?)",
+                (until,),
+            )
+
+    def is_webhook_active(self) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT active_until FROM speech_webhook WHERE name = 'speech'"
+            ).fetchone()
+        return row is not None and row[0] > time.time()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def create_speech_notification_store(
+    backend: str, db_path: str
+) -> SpeechNotificationStore:
+    """設定(ジョブキューと同じバックエンド・ファイル)に応じたストアを生成する"""
+    if backend == "sqlite":
+        return SqliteSpeechNotificationStore(db_path)
+    if backend == "memory":
+        return InMemorySpeechNotificationStore()
+    raise ValueError(f"不明な通知ストア: {backend}")
@@ -0,0 +1,376 @@
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any
+
+from app.schemas.transcription import TaskStatus
+
+FINISHED_STATUSES = (TaskStatus.COMPLETED.value, TaskStatus.FAILED.value)
+
+
+class TaskStore(ABC):
+    """
+    タスクの状態と結果を保存するストアのインターフェース。
+    タスクのレコード(status・revision・progress・結果のテキスト)と、
+    構造化した文字起こし結果(バイナリ)は別々に保存し、進捗の更新では文字起こし結果に触れない。
+    完了・失敗したタスクはTTLと最大件数(LRU)に従って削除される。
+    """
+
+    def __init__(self, max_tasks: int = 1000, ttl_seconds: float = 86400):
+        self.max_tasks = max_tasks
+        self.ttl_seconds = ttl_seconds
+
+    @abstractmethod
+    def save(self, task_id: str, record: dict[str, Any]) -> None:
+        """
+        タスクのレコードを保存(上書き)する。record のキーは
+        status / revision / progress / transcript_revision / transcribed_text / summarized_text
+        """
+
+    @abstractmethod
+    def get(self, task_id: str) -> dict[str, Any] | None:
+        """タスクのレコードを取得する。存在しない場合はNone"""
+
+    @abstractmethod
+    def get_state(self, task_id: str) -> dict[str, Any] | None:
+        """
+        結果のテキストを読まずに status / revision / progress / transcript_revision と
+        結果の有無(has_transcript / has_summary)を取得する。存在しない場合はNone
+        """
+
+    @abstractmethod
+    def update_progress(
+        self, task_id: str, progress: dict[str, Any], revision: str
+    ) -> bool:
+        """進捗と revision のみを更新する。タスクが存在しない場合はFalse"""
+
+    @abstractmethod
+    def save_transcript(self, task_id: str, revision: str, data: bytes) -> None:
+        """文字起こし結果を保存する。保存済みの版と同じ場合は書き込まない"""
+
+    @abstractmethod
+    def get_transcript(self, task_id: str) -> tuple[str, bytes] | None:
+        """文字起こし結果を (版, バイト列) で取得する。存在しない場合はNone"""
+
+    @abstractmethod
+    def delete(self, task_id: str) -> None:
+        """タスクと文字起こし結果を削除する"""
+
+    def close(self) -> None:
+        """ストアが保持するリソースを解放する"""
+
+    @staticmethod
+    def _is_finished(record: dict[str, Any]) -> bool:
+        return record.get("status") in FINISHED_STATUSES
+
+
+class InMemoryTaskStore(TaskStore):
+    """プロセス内のみで有効な上限付きタスクストア(テスト・単一ワーカー向け)"""
+
+    def __init__(self, max_tasks: int = 1000, ttl_seconds: float = 86400):
+        super().__init__(max_tasks, ttl_seconds)
+        self._records: OrderedDict[str, tuple[float, dict[str, Any]]] = OrderedDict()
+        self._transcripts: dict[str, tuple[str, bytes]] = {}
+        self._lock = threading.Lock()
+
+    def save(self, task_id: str, record: dict[str, Any]) -> None:
+        with self._lock:
+            self._records[task_id] = (time.time(), dict(record))
+            self._records.move_to_end(task_id)
+            self._evict()
+
+    def get(self, task_id: str) -> dict[str, Any] | None:
+        with self._lock:
+            record = self._get_record(task_id)
+            return dict(record) if record is not None else None
+
+    def get_state(self, task_id: str) -> dict[str, Any] | None:
+        with self._lock:
+            record = self._get_record(task_id)
+            if record is None:
+                return None
+            return {
+                "status": record["status"],
+                "revision": record.get("revision"),
+                "progress": record.get("progress"),
+                "transcript_revision": record.get("transcript_revision"),
+                "has_transcript": bool(
+                    record.get("transcript_revision") or record.get("transcribed_text")
+                ),
+                "has_summary": bool(record.get("summarized_text")),
+            }
+
+    def update_progress(
+        self, task_id: str, progress: dict[str, Any], revision: str
+    ) -> bool:
+        with self._lock:
+            record = self._get_record(task_id)
+            if record is None:
+                return False
+            record["progress"] = progress
+            record["revision"] = revision
+            return True
+
+    def save_transcript(self, task_id: str, revision: str, data: bytes) -> None:
+        with self._lock:
+            self._transcripts[task_id] = (revision, data)
+
+    def get_transcript(self, task_id: str) -> tuple[str, bytes] | None:
+        with self._lock:
+            return self._transcripts.get(task_id)
+
+    def delete(self, task_id: str) -> None:
+        with self._lock:
+            self._remove(task_id)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def _get_record(self, task_id: str) -> dict[str, Any] | None:
+        """期限切れでないレコードを参照順を更新して返す(ロック内で呼ぶ)"""
+        entry = self._records.get(task_id)
+        if entry is None:
+            return None
+        updated_at, record = entry
+        if self._is_finished(record) and self._is_expired(updated_at):
+            self._remove(task_id)
+            return None
+        self._records.move_to_end(task_id)
+        return record
+
+    def _remove(self, task_id: str) -> None:
+        self._records.pop(task_id, None)
+        self._transcripts.pop(task_id, None)
+
+    def _is_expired(self, updated_at: float) -> bool:
+        return time.time() - updated_at > self.ttl_seconds
+
+    def _evict(self) -> None:
+        """期限切れの完了タスクを削除し、上限を超えた分を古い順に削除する"""
+        finished = [
+            task_id
+            for task_id, (updated_at, record) in self._records.items()
+            if self._is_finished(record)
+        ]
+        for task_id in finished:
+            if self._is_expired(self._records[task_id][0]):
+                self._remove(task_id)
+
+        excess = len(self._records) - self.max_tasks
+        for task_id in finished:
+            if excess <= 0:
+                break
+            if task_id in self._records:
+                self._remove(task_id)
+                excess -= 1
+
+
+class SqliteTaskStore(TaskStore):
+    """
+    SQLiteファイルに保存するタスクストア。
+    同じファイルを参照する全ワーカーからタスクの状態を取得できる。
+    文字起こし結果は別テーブルに置き、tasks の行は進捗の更新で書き換えても小さいままにする。
+    """
+
+    def __init__(
+        self, db_path: str, max_tasks: int = 1000, ttl_seconds: float = 86400
+    ):
+        super().__init__(max_tasks, ttl_seconds)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            db_path, check_same_thread=False, isolation_level=None, timeout=30
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS tasks (
+                task_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                revision TEXT,
+                progress TEXT,
+                transcript_revision TEXT,
+                transcribed_text TEXT,
+                summarized_text TEXT,
+                updated_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_tasks_status_accessed "
+            "ON tasks (status, accessed_at)"
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS task_transcripts (
+                task_id TEXT PRIMARY KEY,
+                revision TEXT NOT NULL,
+                data BLOB NOT NULL
+            )
+            """
+        )
+
+    def save(self, task_id: str, record: dict[str, Any]) -> None:
+        now = time.time()
+        progress = record.get("progress")
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO tasks (task_id, status, revision, progress, "
+                "transcript_revision, transcribed_text, summarized_text, "
+                "updated_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    task_id,
+                    record.get("status"),
+                    record.get("revision"),
+                    json.dumps(progress) if progress is not None else None,
+                    record.get("transcript_revision"),
+                    record.get("transcribed_text"),
+                    record.get("summarized_text"),
+                    now,
+                    now,
+                ),
+            )
+            self._evict(now)
+
+    def get(self, task_id: str) -> dict[str, Any] | None:
+        row = self._select(
+            task_id,
+            "revision, progress, transcript_revision, transcribed_text, summarized_text",
+        )
+        if row is None:
+            return None
+        status, revision, progress, transcript_revision, transcribed, summarized = row
+        return {
+            "status": status,
+            "revision": revision,
+            "progress": json.loads(progress) if progress is not None else None,
+            "transcript_revision": transcript_revision,
+            "transcribed_text": transcribed,
+            "summarized_text": summarized,
+        }
+
+    def get_state(self, task_id: str) -> dict[str, Any] | None:
+        row = self._select(
+            task_id,
+            "revision, progress, transcript_revision, "
+            "transcript_revision IS NOT NULL OR COALESCE(transcribed_text, '') != '', "
+            "COALESCE(summarized_text, '') != ''",
+        )
+        if row is None:
+            return None
+        status, revision, progress, transcript_revision, has_transcript, has_summary = row
+        return {
+            "status": status,
+            "revision": revision,
+            "progress": json.loads(progress) if progress is not None else None,
+            "transcript_revision": transcript_revision,
+            "has_transcript": bool(has_transcript),
+            "has_summary": bool(has_summary),
+        }
+
+    def update_progress(
+        self, task_id: str, progress: dict[str, Any], revision: str
+    ) -> bool:
+        now = time.time()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE tasks SET progress = ?, revision = ?, updated_at = ?, "
+                "accessed_at = ? WHERE task_id = ?",
+                (json.dumps(progress), revision, now, now, task_id),
+            )
+            return cursor.rowcount > 0
+
+    def save_transcript(self, task_id: str, revision: str, data: bytes) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO task_transcripts (task_id, revision, data) VALUES (?, ?, ?) "
+                "ON CONFLICT (task_id) DO UPDATE SET "
+                "revision = excluded.revision, data = excluded.data "
+                "WHERE task_transcripts.revision != excluded.revision",
+                (task_id, revision, data),
+            )
+
+    def get_transcript(self, task_id: str) -> tuple[str, bytes] | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT revision, data FROM task_transcripts WHERE task_id = ?",
+                (task_id,),
+            ).fetchone()
+        return (row[0], row[1]) if row is not None else None
+
+    def delete(self, task_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM tasks WHERE task_id = ?", (task_id,))
+            self._conn.execute(
+                "DELETE FROM task_transcripts WHERE task_id = ?", (task_id,)
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _select(self, task_id: str, columns: str) -> tuple[Any, ...] | None:
+        """
+        status と指定した列を取得し、参照時刻を更新する。
+        期限切れの完了タスクは削除してNoneを返す。
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT status, updated_at, {columns} FROM tasks WHERE task_id = ?",
+                (task_id,),
+            ).fetchone()
+            if row is None:
+                return None
+            status, updated_at, *values = row
+            if status in FINISHED_STATUSES and now - updated_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM tasks WHERE task_id = ?", (task_id,))
+                self._conn.execute(
+                    "DELETE FROM task_transcripts WHERE task_id = ?", (task_id,)
+                )
+                return None
+            self._conn.execute(
+                "UPDATE tasks SET accessed_at = ? WHERE task_id = ?", (now, task_id)
+            )
+            return (status, *values)
+
+    def _evict(self, now: float) -> None:
+        """期限切れの完了タスクを削除し、上限を超えた分をアクセスが古い順に削除する"""
+        changes = self._conn.total_changes
+        placeholders = ",".join("?" for _ in FINISHED_STATUSES)
+        self._conn.execute(
+            f"DELETE FROM tasks WHERE status IN ({placeholders}) AND updated_at < ?",
+            (*FINISHED_STATUSES, now - self.ttl_seconds),
+        )
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM tasks").fetchone()
+        excess = count - self.max_tasks
+        if excess > 0:
+            self._conn.execute(
+                f"""
+                DELETE FROM tasks WHERE task_id IN (
+                    SELECT task_id FROM tasks WHERE status IN ({placeholders})
+                    ORDER BY accessed_at LIMIT ?
+                )
+                """,
+                (*FINISHED_STATUSES, excess),
+            )
+        if self._conn.total_changes != changes:
+            self._conn.execute(
+                "DELETE FROM task_transcripts "
+                "WHERE task_id NOT IN (SELECT task_id FROM tasks)"
+            )
+
+
+def create_task_store(
+    backend: str, db_path: str, max_tasks: int, ttl_seconds: float
+) -> TaskStore:
+    """設定に応じたタスクストアを生成する"""
+    if backend == "sqlite":
+        return SqliteTaskStore(db_path, max_tasks=max_tasks, ttl_seconds=ttl_seconds)
+    if backend == "memory":
+        return InMemoryTaskStore(max_tasks=max_tasks, ttl_seconds=ttl_seconds)
+    raise ValueError(f"不明なタスクストア: {backend}")
@@ -1,15 +1,14 @@
 from fastapi import FastAPI
-import aiohttp
 from contextlib import asynccontextmanager
 import logging
 
-from app.config.get_config import get_config
-from app.infrastructure.az_client_factory import AzClientFactory
-from app.services.task_managing_service import TaskManagingService
+from app.di.app_state import init_app_state, close_app_state
 from app.middlewares.cors_middleware import configure_cors
 from app.middlewares.logging_middleware import configure_logging
 from app.routers import audio_processing_router
 from app.routers import sharepoint_router
+from app.routers import metrics_router
+from app.routers import webhook_router
 
 logging.basicConfig(
     level=logging.INFO,
@@ -23,17 +22,11 @@ logger = logging.getLogger(__name__)
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """アプリケーションのライフサイクル管理"""
-    session = aiohttp.ClientSession()
     try:
-        app.state.config = get_config()
-        app.state.session = session
-        app.state.task_managing_service = TaskManagingService()
-        app.state.az_client_factory = AzClientFactory(
-            config=app.state.config, session=session
-        )
+        await init_app_state(app.state)
         yield
     finally:
-        await session.close()
+        await close_app_state(app.state)
 
 
 app = FastAPI(lifespan=lifespan)
@@ -44,3 +37,5 @@ configure_cors(app)
 
 app.include_router(audio_processing_router.router)
 app.include_router(sharepoint_router.router)
+app.include_router(metrics_router.router)
+app.include_router(webhook_router.router)
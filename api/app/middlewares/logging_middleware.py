@@ -24,10 +24,13 @@ async def logging_middleware(request: Request, call_next):
             # Responseクラスの場合のみbodyを取得
             if hasattr(response, "body"):
                 try:
+                    # 大きなボディ全体をデコードしないよう、先頭のみを切り出してからデコードする
                     body_bytes = response.body
-                    body_for_log = body_bytes.decode("utf-8", errors="replace")
                     max_log_length = 500
-                    if len(body_for_log) > max_log_length:
+                    body_for_log = body_bytes[: max_log_length * 4].decode(
+                        "utf-8", errors="replace"
+                    )
+                    if len(body_bytes) > max_log_length * 4 or len(body_for_log) > max_log_length:
                         body_for_log = body_for_log[:max_log_length] + "...(truncated)"
                 except Exception as e:
                     body_for_log = f"<Failed to decode body: {e}>"
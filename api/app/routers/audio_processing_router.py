@@ -1,52 +1,53 @@
 import uuid
+import asyncio
+import json
+import hashlib
 import logging
-from typing import Any
+from typing import Any, AsyncIterator, Iterator
 
 from fastapi import (
     APIRouter,
-    BackgroundTasks,
     UploadFile,
     File,
     Depends,
     HTTPException,
     status,
     Request,
+    Response,
+    Query,
 )
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
 from app.schemas.transcription import Transcription
 from app.di.parse_form import parse_transcription_form
-from app.usecases.audio_processing_usecase import AudioProcessingUseCase
-from app.services.audio.mp4_processing_service import MP4ProcessingService
-from app.services.word_generating_service import WordGeneratingService
-from app.utils.file_handling import save_file_temporarily
-from app.schemas.transcription import AudioProcessingResponse, TranscriptionStatusResponse
+from app.utils.file_handling import save_file_in_chunks
+from app.schemas.transcription import (
+    AudioProcessingResponse,
+    TranscriptionStatusResponse,
+    TranscriptionProgressResponse,
+    TranscriptPageResponse,
+    SpeakerBlock,
+)
+from app.utils.speaker_blocks import parse_speaker_blocks
+from app.utils.subtitles import SUBTITLE_MEDIA_TYPES, iter_subtitles
+from app.infrastructure.content_cache import ContentCache
+from app.utils.metrics import time_stage
+from app.utils.tracing import inject_context, task_context, tracer
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 
-def _create_audio_usecase(request: Request) -> AudioProcessingUseCase:
-    """AudioProcessingUseCaseのインスタンスを生成する"""
-    az_client_factory = request.app.state.az_client_factory
-    return AudioProcessingUseCase(
-        task_managing_service=request.app.state.task_managing_service,
-        mp4_processing_service=MP4ProcessingService(),
-        word_generating_service=WordGeneratingService(),
-        az_blob_client=az_client_factory.create_az_blob_client(),
-        az_speech_client=az_client_factory.create_az_speech_client(),
-        az_openai_client=az_client_factory.create_az_openai_client(),
-        ms_sharepoint_client=az_client_factory.create_ms_sharepoint_client(),
-    )
-
-
 async def _handle_audio_operation(
     operation_name: str, operation: callable
 ) -> dict[str, Any]:
     """文字起こし操作の共通エラーハンドリング"""
     try:
         return await operation()
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"{operation_name}に失敗: {str(e)}")
         raise HTTPException(
@@ -58,7 +59,6 @@ async def _handle_audio_operation(
 @router.post("/transcription", status_code=202, response_model=AudioProcessingResponse)
 async def process_audio(
     request: Request,
-    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     site_data: Transcription | None = Depends(parse_transcription_form),
 ):
@@ -66,37 +66,250 @@ async def process_audio(
 
     async def start_audio_processing():
         task_id = str(uuid.uuid4())
-        site_data_dict = site_data.model_dump() if site_data else None
-        temp_file_path = await save_file_temporarily(file)
-
-        usecase = _create_audio_usecase(request)
-        background_tasks.add_task(
-            usecase.execute,
-            task_id=task_id,
-            site_data=site_data_dict,
-            file_path=temp_file_path,
-        )
+        with task_context(task_id), tracer.start_as_current_span(
+            "audio_processing.enqueue"
+        ):
+            site_data_dict = site_data.model_dump() if site_data else None
+            config = request.app.state.config
+            with time_stage("upload_save"):
+                saved_file = await save_file_in_chunks(
+                    file,
+                    chunk_size=config.UPLOAD_CHUNK_SIZE,
+                    max_size=config.UPLOAD_MAX_SIZE,
+                )
+            temp_file_path = saved_file["file_path"]
+
+            # APIプロセスはジョブの登録のみ行い、処理はワーカーが実行する
+            # ワーカー側のスパンをこのリクエストのトレースにつなげるため、コンテキストも渡す
+            await request.app.state.task_managing_service.queue_task(task_id)
+            await asyncio.to_thread(
+                request.app.state.job_queue.enqueue,
+                task_id,
+                {
+                    "task_id": task_id,
+                    "site_data": site_data_dict,
+                    "file_path": temp_file_path,
+                    "file_hash": saved_file["sha256"],
+                    "trace_context": inject_context(),
+                },
+            )
+            request.app.state.job_worker_service.notify()
 
-        return AudioProcessingResponse(task_id=task_id, message="処理を開始しました")
+            return AudioProcessingResponse(task_id=task_id, message="処理を開始しました")
 
     return await _handle_audio_operation("音声処理の開始", start_audio_processing)
 
 
-@router.get("/transcription/{task_id}", response_model=TranscriptionStatusResponse)
-async def get_transcription_status(
-    request: Request, task_id: str
-):
-    """タスクの処理状態と結果を取得"""
-    task_managing_service = request.app.state.task_managing_service
+async def _get_task_or_404(request: Request, task_id: str) -> dict[str, Any]:
+    task = await request.app.state.task_managing_service.get_task(task_id)
+    if task is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="タスクIDが存在しません"
+        )
+    return task
 
-    if task_id not in task_managing_service.status:
+
+async def _get_task_state_or_404(request: Request, task_id: str) -> dict[str, Any]:
+    """結果の本文を含まないタスクの状態を取得する(ETagの確認に使う)"""
+    state = await request.app.state.task_managing_service.get_task_state(task_id)
+    if state is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="タスクIDが存在しません"
         )
+    return state
+
+
+def _task_etag(task: dict[str, Any]) -> str:
+    """タスクの版からETagを生成する(revision がない古いデータは内容から生成)"""
+    revision = task.get("revision")
+    if revision is None:
+        revision = hashlib.sha256(
+            json.dumps(task, ensure_ascii=False, sort_keys=True).encode()
+        ).hexdigest()
+    return f'"{revision}"'
+
+
+def _is_not_modified(request: Request, etag: str) -> bool:
+    """If-None-Match が現在のETagと一致するか判定する"""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates
+
+
+@router.get(
+    "/transcription/{task_id}",
+    response_model=TranscriptionStatusResponse,
+    responses={304: {"description": "前回取得時から変更なし"}},
+)
+async def get_transcription_status(
+    request: Request, response: Response, task_id: str
+):
+    """タスクの処理状態と結果を取得(If-None-Match に対応)"""
+    etag = _task_etag(await _get_task_state_or_404(request, task_id))
+    if _is_not_modified(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    task = await _get_task_or_404(request, task_id)
+    # 状態の確認後に更新された場合は、返す内容に合わせたETagにする
+    response.headers["ETag"] = _task_etag(task)
 
     return TranscriptionStatusResponse(
         task_id=task_id,
-        status=task_managing_service.status[task_id],
-        transcribed_text=task_managing_service.transcribed_text[task_id],
-        summarized_text=task_managing_service.summarized_text[task_id],
+        status=task["status"],
+        transcribed_text=task["transcribed_text"],
+        summarized_text=task["summarized_text"],
+        progress=task.get("progress"),
+    )
+
+
+@router.get(
+    "/transcription/{task_id}/status",
+    response_model=TranscriptionProgressResponse,
+    responses={304: {"description": "前回取得時から変更なし"}},
+)
+async def get_transcription_progress(
+    request: Request, response: Response, task_id: str
+):
+    """本文を含まないタスクの処理状態を取得(ポーリング用)"""
+    state = await _get_task_state_or_404(request, task_id)
+    etag = _task_etag(state)
+    if _is_not_modified(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+
+    return TranscriptionProgressResponse(
+        task_id=task_id,
+        status=state["status"],
+        has_transcript=state["has_transcript"],
+        has_summary=state["has_summary"],
+        progress=state["progress"],
+    )
+
+
+@router.get(
+    "/transcription/{task_id}/transcript",
+    response_model=TranscriptPageResponse,
+    responses={304: {"description": "前回取得時から変更なし"}},
+)
+async def get_transcript_page(
+    request: Request,
+    response: Response,
+    task_id: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=500),
+    start: float | None = Query(None, ge=0, description="この秒数以降の発話のみ"),
+    end: float | None = Query(None, ge=0, description="この秒数より前の発話のみ"),
+):
+    """
+    文字起こし結果を話者ブロック単位で offset から limit 件取得。
+    start / end を指定した場合はその時間範囲と重なる発話のみを対象にする。
+    """
+    task_managing_service = request.app.state.task_managing_service
+    state = await _get_task_state_or_404(request, task_id)
+    etag = _task_etag(state)
+    if _is_not_modified(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+
+    transcript = await task_managing_service.get_transcript(task_id)
+    if transcript is not None:
+        if start is not None or end is not None:
+            transcript = transcript.between(start or 0.0, end)
+        blocks = transcript.speaker_blocks()
+    else:
+        task = await _get_task_or_404(request, task_id)
+        blocks = parse_speaker_blocks(task["transcribed_text"] or "")
+    return TranscriptPageResponse(
+        task_id=task_id,
+        status=state["status"],
+        offset=offset,
+        limit=limit,
+        total=len(blocks),
+        blocks=[SpeakerBlock(**block) for block in blocks[offset : offset + limit]],
+    )
+
+
+@router.get(
+    "/transcription/{task_id}/subtitles",
+    responses={304: {"description": "前回取得時から変更なし"}},
+)
+async def get_subtitles(
+    request: Request,
+    task_id: str,
+    format: str = Query("srt", pattern="^(srt|vtt)$"),
+):
+    """
+    文字起こし結果をSRT/WebVTT字幕として取得する。
+    初回はフレーズから逐次生成して返し、生成した字幕はキャッシュして次回以降はそれを返す。
+    """
+    task_managing_service = request.app.state.task_managing_service
+    state = await _get_task_state_or_404(request, task_id)
+    transcript_revision = state["transcript_revision"]
+    if transcript_revision is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT, detail="文字起こし結果がまだありません"
+        )
+    # 字幕は文字起こし結果のみから生成するため、進捗の更新では変わらない版を使う
+    etag = f'"{transcript_revision}"'
+    headers = {
+        "ETag": etag,
+        "Content-Disposition": f'attachment; filename="{task_id}.{format}"',
+    }
+    if _is_not_modified(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    media_type = f"{SUBTITLE_MEDIA_TYPES[format]}; charset=utf-8"
+    content_cache: ContentCache | None = request.app.state.content_cache
+    cache_key = ContentCache.make_key(task_id, transcript_revision, format)
+    if content_cache is not None:
+        cached = await asyncio.to_thread(content_cache.get, "subtitles", cache_key)
+        if cached is not None:
+            return Response(content=cached, media_type=media_type, headers=headers)
+
+    transcript = await task_managing_service.get_transcript(task_id)
+    if transcript is None:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT, detail="文字起こし結果がまだありません"
+        )
+
+    def generate() -> Iterator[str]:
+        if content_cache is None:
+            yield from iter_subtitles(transcript, format)
+            return
+        # 最後まで送信できた場合のみキャッシュに保存される
+        with content_cache.writer("subtitles", cache_key) as cache_file:
+            for cue in iter_subtitles(transcript, format):
+                cache_file.write(cue)
+                yield cue
+
+    return StreamingResponse(generate(), media_type=media_type, headers=headers)
+
+
+@router.get("/transcription/{task_id}/events")
+async def stream_transcription_events(request: Request, task_id: str):
+    """
+    タスクの進捗をServer-Sent Eventsで配信する。
+    status(状態) / stage(処理段階) / transcript(文字起こし結果) /
+    summary_delta(要約トークン) / summary_reset(要約の再試行) を送り、完了・失敗で終了する。
+    """
+    task_managing_service = request.app.state.task_managing_service
+    await _get_task_state_or_404(request, task_id)
+
+    async def event_stream() -> AsyncIterator[str]:
+        async for message in request.app.state.task_event_service.stream(
+            task_id, task_managing_service.get_task
+        ):
+            if await request.is_disconnected():
+                return
+            if message is None:
+                yield ": keep-alive\n\n"
+                continue
+            data = json.dumps(message["data"], ensure_ascii=False)
+            yield f"event: {message['event']}\ndata: {data}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
@@ -0,0 +1,46 @@
+import asyncio
+import logging
+from typing import Any
+from fastapi import APIRouter, Request, Response
+
+from app.utils.metrics import render_metrics, update_state_gauges
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+@router.get("/metrics")
+async def get_prometheus_metrics(request: Request) -> Response:
+    """段階ごとの処理時間・OpenAI呼び出し・キューの深さなどをPrometheus形式で取得する"""
+    await update_state_gauges(request.app.state)
+    content, media_type = render_metrics()
+    return Response(content=content, media_type=media_type)
+
+
+@router.get("/metrics/transcoding")
+async def get_transcoding_metrics(request: Request) -> dict[str, Any]:
+    """FFmpeg変換のキューの深さと処理時間の統計を取得する"""
+    return request.app.state.transcoding_executor.metrics()
+
+
+@router.get("/metrics/cache")
+async def get_cache_metrics(request: Request) -> dict[str, Any]:
+    """文字起こし・要約キャッシュのヒット率と使用量を取得する"""
+    content_cache = request.app.state.content_cache
+    if content_cache is None:
+        return {"enabled": False}
+    return {"enabled": True, **(await asyncio.to_thread(content_cache.metrics))}
+
+
+@router.get("/metrics/sharepoint-cache")
+async def get_sharepoint_cache_metrics(request: Request) -> dict[str, Any]:
+    """SharePointのサイト・フォルダ一覧キャッシュのヒット率を取得する"""
+    client = request.app.state.az_client_factory.create_ms_sharepoint_client()
+    return client.directory_cache.metrics()
+
+
+@router.get("/metrics/openai-rate-limit")
+async def get_openai_rate_limit_metrics(request: Request) -> dict[str, Any]:
+    """OpenAI呼び出しの同時実行数の上限・実行中・待機中の件数と429の回数を取得する"""
+    return request.app.state.openai_rate_limiter.metrics()
@@ -0,0 +1,63 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import logging
+from fastapi import APIRouter, HTTPException, status, Request
+from fastapi.responses import PlainTextResponse
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+EVENT_HEADER = "X-MicrosoftSpeechServices-Event"
+SIGNATURE_HEADER = "X-MicrosoftSpeechServices-Signature"
+
+
+def _verify_signature(body: bytes, signature: str | None, secret: str | None) -> None:
+    """Webhookに設定したシークレットで署名(HMAC-SHA256)を検証する"""
+    if not secret:
+        return
+    expected = base64.b64encode(
+        hmac.new(secret.encode(), body, hashlib.sha256).digest()
+    ).decode()
+    if signature is None or not hmac.compare_digest(expected, signature):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="署名が一致しません"
+        )
+
+
+@router.post("/webhooks/speech")
+async def receive_speech_webhook(request: Request):
+    """
+    Azure Speechからの通知を受け取り、完了したジョブの状態確認を即座に行わせる。
+    通知は共有ストアに記録し、ジョブを監視しているプロセスのポーラーが読み出す。
+    """
+    # Webhook登録時の疎通確認にはvalidationTokenをそのまま返す
+    validation_token = request.query_params.get("validationToken")
+    if validation_token is not None:
+        return PlainTextResponse(validation_token)
+
+    body = await request.body()
+    _verify_signature(
+        body,
+        request.headers.get(SIGNATURE_HEADER),
+        request.app.state.config.SPEECH_WEBHOOK_SECRET,
+    )
+
+    event = request.headers.get(EVENT_HEADER, "")
+    if event.lower() != "transcriptioncompletion":
+        return {"accepted": False}
+
+    try:
+        job_url = json.loads(body)["self"]
+    except (ValueError, KeyError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="通知の形式が不正です"
+        )
+
+    # ジョブは別プロセスのワーカーが監視している場合があるため、共有ストア経由で渡す
+    await asyncio.to_thread(request.app.state.speech_notification_store.push, job_url)
+    logger.info(f"文字起こし完了通知を受信: {job_url}")
+    return {"accepted": True}
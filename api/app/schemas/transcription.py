@@ -7,6 +7,7 @@ class Transcription(BaseModel):
 
 
 class TaskStatus(str, Enum):
+    QUEUED = "queued"
     PROCESSING = "processing"
     COMPLETED = "completed"
     FAILED = "failed"
@@ -18,9 +19,44 @@ class AudioProcessingResponse(BaseModel):
     message: str
 
 
+class TaskProgress(BaseModel):
+    """処理段階の進捗(SharePointへのアップロードなど)"""
+    stage: str
+    done: int
+    total: int
+
+
 class TranscriptionStatusResponse(BaseModel):
     """文字起こし状態のレスポンスデータ"""
     task_id: str
     status: str
     transcribed_text: str | None
     summarized_text: str | None
+    progress: TaskProgress | None = None
+
+
+class TranscriptionProgressResponse(BaseModel):
+    """文字起こし状態のみのレスポンスデータ(本文を含まない)"""
+    task_id: str
+    status: str
+    has_transcript: bool
+    has_summary: bool
+    progress: TaskProgress | None = None
+
+
+class SpeakerBlock(BaseModel):
+    """話者ごとの発話ブロック(開始・終了は秒)"""
+    speaker: int | None
+    text: str
+    start: float | None = None
+    end: float | None = None
+
+
+class TranscriptPageResponse(BaseModel):
+    """話者ブロック単位でページ分割した文字起こし結果"""
+    task_id: str
+    status: str
+    offset: int
+    limit: int
+    total: int
+    blocks: list[SpeakerBlock]
@@ -1,13 +1,20 @@
+import asyncio
 import logging
-from typing import Any
+from typing import Any, AsyncIterator
 from fastapi import HTTPException
 from app.infrastructure.az_speech import AzSpeechClient
 from app.infrastructure.az_blob import AzBlobClient
 from app.services.audio.mp4_processing_service import MP4ProcessingService
 from app.services.audio.audio_transcription_service import AudioTranscriptionService
+from app.utils.transcript import Transcript
+from app.utils.stage_limiter import StageLimiter
+from app.utils.metrics import time_stage
 
 logger = logging.getLogger(__name__)
 
+# 音声の長さを求めるために保持するWAVヘッダの先頭バイト数
+WAV_HEADER_PROBE_SIZE = 4096
+
 
 class AudioProcessingService:
     """音声処理を統合的に管理するサービス"""
@@ -17,23 +24,39 @@ class AudioProcessingService:
         az_blob_client: AzBlobClient,
         mp4_processing_service: MP4ProcessingService,
         audio_transcription_service: AudioTranscriptionService,
+        stage_limiter: StageLimiter | None = None,
     ):
         self.az_speech_client = az_speech_client
         self.az_blob_client = az_blob_client
         self.mp4_processing_service = mp4_processing_service
         self.audio_transcription_service = audio_transcription_service
+        self.stage_limiter = stage_limiter or StageLimiter({})
 
     async def process_audio_file(self, file_path: str) -> dict[str, Any]:
-        """音声ファイルを処理し、Blobストレージにアップロードする"""
+        """
+        音声ファイルを処理し、Blobストレージにアップロードする。
+        戻り値の duration は変換後のWAVのサイズから求めた音声の長さ(秒、不明な場合はNone)
+        """
         try:
+            if self.mp4_processing_service.streaming:
+                return await self._stream_audio_file(file_path)
+
             # MP4の処理
             processed_data = await self.mp4_processing_service.process_mp4(file_path)
             # Blobへのアップロード
-            blob_url = await self.az_blob_client.upload_blob(
-                processed_data["file_name"], processed_data["file_data"]
-            )
+            with time_stage("blob_upload"):
+                blob_url = await self.az_blob_client.upload_blob(
+                    processed_data["file_name"], processed_data["file_data"]
+                )
 
-            return {"file_name": processed_data["file_name"], "blob_url": blob_url}
+            file_data = processed_data["file_data"]
+            return {
+                "file_name": processed_data["file_name"],
+                "blob_url": blob_url,
+                "duration": self.mp4_processing_service.wav_duration(
+                    file_data[:WAV_HEADER_PROBE_SIZE], len(file_data)
+                ),
+            }
 
         except Exception as e:
             logger.error(f"音声ファイルの処理に失敗: {str(e)}")
@@ -41,10 +64,84 @@ class AudioProcessingService:
                 status_code=500, detail=f"音声ファイルの処理に失敗しました: {str(e)}"
             )
 
-    async def transcribe_audio(self, blob_url: str) -> str:
-        """音声ファイルを文字起こしする"""
+    async def _stream_audio_file(self, file_path: str) -> dict[str, Any]:
+        """
+        FFmpegの出力を一時ファイルを介さずBlobへ逐次アップロードする。
+        変換と送信が並行するため、blob_upload の時間には変換時間も含まれる。
+        """
+        file_name = self.mp4_processing_service.get_output_filename(file_path)
+        rewrite_header = (
+            self.mp4_processing_service.fix_wav_header
+            if self.mp4_processing_service.needs_conversion(file_path)
+            else None
+        )
+        header = bytearray()
+        total_size = 0
+
+        async def measured(stream: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+            # 送信しながら先頭のヘッダと総サイズを記録し、音声の長さの計算に使う
+            nonlocal total_size
+            async for chunk in stream:
+                if len(header) < WAV_HEADER_PROBE_SIZE:
+                    header.extend(chunk[: WAV_HEADER_PROBE_SIZE - len(header)])
+                total_size += len(chunk)
+                yield chunk
+
+        with time_stage("blob_upload"):
+            blob_url = await self.az_blob_client.upload_blob_from_stream(
+                file_name,
+                measured(self.mp4_processing_service.stream_audio(file_path)),
+                rewrite_first_block=rewrite_header,
+            )
+        return {
+            "file_name": file_name,
+            "blob_url": blob_url,
+            "duration": self.mp4_processing_service.wav_duration(
+                bytes(header), total_size
+            ),
+        }
+
+    async def _stream_audio_segments(
+        self, file_path: str, segments: list[tuple[float, float]]
+    ) -> list[dict[str, Any]]:
+        """
+        区間ごとにFFmpegで切り出し、それぞれ別のBlobとして並行アップロードする。
+        区間の変換は同じ音声の一部のため、変換の待機キューでは1件として数える。
+        """
+        base_name = self.mp4_processing_service.get_output_filename(file_path)[:-4]
+
+        async def upload_segment(index: int, start: float, duration: float):
+            file_name = f"{base_name}_part{index:03d}.wav"
+            with time_stage("blob_upload"):
+                blob_url = await self.az_blob_client.upload_blob_from_stream(
+                    file_name,
+                    self.mp4_processing_service.stream_audio(
+                        file_path, start, duration, group=file_path
+                    ),
+                    rewrite_first_block=self.mp4_processing_service.fix_wav_header,
+                )
+            return {
+                "file_name": file_name,
+                "blob_url": blob_url,
+                "offset": start,
+                "duration": duration,
+            }
+
+        return await asyncio.gather(
+            *[
+                upload_segment(i, start, duration)
+                for i, (start, duration) in enumerate(segments)
+            ]
+        )
+
+    async def transcribe_audio(
+        self, blob_url: str, audio_duration: float | None = None
+    ) -> Transcript:
+        """音声ファイルを文字起こしする(audio_duration はポーリング間隔の調整に使う)"""
         try:
-            return await self.audio_transcription_service.transcribe_audio(blob_url)
+            return await self.audio_transcription_service.transcribe_audio(
+                blob_url, audio_duration
+            )
 
         except Exception as e:
             logger.error(f"文字起こしに失敗: {str(e)}")
@@ -52,20 +149,44 @@ class AudioProcessingService:
                 status_code=500, detail=f"文字起こしに失敗しました: {str(e)}"
             )
 
-    async def process_audio(self, file_path: str) -> str:
+    async def process_audio(self, file_path: str) -> Transcript:
         """音声ファイルの処理から文字起こしまでを一括で実行する"""
         try:
+            async with self.stage_limiter.limit("ffmpeg"):
+                segments = await self.mp4_processing_service.plan_segments(file_path)
+            if segments:
+                return await self._process_audio_segments(file_path, segments)
+
             # 音声ファイルの処理とアップロード
-            audio_data = await self.process_audio_file(file_path)
+            async with self.stage_limiter.limit("ffmpeg"):
+                audio_data = await self.process_audio_file(file_path)
             # 文字起こしの実行
-            transcribed_text = await self.transcribe_audio(audio_data["blob_url"])
+            async with self.stage_limiter.limit("speech"):
+                transcript = await self.transcribe_audio(
+                    audio_data["blob_url"], audio_data["duration"]
+                )
             # 文字起こし完了後、Blobを削除
             await self.az_blob_client.delete_blob(audio_data["file_name"])
 
-            return transcribed_text
+            return transcript
 
         except Exception as e:
             logger.error(f"音声処理と文字起こしに失敗: {str(e)}")
             raise HTTPException(
                 status_code=500, detail=f"音声処理と文字起こしに失敗しました: {str(e)}"
             )
+
+    async def _process_audio_segments(
+        self, file_path: str, segments: list[tuple[float, float]]
+    ) -> Transcript:
+        """音声を区間に分割し、区間ごとの文字起こしを並行して実行する"""
+        async with self.stage_limiter.limit("ffmpeg"):
+            segment_data = await self._stream_audio_segments(file_path, segments)
+        try:
+            async with self.stage_limiter.limit("speech"):
+                return await self.audio_transcription_service.transcribe_segments(
+                    segment_data
+                )
+        finally:
+            for data in segment_data:
+                await self.az_blob_client.delete_blob(data["file_name"])
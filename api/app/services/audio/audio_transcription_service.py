@@ -1,27 +1,74 @@
 from fastapi import HTTPException
+import asyncio
 import logging
+from typing import Any
 
 from app.infrastructure.az_speech import AzSpeechClient
+from app.services.audio.transcription_batcher import TranscriptionBatcher
+from app.utils.transcript import Transcript
+from app.utils.transcript_merging import merge_segment_phrases
+from app.utils.metrics import time_stage
 
 logger = logging.getLogger(__name__)
 
 
 class AudioTranscriptionService:
     """音声文字起こしを行うサービス"""
-    def __init__(self, az_speech_client: AzSpeechClient):
+    def __init__(
+        self,
+        az_speech_client: AzSpeechClient,
+        transcription_batcher: TranscriptionBatcher | None = None,
+    ):
         self._az_speech_client = az_speech_client
+        self._transcription_batcher = transcription_batcher
 
-    async def transcribe_audio(self, blob_url: str) -> str:
-        """音声ファイルを文字起こしする"""
+    async def transcribe_audio(
+        self, blob_url: str, audio_duration: float | None = None
+    ) -> Transcript:
+        """音声ファイルを文字起こしする。audio_duration(秒)はジョブのポーリング間隔の調整に使う"""
         try:
-            job_url = await self._az_speech_client.create_transcription_job(blob_url)
-            files_url = await self._az_speech_client.poll_transcription_status(job_url)
-            content_url = await self._az_speech_client.get_transcription_result_url(
-                files_url
+            phrases = await self._get_recognized_phrases(blob_url, audio_duration)
+            return Transcript.from_recognized_phrases(phrases)
+        except Exception as e:
+            raise HTTPException(
+                status_code=500, detail=f"文字起こしに失敗しました: {str(e)}"
+            )
+
+    async def transcribe_segments(self, segments: list[dict[str, Any]]) -> Transcript:
+        """
+        区間ごとにアップロードされた音声を並行して文字起こしし、時系列順に統合する。
+        segments の各要素は blob_url と offset(区間開始秒)を持つ。
+        """
+        try:
+            phrase_lists = await asyncio.gather(
+                *[
+                    self._get_recognized_phrases(s["blob_url"], s.get("duration"))
+                    for s in segments
+                ]
+            )
+            merged_phrases = merge_segment_phrases(
+                [(s["offset"], phrases) for s, phrases in zip(segments, phrase_lists)]
             )
-            logger.info(f"content_url: {content_url}")
-            return await self._az_speech_client.get_transcription_by_speaker(content_url)
+            return Transcript.from_recognized_phrases(merged_phrases)
         except Exception as e:
             raise HTTPException(
                 status_code=500, detail=f"文字起こしに失敗しました: {str(e)}"
             )
+
+    async def _get_recognized_phrases(
+        self, blob_url: str, audio_duration: float | None = None
+    ) -> list[dict[str, Any]]:
+        """1つの音声の文字起こしジョブを実行し、認識フレーズを取得する"""
+        if self._transcription_batcher is not None:
+            with time_stage("speech_job"):
+                return await self._transcription_batcher.get_recognized_phrases(blob_url)
+        with time_stage("speech_job"):
+            job_url = await self._az_speech_client.create_transcription_job(blob_url)
+            files_url = await self._az_speech_client.poll_transcription_status(
+                job_url, audio_duration=audio_duration
+            )
+        with time_stage("result_fetch"):
+            content_url = await self._az_speech_client.get_transcription_result_url(
+                files_url
+            )
+            return await self._az_speech_client.get_recognized_phrases(content_url)
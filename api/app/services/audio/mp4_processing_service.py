@@ -1,8 +1,9 @@
 import os
-import subprocess
+import re
+import struct
 import logging
 import imageio_ffmpeg as ffmpeg
-from typing import Any
+from typing import Any, AsyncIterator
 from fastapi import HTTPException
 import asyncio
 import tempfile
@@ -10,12 +11,207 @@ import shutil
 from aiofiles import open as aio_open
 from aiofiles.os import remove as aio_remove
 
+from app.services.audio.transcoding_executor import TranscodingExecutor
+
 logger = logging.getLogger(__name__)
 
 
+STREAM_CHUNK_SIZE = 1024 * 1024
+DURATION_PATTERN = re.compile(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)")
+SILENCE_START_PATTERN = re.compile(r"silence_start: (-?\d+(?:\.\d+)?)")
+SILENCE_END_PATTERN = re.compile(r"silence_end: (-?\d+(?:\.\d+)?)")
+
+
 class MP4ProcessingService:
     """MP4ファイルをWAVファイルに変換・処理するサービス"""
 
+    def __init__(
+        self,
+        streaming: bool = True,
+        chunk_size: int = STREAM_CHUNK_SIZE,
+        transcoding_executor: TranscodingExecutor | None = None,
+        segment_count: int = 1,
+        min_segment_seconds: float = 600,
+    ):
+        self.streaming = streaming
+        self.chunk_size = chunk_size
+        self.segment_count = segment_count
+        self.min_segment_seconds = min_segment_seconds
+        self._transcoding_executor = transcoding_executor or TranscodingExecutor()
+
+    def get_output_filename(self, file_path: str) -> str:
+        """変換後のWAVファイル名を返す"""
+        return f"{os.path.splitext(os.path.basename(file_path))[0]}.wav"
+
+    def needs_conversion(self, file_path: str) -> bool:
+        """WAVへの変換が必要か判定する"""
+        ext = os.path.splitext(file_path)[1].lower()
+        if ext not in [".mp4", ".wav"]:
+            raise HTTPException(status_code=400, detail="サポートされていないファイル形式です。")
+        return ext == ".mp4"
+
+    async def plan_segments(self, file_path: str) -> list[tuple[float, float]]:
+        """
+        無音区間(silencedetect)を境界として音声を segment_count 個の区間に分割する。
+        戻り値は(開始秒, 長さ秒)のリスト。短い音声や分割しない設定の場合は空リスト。
+        """
+        self.needs_conversion(file_path)
+        if self.segment_count <= 1:
+            return []
+
+        stderr = await self._transcoding_executor.run(
+            [
+                ffmpeg.get_ffmpeg_exe(),
+                "-i", file_path,
+                "-vn",
+                "-af", "silencedetect=noise=-35dB:d=0.5",
+                "-f", "null",
+                "-",
+            ]
+        )
+        output = stderr.decode(errors="ignore")
+        duration = self._parse_duration(output)
+        count = min(self.segment_count, int(duration // self.min_segment_seconds))
+        if count <= 1:
+            return []
+
+        silences = self._parse_silence_midpoints(output)
+        cut_points = self._choose_cut_points(duration, silences, count)
+        bounds = [0.0, *cut_points, duration]
+        segments = [
+            (start, end - start) for start, end in zip(bounds, bounds[1:]) if end > start
+        ]
+        logger.info(f"音声を{len(segments)}区間に分割: {segments}")
+        return segments
+
+    @staticmethod
+    def _parse_duration(output: str) -> float:
+        match = DURATION_PATTERN.search(output)
+        if match is None:
+            return 0.0
+        hours, minutes, seconds = match.groups()
+        return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+    @staticmethod
+    def _parse_silence_midpoints(output: str) -> list[float]:
+        starts = [float(v) for v in SILENCE_START_PATTERN.findall(output)]
+        ends = [float(v) for v in SILENCE_END_PATTERN.findall(output)]
+        return [(start + end) / 2 for start, end in zip(starts, ends)]
+
+    @staticmethod
+    def _choose_cut_points(
+        duration: float, silences: list[float], count: int
+    ) -> list[float]:
+        """
+        均等分割位置に最も近い無音区間の中央を切れ目とする。
+        許容範囲(区間長の1/4)に無音がなければ均等分割位置で切る。
+        """
+        segment_length = duration / count
+        tolerance = segment_length / 4
+        cut_points: list[float] = []
+        for k in range(1, count):
+            target = segment_length * k
+            previous = cut_points[-1] if cut_points else 0.0
+            candidates = [
+                t for t in silences if previous < t < duration and abs(t - target) <= tolerance
+            ]
+            cut_points.append(
+                min(candidates, key=lambda t: abs(t - target)) if candidates else target
+            )
+        return cut_points
+
+    async def stream_audio(
+        self,
+        file_path: str,
+        start: float | None = None,
+        duration: float | None = None,
+        group: str | None = None,
+    ) -> AsyncIterator[bytes]:
+        """
+        WAV音声をチャンク単位で逐次返す。
+        MP4の場合はFFmpegの標準出力(pipe:1)をそのまま読み出し、一時WAVファイルを作らない。
+        start/duration を指定した場合はその区間のみをFFmpegで切り出す。
+        group は変換の待機キューで1件として数える単位(TranscodingExecutor.slot を参照)。
+        """
+        is_segment = start is not None or duration is not None
+        if not self.needs_conversion(file_path) and not is_segment:
+            async with aio_open(file_path, "rb") as f:
+                while chunk := await f.read(self.chunk_size):
+                    yield chunk
+            return
+
+        executor = self._transcoding_executor
+        async with executor.slot(group) as deadline:
+            process = await asyncio.create_subprocess_exec(
+                *self._build_command(file_path, "pipe:1", start, duration),
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+            stderr_task = asyncio.create_task(process.stderr.read())
+            try:
+                while chunk := await asyncio.wait_for(
+                    process.stdout.read(self.chunk_size),
+                    timeout=executor.remaining(deadline),
+                ):
+                    yield chunk
+                returncode = await asyncio.wait_for(
+                    process.wait(), timeout=executor.remaining(deadline)
+                )
+                stderr = await stderr_task
+                if returncode != 0:
+                    raise HTTPException(
+                        status_code=500,
+                        detail=f"FFmpeg失敗: {stderr.decode(errors='ignore')}",
+                    )
+            finally:
+                await executor.terminate(process)
+                if not stderr_task.done():
+                    stderr_task.cancel()
+
+    @staticmethod
+    def fix_wav_header(first_block: bytes, total_size: int) -> bytes:
+        """
+        パイプ出力ではFFmpegがWAVヘッダのサイズを書き戻せないため、
+        確定した総サイズでRIFF/dataチャンクのサイズを補正する。
+        """
+        if first_block[:4] != b"RIFF" or first_block[8:12] != b"WAVE":
+            return first_block
+
+        header = bytearray(first_block)
+        struct.pack_into("<I", header, 4, min(total_size - 8, 0xFFFFFFFF))
+        offset = 12
+        while offset + 8 <= len(header):
+            chunk_id = bytes(header[offset : offset + 4])
+            if chunk_id == b"data":
+                data_size = total_size - (offset + 8)
+                struct.pack_into("<I", header, offset + 4, min(data_size, 0xFFFFFFFF))
+                break
+            (chunk_size,) = struct.unpack_from("<I", header, offset + 4)
+            offset += 8 + chunk_size + (chunk_size & 1)
+        return bytes(header)
+
+    @staticmethod
+    def wav_duration(header: bytes, total_size: int) -> float | None:
+        """
+        WAVヘッダのバイトレートとファイルの総サイズから音声の長さ(秒)を求める。
+        パイプ出力のヘッダはサイズが未確定のため、dataチャンクのサイズは使わない。判定できない場合はNone
+        """
+        if header[:4] != b"RIFF" or header[8:12] != b"WAVE":
+            return None
+        byte_rate = 0
+        offset = 12
+        while offset + 8 <= len(header):
+            chunk_id = header[offset : offset + 4]
+            if chunk_id == b"fmt " and offset + 20 <= len(header):
+                (byte_rate,) = struct.unpack_from("<I", header, offset + 16)
+            elif chunk_id == b"data":
+                if byte_rate <= 0:
+                    return None
+                return max(0, total_size - (offset + 8)) / byte_rate
+            (chunk_size,) = struct.unpack_from("<I", header, offset + 4)
+            offset += 8 + chunk_size + (chunk_size & 1)
+        return None
+
     async def process_mp4(self, file_path: str) -> dict[str, Any]:
         sanitized_filename = os.path.basename(file_path)
         ext = os.path.splitext(sanitized_filename)[1].lower()
@@ -36,7 +232,9 @@ class MP4ProcessingService:
 
         try:
             await asyncio.to_thread(shutil.copy2, file_path, input_path)
-            await asyncio.to_thread(self._convert_wav, input_path, output_path)
+            await self._transcoding_executor.run(
+                self._build_command(input_path, output_path)
+            )
             result = await self._read_file(output_path, output_filename)
         except Exception as e:
             logger.error(f"処理エラー: {str(e)}")
@@ -46,26 +244,29 @@ class MP4ProcessingService:
 
         return result
 
-    def _convert_wav(self, input_path: str, output_path: str) -> None:
-        command = [
+    def _build_command(
+        self,
+        input_path: str,
+        output_path: str,
+        start: float | None = None,
+        duration: float | None = None,
+    ) -> list[str]:
+        seek = ["-ss", f"{start:.3f}"] if start is not None else []
+        limit = ["-t", f"{duration:.3f}"] if duration is not None else []
+        return [
             ffmpeg.get_ffmpeg_exe(),
+            *seek,
             "-i", input_path,
+            *limit,
             "-vn",
+            "-map_metadata", "-1",
+            "-fflags", "+bitexact",
             "-acodec", "pcm_s16le",
             "-ar", "16000",
             "-ac", "1",
             "-f", "wav",
             "-y", output_path,
         ]
-        process = subprocess.Popen(
-            command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=10**8
-        )
-        _, stderr = process.communicate()
-        if process.returncode != 0:
-            raise HTTPException(
-                status_code=500,
-                detail=f"FFmpeg失敗: {stderr.decode(errors='ignore')}",
-            )
 
     async def _read_file(self, file_path: str, filename: str) -> dict[str, Any]:
         async with aio_open(file_path, "rb") as f:
@@ -0,0 +1,159 @@
+import os
+import time
+import asyncio
+import logging
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator
+from fastapi import HTTPException
+
+from app.utils.metrics import PIPELINE_STAGE_SECONDS
+from app.utils.tracing import detached_span, tracer
+
+logger = logging.getLogger(__name__)
+
+
+class TranscodingExecutor:
+    """
+    FFmpegプロセスの同時実行数を制限する実行器。
+    実行枠(デフォルトはCPU数)が埋まっている間は待機キューに入り、
+    キューが上限に達した場合は新しい変換を受け付けない。
+    同じ group を指定した変換(1つの音声の区間ごとの変換など)は、キューの上限に対して1件と数え、
+    同じ group の変換が既に受け付けられていれば上限を確認しない。
+    """
+
+    def __init__(
+        self,
+        max_workers: int | None = None,
+        max_queue: int = 32,
+        timeout_seconds: float = 3600,
+    ):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.timeout_seconds = timeout_seconds
+        self._semaphore = asyncio.Semaphore(self.max_workers)
+        self._waiting = 0
+        # 待機中・実行中の変換を group ごとに数える(group を指定しない変換はそれぞれ1件)
+        self._waiting_groups: Counter[object] = Counter()
+        self._active_groups: Counter[object] = Counter()
+        self._running = 0
+        self._stats = {
+            "completed": 0,
+            "failed": 0,
+            "timeouts": 0,
+            "rejected": 0,
+            "transcode_seconds_total": 0.0,
+            "transcode_seconds_max": 0.0,
+        }
+
+    @asynccontextmanager
+    async def slot(self, group: str | None = None) -> AsyncIterator[float]:
+        """
+        実行枠を確保し、変換の締め切り時刻(ループ時刻)を返す。
+        同じ group の変換が既に待機中・実行中の場合は、キューの上限を確認せずに待機する。
+        ブロック内で発生したタイムアウトは504として送出する。
+        """
+        key = group if group is not None else object()
+        if key not in self._active_groups and len(self._waiting_groups) >= self.max_queue:
+            self._stats["rejected"] += 1
+            raise HTTPException(status_code=503, detail="音声変換の待機キューが満杯です")
+
+        self._active_groups[key] += 1
+        try:
+            self._waiting += 1
+            self._waiting_groups[key] += 1
+            queued = time.perf_counter()
+            try:
+                with tracer.start_as_current_span("ffmpeg.queue_wait"):
+                    await self._semaphore.acquire()
+            finally:
+                self._waiting -= 1
+                self._decrement(self._waiting_groups, key)
+            PIPELINE_STAGE_SECONDS.labels(stage="transcode_queue_wait").observe(
+                time.perf_counter() - queued
+            )
+
+            self._running += 1
+            started = time.perf_counter()
+            deadline = asyncio.get_running_loop().time() + self.timeout_seconds
+            succeeded = False
+            try:
+                # stream_audio(非同期ジェネレーター)内で yield をまたぐため、現在のスパンにはしない
+                with detached_span("ffmpeg"):
+                    yield deadline
+                succeeded = True
+            except asyncio.TimeoutError:
+                self._stats["timeouts"] += 1
+                raise HTTPException(status_code=504, detail="FFmpegの処理がタイムアウトしました")
+            finally:
+                self._running -= 1
+                self._semaphore.release()
+                self._record(time.perf_counter() - started, succeeded)
+        finally:
+            self._decrement(self._active_groups, key)
+
+    async def run(self, command: list[str]) -> bytes:
+        """
+        FFmpegを実行し、終了まで待機して標準エラー出力を返す。
+        タイムアウト・キャンセル時はプロセスを停止する。
+        """
+        async with self.slot() as deadline:
+            process = await asyncio.create_subprocess_exec(
+                *command,
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.PIPE,
+            )
+            try:
+                _, stderr = await asyncio.wait_for(
+                    process.communicate(), timeout=self.remaining(deadline)
+                )
+            finally:
+                await self.terminate(process)
+
+            if process.returncode != 0:
+                raise HTTPException(
+                    status_code=500,
+                    detail=f"FFmpeg失敗: {stderr.decode(errors='ignore')}",
+                )
+            return stderr
+
+    @staticmethod
+    def remaining(deadline: float) -> float:
+        """締め切りまでの残り秒数"""
+        return max(0.0, deadline - asyncio.get_running_loop().time())
+
+    @staticmethod
+    async def terminate(process: asyncio.subprocess.Process) -> None:
+        """終了していないプロセスを停止する"""
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+
+    def metrics(self) -> dict[str, Any]:
+        """キューの深さと変換時間の統計を返す"""
+        finished = self._stats["completed"] + self._stats["failed"]
+        return {
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "queue_depth": self._waiting,
+            "running": self._running,
+            **self._stats,
+            "transcode_seconds_avg": (
+                self._stats["transcode_seconds_total"] / finished if finished else 0.0
+            ),
+        }
+
+    @staticmethod
+    def _decrement(counter: Counter[object], key: object) -> None:
+        counter[key] -= 1
+        if not counter[key]:
+            del counter[key]
+
+    def _record(self, elapsed: float, succeeded: bool) -> None:
+        PIPELINE_STAGE_SECONDS.labels(stage="ffmpeg").observe(elapsed)
+        self._stats["completed" if succeeded else "failed"] += 1
+        self._stats["transcode_seconds_total"] += elapsed
+        self._stats["transcode_seconds_max"] = max(
+            self._stats["transcode_seconds_max"], elapsed
+        )
+        logger.info(f"FFmpeg処理時間: {elapsed:.2f}s (成功: {succeeded})")
@@ -0,0 +1,122 @@
+import asyncio
+import logging
+from typing import Any
+from urllib.parse import urlsplit, unquote
+
+from app.infrastructure.az_speech import AzSpeechClient
+
+logger = logging.getLogger(__name__)
+
+
+class TranscriptionBatcher:
+    """
+    短い時間内に届いた文字起こし要求をまとめ、複数のcontentUrlsを持つ1つのジョブとして実行する。
+    ジョブ作成・ポーリング・結果一覧の取得が1回で済むため、同時アップロード時のAPI呼び出しを削減できる。
+    """
+
+    def __init__(
+        self,
+        az_speech_client: AzSpeechClient,
+        window_seconds: float = 2.0,
+        max_batch_size: int = 20,
+    ):
+        self._az_speech_client = az_speech_client
+        self.window_seconds = window_seconds
+        self.max_batch_size = max_batch_size
+        self._pending: list[tuple[str, asyncio.Future]] = []
+        self._flush_timer: asyncio.Task | None = None
+        self._batches: set[asyncio.Task] = set()
+
+    async def get_recognized_phrases(self, blob_url: str) -> list[dict[str, Any]]:
+        """音声をバッチに追加し、その音声の認識フレーズが得られるまで待機する"""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((blob_url, future))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_timer is None:
+            self._flush_timer = asyncio.create_task(self._flush_after_window())
+
+        return await future
+
+    async def close(self) -> None:
+        """待機中のタイマーと実行中のバッチを停止する"""
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+        for task in list(self._batches):
+            task.cancel()
+        await asyncio.gather(*self._batches, return_exceptions=True)
+        for _, future in self._pending:
+            future.cancel()
+        self._pending.clear()
+
+    async def _flush_after_window(self) -> None:
+        await asyncio.sleep(self.window_seconds)
+        self._flush_timer = None
+        self._flush()
+
+    def _flush(self) -> None:
+        """待機中の要求を1つのバッチとして送信する"""
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        task = asyncio.create_task(self._run_batch(batch))
+        self._batches.add(task)
+        task.add_done_callback(self._batches.discard)
+
+    async def _run_batch(self, batch: list[tuple[str, asyncio.Future]]) -> None:
+        blob_urls = list(dict.fromkeys(url for url, _ in batch))
+        logger.info(f"文字起こしバッチを送信: {len(blob_urls)}件")
+        try:
+            job_url = await self._az_speech_client.create_batch_transcription_job(
+                blob_urls, display_name=f"BatchTranscription ({len(blob_urls)})"
+            )
+            files_url = await self._az_speech_client.poll_transcription_status(job_url)
+            content_urls = await self._az_speech_client.get_transcription_result_urls(
+                files_url
+            )
+            contents = await asyncio.gather(
+                *[
+                    self._az_speech_client.get_transcription_content(url)
+                    for url in content_urls
+                ]
+            )
+            self._route_results(batch, contents)
+        except asyncio.CancelledError:
+            for _, future in batch:
+                future.cancel()
+            raise
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+
+    def _route_results(
+        self, batch: list[tuple[str, asyncio.Future]], contents: list[dict[str, Any]]
+    ) -> None:
+        """結果のsourceと投入したURLを照合し、各要求に認識フレーズを返す"""
+        phrases_by_source = {
+            self._normalize_url(content.get("source", "")): content.get(
+                "recognizedPhrases", []
+            )
+            for content in contents
+        }
+        for blob_url, future in batch:
+            phrases = phrases_by_source.get(self._normalize_url(blob_url))
+            if future.done():
+                continue
+            if phrases is None:
+                future.set_exception(
+                    RuntimeError(f"文字起こし結果が見つかりません: {blob_url}")
+                )
+            else:
+                future.set_result(phrases)
+
+    @staticmethod
+    def _normalize_url(url: str) -> str:
+        """SASトークン等のクエリを除いたURLを返す"""
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}{unquote(parts.path)}"
@@ -0,0 +1,143 @@
+import asyncio
+import logging
+import os
+import random
+import uuid
+from typing import Any, Awaitable, Callable
+
+from app.infrastructure.job_queue import JobQueue
+
+logger = logging.getLogger(__name__)
+
+JobRunner = Callable[[dict[str, Any], bool], Awaitable[None]]
+
+# ジョブの完了・再試行の記録を試みる回数
+FINISH_ATTEMPTS = 3
+
+
+class JobWorkerService:
+    """
+    ジョブキューからジョブを取り出して実行するワーカープール。
+    同時に処理するジョブ数はワーカー数で制限され、失敗したジョブは指数バックオフで再試行される。
+    ジョブキューの操作はイベントループを止めないよう別スレッドで行い、
+    ジョブキューのエラー(SQLiteのロック待ちのタイムアウトなど)ではワーカーを止めずに待機してから続ける。
+    """
+
+    def __init__(
+        self,
+        job_queue: JobQueue,
+        run_job: JobRunner,
+        num_workers: int = 2,
+        max_attempts: int = 3,
+        retry_backoff_seconds: float = 30.0,
+        lease_seconds: float = 120.0,
+        poll_interval: float = 1.0,
+    ):
+        self._job_queue = job_queue
+        self._run_job = run_job
+        self.num_workers = num_workers
+        self.max_attempts = max_attempts
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self._worker_prefix = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._wakeup = asyncio.Event()
+        self._workers: list[asyncio.Task] = []
+
+    def start(self) -> None:
+        """ワーカーを起動する"""
+        for i in range(self.num_workers):
+            worker_id = f"{self._worker_prefix}-{i}"
+            self._workers.append(asyncio.create_task(self._worker_loop(worker_id)))
+        logger.info(f"ジョブワーカーを起動: {self.num_workers}件")
+
+    async def stop(self) -> None:
+        """ワーカーを停止する。処理中のジョブはリース切れ後に再開される"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+
+    def notify(self) -> None:
+        """新しいジョブの追加を待機中のワーカーに通知する"""
+        self._wakeup.set()
+
+    async def _worker_loop(self, worker_id: str) -> None:
+        while True:
+            try:
+                job = await asyncio.to_thread(
+                    self._job_queue.claim, worker_id, self.lease_seconds
+                )
+            except Exception as e:
+                logger.warning(f"ジョブの取得に失敗、{self.poll_interval}秒後に再試行: {str(e)}")
+                await asyncio.sleep(self.poll_interval)
+                continue
+            if job is None:
+                await self._wait_for_job()
+                continue
+            await self._process_job(worker_id, job)
+
+    async def _wait_for_job(self) -> None:
+        """通知またはポーリング間隔の経過まで待機する"""
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    async def _process_job(self, worker_id: str, job: dict[str, Any]) -> None:
+        job_id = job["job_id"]
+        is_last_attempt = job["attempts"] >= self.max_attempts
+        heartbeat = asyncio.create_task(self._heartbeat(worker_id, job_id))
+        try:
+            logger.info(f"ジョブ {job_id} を実行 (試行 {job['attempts']}/{self.max_attempts})")
+            await self._run_job(job["payload"], is_last_attempt)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if is_last_attempt:
+                logger.error(f"ジョブ {job_id} が最終試行で失敗: {str(e)}")
+                await self._finish(job_id, self._job_queue.complete, job_id)
+            else:
+                delay = self._backoff_delay(job["attempts"])
+                logger.warning(f"ジョブ {job_id} が失敗、{delay:.1f}秒後に再試行: {str(e)}")
+                await self._finish(job_id, self._job_queue.retry, job_id, delay, str(e))
+        else:
+            await self._finish(job_id, self._job_queue.complete, job_id)
+        finally:
+            heartbeat.cancel()
+
+    async def _finish(
+        self, job_id: str, update: Callable[..., None], *args: Any
+    ) -> None:
+        """
+        ジョブの完了・再試行を記録する。記録に失敗した場合は再試行し、
+        それでも失敗した場合はリース切れ後に別のワーカーが再実行する。
+        """
+        for attempt in range(1, FINISH_ATTEMPTS + 1):
+            try:
+                await asyncio.to_thread(update, *args)
+                return
+            except Exception as e:
+                logger.warning(
+                    f"ジョブ {job_id} の状態の記録に失敗 ({attempt}/{FINISH_ATTEMPTS}): {str(e)}"
+                )
+                if attempt < FINISH_ATTEMPTS:
+                    await asyncio.sleep(self.poll_interval * attempt)
+
+    async def _heartbeat(self, worker_id: str, job_id: str) -> None:
+        """処理中はリースを定期的に延長する"""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await asyncio.to_thread(
+                    self._job_queue.renew, job_id, worker_id, self.lease_seconds
+                )
+            except Exception as e:
+                # 次の延長で回復すればリースは切れない
+                logger.warning(f"ジョブ {job_id} のリースの延長に失敗: {str(e)}")
+
+    def _backoff_delay(self, attempts: int) -> float:
+        """ジッター付き指数バックオフの待機時間"""
+        base = self.retry_backoff_seconds * (2 ** (attempts - 1))
+        return base * random.uniform(0.5, 1.0)
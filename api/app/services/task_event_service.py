@@ -0,0 +1,167 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict, defaultdict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable
+
+from app.schemas.transcription import TaskStatus
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = {TaskStatus.COMPLETED.value, TaskStatus.FAILED.value}
+
+
+class TaskEventService:
+    """
+    タスクの進捗イベント(状態・処理段階・文字起こし結果・要約トークン)を購読者に配信する。
+    途中から購読した場合も、それまでのイベントを再生してから新しいイベントを配信する。
+    要約トークンは履歴上では1件に結合して保持する。
+    ワーカーが別プロセスの場合、このプロセスでは完了を観測できないため、履歴は
+    最後のイベントから history_ttl_seconds 経過するか max_history_tasks 件を超えると古い順に破棄する。
+    """
+
+    def __init__(
+        self,
+        keepalive_seconds: float = 15.0,
+        history_ttl_seconds: float = 3600.0,
+        max_history_tasks: int = 1000,
+    ):
+        self.keepalive_seconds = keepalive_seconds
+        self.history_ttl_seconds = history_ttl_seconds
+        self.max_history_tasks = max_history_tasks
+        self._subscribers: dict[str, set[asyncio.Queue]] = defaultdict(set)
+        # task_id -> (最後のイベントの時刻, 履歴)。最後のイベントが古い順に並べる
+        self._history: OrderedDict[str, tuple[float, list[dict[str, Any]]]] = OrderedDict()
+
+    def publish(self, task_id: str, event: str, data: dict[str, Any]) -> None:
+        """イベントを履歴に追加し、購読者に配信する"""
+        message = {"event": event, "data": data}
+        now = time.monotonic()
+        _, history = self._history.pop(task_id, (now, []))
+        self._history[task_id] = (now, history)
+        self._prune_history(now)
+        if event == "summary_delta" and history and history[-1]["event"] == event:
+            history[-1] = {
+                "event": event,
+                "data": {"text": history[-1]["data"]["text"] + data["text"]},
+            }
+        elif event == "summary_reset":
+            history[:] = [m for m in history if m["event"] != "summary_delta"]
+        else:
+            history.append(message)
+
+        for queue in self._subscribers.get(task_id, ()):
+            queue.put_nowait(message)
+
+        if event == "status" and data.get("status") in TERMINAL_STATUSES:
+            # 完了後の購読者にはタスクストアの内容を返すため、履歴は不要
+            self._history.pop(task_id, None)
+
+    def _prune_history(self, now: float) -> None:
+        """期限切れ・上限超過の履歴を古い順に破棄する"""
+        while self._history:
+            task_id, (updated_at, _) = next(iter(self._history.items()))
+            if (
+                len(self._history) <= self.max_history_tasks
+                and now - updated_at <= self.history_ttl_seconds
+            ):
+                return
+            del self._history[task_id]
+
+    @asynccontextmanager
+    async def subscribe(self, task_id: str) -> AsyncIterator[asyncio.Queue]:
+        """履歴を詰めたキューを返し、以降のイベントをそのキューに配信する"""
+        queue: asyncio.Queue = asyncio.Queue()
+        _, history = self._history.get(task_id, (0.0, []))
+        for message in history:
+            queue.put_nowait(message)
+        self._subscribers[task_id].add(queue)
+        try:
+            yield queue
+        finally:
+            subscribers = self._subscribers.get(task_id)
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    del self._subscribers[task_id]
+
+    async def stream(
+        self,
+        task_id: str,
+        get_task: Callable[[str], Awaitable[dict[str, Any] | None]],
+    ) -> AsyncIterator[dict[str, Any] | None]:
+        """
+        タスクが完了・失敗するまでイベントを順に返す。
+        一定時間イベントがない場合はNone(キープアライブ)を返し、その際タスクストアも確認する。
+        ワーカーが別プロセスの場合もタスクストア経由で状態の変化と文字起こし結果を配信できる。
+        購読開始時の状態と文字起こし結果は常にタスクストアから返し、履歴からは処理段階や要約トークンのみを再生する
+        (履歴は他プロセスでの更新を含まず、古い状態が残っている場合があるため)。
+        """
+        sent_status = None
+        sent_transcript = False
+
+        async def from_store() -> list[dict[str, Any]]:
+            nonlocal sent_status, sent_transcript
+            task = await get_task(task_id)
+            if task is None:
+                return []
+            messages = []
+            status = task["status"]
+            if status in TERMINAL_STATUSES:
+                return [{"event": "status", "data": {"status": status, **_results(task)}}]
+            if status != sent_status:
+                messages.append({"event": "status", "data": {"status": status}})
+            if task.get("transcribed_text") and not sent_transcript:
+                messages.append(
+                    {"event": "transcript", "data": {"text": task["transcribed_text"]}}
+                )
+            return messages
+
+        async with self.subscribe(task_id) as queue:
+            replayed = queue.qsize()
+            pending = await from_store()
+            while True:
+                if pending:
+                    message = pending.pop(0)
+                else:
+                    try:
+                        message = await asyncio.wait_for(
+                            queue.get(), timeout=self.keepalive_seconds
+                        )
+                    except asyncio.TimeoutError:
+                        pending = await from_store()
+                        if not pending:
+                            yield None
+                        continue
+                    is_replayed = replayed > 0
+                    replayed -= 1
+                    if _is_stale(message, sent_status, sent_transcript, is_replayed):
+                        continue
+
+                if message["event"] == "status":
+                    sent_status = message["data"]["status"]
+                elif message["event"] == "transcript":
+                    sent_transcript = True
+                yield message
+                if sent_status in TERMINAL_STATUSES:
+                    return
+
+
+def _is_stale(
+    message: dict[str, Any], sent_status: str | None, sent_transcript: bool, replayed: bool
+) -> bool:
+    """タスクストアから返した内容と重複する、または古い状態・文字起こし結果のイベントか"""
+    if message["event"] == "status":
+        status = message["data"]["status"]
+        return (replayed and status not in TERMINAL_STATUSES) or status == sent_status
+    if message["event"] == "transcript":
+        return replayed or sent_transcript
+    return False
+
+
+def _results(task: dict[str, Any]) -> dict[str, Any]:
+    return {
+        "transcribed_text": task["transcribed_text"],
+        "summarized_text": task["summarized_text"],
+    }
@@ -1,30 +1,190 @@
+import asyncio
+import hashlib
+import uuid
+from collections import OrderedDict
+from typing import Any
+
 from app.schemas.transcription import TaskStatus
+from app.infrastructure.task_store import TaskStore, InMemoryTaskStore
+from app.services.task_event_service import TaskEventService
+from app.utils.transcript import Transcript
 
 
 class TaskManagingService:
     """
-    タスクの状態と文字起こし・要約結果を管理するアプリケーションサービス
+    タスクの状態と文字起こし・要約結果を管理するアプリケーションサービス。
+    文字起こし結果は構造化した Transcript をバイナリで保存し、テキストは取得時に生成する。
+    復元した Transcript と生成したテキストは文字起こし結果の版ごとにキャッシュする。
+    状態の変化は TaskEventService を通じて購読者にも配信する。
+    タスクストアの読み書きはイベントループを止めないよう別スレッドで行う。
     """
-    def __init__(self):
-        self.status: dict[str, TaskStatus] = {}
-        self.transcribed_text: dict[str, str | None] = {}
-        self.summarized_text: dict[str, str | None] = {}
+    def __init__(
+        self,
+        task_store: TaskStore | None = None,
+        task_event_service: TaskEventService | None = None,
+        rendered_cache_size: int = 32,
+    ):
+        self._task_store = task_store if task_store is not None else InMemoryTaskStore()
+        self._task_event_service = task_event_service
+        self._rendered_cache_size = rendered_cache_size
+        # (task_id, transcript_revision) -> 復元済みの Transcript / 生成済みのテキスト
+        self._transcripts: OrderedDict[tuple[str, str], Transcript] = OrderedDict()
+        self._rendered: OrderedDict[tuple[str, str], str] = OrderedDict()
+
+    async def queue_task(self, task_id: str) -> None:
+        """キューに追加されたタスクを登録する"""
+        await self._save(task_id, TaskStatus.QUEUED, None, None)
+        self.publish_event(task_id, "status", {"status": TaskStatus.QUEUED.value})
 
-    def initialize_task(self, task_id: str) -> None:
+    async def initialize_task(self, task_id: str) -> None:
         """新規タスクを初期化する"""
-        self.status[task_id] = TaskStatus.PROCESSING
-        self.transcribed_text[task_id] = None
-        self.summarized_text[task_id] = None
+        await self._save(task_id, TaskStatus.PROCESSING, None, None)
+        self.publish_event(task_id, "status", {"status": TaskStatus.PROCESSING.value})
 
-    def complete_task(self, task_id: str, transcribed: str, summarized: str) -> None:
+    async def save_transcript(self, task_id: str, transcript: Transcript) -> None:
+        """要約の完了を待たずに文字起こし結果を保存し、配信する"""
+        await self._save(task_id, TaskStatus.PROCESSING, transcript, None)
+        self.publish_event(task_id, "transcript", {"text": transcript.to_text()})
+
+    async def complete_task(
+        self, task_id: str, transcript: Transcript, summarized: str
+    ) -> None:
         """タスクを完了状態にし、結果を保存する"""
-        self.status[task_id] = TaskStatus.COMPLETED
-        self.transcribed_text[task_id] = transcribed
-        self.summarized_text[task_id] = summarized
+        await self._save(task_id, TaskStatus.COMPLETED, transcript, summarized)
+        self.publish_event(
+            task_id,
+            "status",
+            {
+                "status": TaskStatus.COMPLETED.value,
+                "transcribed_text": transcript.to_text(),
+                "summarized_text": summarized,
+            },
+        )
 
-    def fail_task(self, task_id: str, error_message: str) -> None:
+    async def fail_task(self, task_id: str, error_message: str) -> None:
         """タスクを失敗状態にし、エラーメッセージを保存する"""
-        self.status[task_id] = TaskStatus.FAILED
         error_text = f"エラー: {error_message}"
-        self.transcribed_text[task_id] = error_text
-        self.summarized_text[task_id] = error_text
+        await self._save(task_id, TaskStatus.FAILED, error_text, error_text)
+        self.publish_event(
+            task_id,
+            "status",
+            {
+                "status": TaskStatus.FAILED.value,
+                "transcribed_text": error_text,
+                "summarized_text": error_text,
+            },
+        )
+
+    async def report_progress(
+        self, task_id: str, stage: str, done: int, total: int
+    ) -> None:
+        """処理段階の進捗(完了量/全体量)をタスクに記録し、配信する(文字起こし結果は書き換えない)"""
+        progress = {"stage": stage, "done": done, "total": total}
+        updated = await asyncio.to_thread(
+            self._task_store.update_progress, task_id, progress, uuid.uuid4().hex
+        )
+        if not updated:
+            return
+        self.publish_event(task_id, "progress", progress)
+
+    async def get_task(self, task_id: str) -> dict[str, Any] | None:
+        """
+        タスクの状態と結果を取得する。存在しない場合はNone。
+        transcribed_text は保存された Transcript から生成する(同じ版は再生成しない)。
+        """
+        task = await asyncio.to_thread(self._task_store.get, task_id)
+        if task is None or task.get("transcript_revision") is None:
+            return task
+        key = (task_id, task["transcript_revision"])
+        return {**task, "transcribed_text": await self._render(key)}
+
+    async def get_task_state(self, task_id: str) -> dict[str, Any] | None:
+        """
+        結果の本文を読まずにタスクの状態を取得する(ポーリング・ETagの確認用)。存在しない場合はNone。
+        status / revision / progress / transcript_revision / has_transcript / has_summary を返す
+        """
+        return await asyncio.to_thread(self._task_store.get_state, task_id)
+
+    async def get_transcript(self, task_id: str) -> Transcript | None:
+        """構造化された文字起こし結果を取得する。未完了・失敗時はNone"""
+        state = await asyncio.to_thread(self._task_store.get_state, task_id)
+        if state is None or state["transcript_revision"] is None:
+            return None
+        return await self._load_transcript((task_id, state["transcript_revision"]))
+
+    def close(self) -> None:
+        """タスクストアを閉じる"""
+        self._task_store.close()
+
+    def publish_event(self, task_id: str, event: str, data: dict[str, Any]) -> None:
+        """タスクの進捗イベントを購読者に配信する"""
+        if self._task_event_service is not None:
+            self._task_event_service.publish(task_id, event, data)
+
+    async def _save(
+        self,
+        task_id: str,
+        status: TaskStatus,
+        transcript: Transcript | str | None,
+        summarized: str | None,
+    ) -> None:
+        """
+        タスクを保存する。文字起こし結果は Transcript ならバイナリで別に保存し、文字列ならそのまま保存する。
+        revision は保存のたびに変わる値で、クライアントの条件付きリクエスト(ETag)に使う。
+        transcript_revision は文字起こし結果の内容から求める版で、内容が同じなら変わらない。
+        """
+        transcript_revision = None
+        if isinstance(transcript, Transcript):
+            data = transcript.to_bytes()
+            transcript_revision = hashlib.blake2b(data, digest_size=16).hexdigest()
+            await asyncio.to_thread(
+                self._task_store.save_transcript, task_id, transcript_revision, data
+            )
+            self._remember(self._transcripts, (task_id, transcript_revision), transcript)
+        await asyncio.to_thread(
+            self._task_store.save,
+            task_id,
+            {
+                "status": status.value,
+                "revision": uuid.uuid4().hex,
+                "progress": None,
+                "transcript_revision": transcript_revision,
+                "transcribed_text": None if transcript_revision else transcript,
+                "summarized_text": summarized,
+            },
+        )
+
+    async def _load_transcript(self, key: tuple[str, str]) -> Transcript | None:
+        """指定した版の Transcript をキャッシュまたはタスクストアから取得する"""
+        transcript = self._transcripts.get(key)
+        if transcript is not None:
+            self._transcripts.move_to_end(key)
+            return transcript
+        stored = await asyncio.to_thread(self._task_store.get_transcript, key[0])
+        if stored is None:
+            return None
+        revision, data = stored
+        transcript = Transcript.from_bytes(data)
+        self._remember(self._transcripts, (key[0], revision), transcript)
+        return transcript
+
+    async def _render(self, key: tuple[str, str]) -> str | None:
+        """指定した版の文字起こし結果のテキストを返す(同じ版は再生成しない)"""
+        text = self._rendered.get(key)
+        if text is not None:
+            self._rendered.move_to_end(key)
+            return text
+        transcript = await self._load_transcript(key)
+        if transcript is None:
+            return None
+        text = transcript.to_text()
+        self._remember(self._rendered, key, text)
+        return text
+
+    def _remember(
+        self, cache: OrderedDict[tuple[str, str], Any], key: tuple[str, str], value: Any
+    ) -> None:
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > self._rendered_cache_size:
+            cache.popitem(last=False)
@@ -1,50 +1,296 @@
 import asyncio
+import logging
+import random
+import time
+from typing import Any, Awaitable, Callable, TypeVar
 
-from app.infrastructure.az_openai import AzOpenAIClient
-from app.utils.token_chunking import split_token
+from fastapi import HTTPException
+
+from app.infrastructure.az_openai import AzOpenAIClient, OpenAIAPIError
+from app.infrastructure.content_cache import ContentCache
+from app.infrastructure.rate_limit_store import InMemoryRateLimitStore
+from app.utils.token_chunking import split_speaker_blocks, count_tokens
 from app.utils.prompt_generating import generate_prompt
+from app.utils.metrics import OPENAI_CALL_SECONDS, OPENAI_CALL_TOKENS, time_stage
+from app.utils.tracing import tracer
+from app.utils.rate_limiter import (
+    PRIORITY_FINAL,
+    PRIORITY_MAP,
+    PRIORITY_REDUCE,
+    RateLimiter,
+)
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+PRIORITY_KINDS = {PRIORITY_MAP: "map", PRIORITY_REDUCE: "reduce", PRIORITY_FINAL: "final"}
+
+RETRYABLE_STATUS_CODES = {408, 409, 429}
 
 
 class TextSummarizationService:
-    """テキストを要約するサービス"""
+    """
+    テキストを要約するサービス。
+    チャンク要約(map)はスライディングウィンドウで並行実行し、
+    要約の結合がコンテキスト上限を超える場合は木構造で段階的にまとめる(reduce)。
+    """
     def __init__(
         self,
         az_openai_client: AzOpenAIClient,
         max_tokens: int = 7500,
-        batch_size: int = 5,
+        overlap_tokens: int = 0,
+        max_concurrency: int = 5,
+        reduce_max_tokens: int = 12000,
+        max_retries: int = 5,
+        retry_base_seconds: float = 1.0,
+        retry_max_seconds: float = 60.0,
+        max_reduce_depth: int = 4,
+        rate_limiter: RateLimiter | None = None,
+        content_cache: ContentCache | None = None,
     ):
         self._az_openai_client = az_openai_client
         self.max_tokens = max_tokens
-        self.batch_size = batch_size
+        self.overlap_tokens = overlap_tokens
+        self.max_concurrency = max_concurrency
+        self.reduce_max_tokens = reduce_max_tokens
+        self.max_retries = max_retries
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+        self.max_reduce_depth = max_reduce_depth
+        self._rate_limiter = rate_limiter or RateLimiter(InMemoryRateLimitStore())
+        self._content_cache = content_cache
 
-    async def summarize_text(self, text: str) -> str:
+    async def summarize_text(
+        self,
+        text: str,
+        on_token: Callable[[str], None] | None = None,
+        on_reset: Callable[[], None] | None = None,
+    ) -> str:
         """
-        テキストを要約する。チャンク分割、バッチ要約、最終要約まで一気通貫で行う。
+        テキストを要約する。チャンク分割、並行要約、段階的な統合、最終要約まで一気通貫で行う。
+        on_token を指定した場合、最終要約のトークンを届いた順に渡す。
+        途中まで渡した後に再試行する場合は on_reset を呼ぶ。
         """
         chunks = self._split_text_chunks(text)
-        chunk_summaries = await self._summarize_chunks_in_batches(chunks)
-        return await self._summarize_final(chunk_summaries)
+        chunk_summaries = await self._summarize_chunks(chunks)
+        reduced_summaries = await self._reduce_summaries(chunk_summaries)
+        return await self._summarize_final(reduced_summaries, on_token, on_reset)
 
     def _split_text_chunks(self, text: str) -> list[str]:
-        """テキストをトークン数に基づいてチャンクに分割する"""
-        chunks = split_token(text, max_tokens=self.max_tokens)
+        """テキストを話者ブロック単位でトークン数に基づいてチャンクに分割する"""
+        with time_stage("chunking"):
+            chunks = split_speaker_blocks(
+                text, max_tokens=self.max_tokens, overlap_tokens=self.overlap_tokens
+            )
         if not chunks:
             raise ValueError("入力テキストが空です")
         return chunks
 
-    async def _summarize_chunks_in_batches(self, chunks: list[str]) -> list[str]:
-        """チャンクごとにプロンプトを生成し、バッチで要約する"""
-        prompts = [generate_prompt(chunk) for chunk in chunks]
-        summaries: list[str] = []
-        for i in range(0, len(prompts), self.batch_size):
-            batch = prompts[i : i + self.batch_size]
-            tasks = [self._az_openai_client.get_summary(prompt) for prompt in batch]
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-            summaries.extend([r for r in results if isinstance(r, str)])
+    async def _summarize_chunks(
+        self, chunks: list[str], priority: int = PRIORITY_MAP
+    ) -> list[str]:
+        """
+        チャンクごとに要約する。同時実行数は max_concurrency で、1件終わるごとに次を開始する。
+        再試行しても失敗したチャンクがあれば例外を送出する(欠落した要約は返さない)。
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def summarize(chunk: str) -> str:
+            async with semaphore:
+                return await self._summarize_with_retry(
+                    generate_prompt(chunk), priority=priority
+                )
+
+        return list(await asyncio.gather(*[summarize(chunk) for chunk in chunks]))
+
+    async def _reduce_summaries(self, summaries: list[str]) -> list[str]:
+        """結合した要約がコンテキスト上限を超える間、グループ単位で要約を重ねて数を減らす"""
+        depth = 0
+        while (
+            len(summaries) > 1
+            and count_tokens("\n".join(summaries)) > self.reduce_max_tokens
+            and depth < self.max_reduce_depth
+        ):
+            groups = self._group_by_tokens(summaries)
+            logger.info(f"要約を統合: {len(summaries)}件 -> {len(groups)}件 (段階 {depth + 1})")
+            summaries = await self._summarize_chunks(
+                ["\n".join(g) for g in groups], priority=PRIORITY_REDUCE
+            )
+            depth += 1
         return summaries
 
-    async def _summarize_final(self, chunk_summaries: list[str]) -> str:
+    def _group_by_tokens(self, summaries: list[str]) -> list[list[str]]:
+        """要約を順番を保ったまま、合計トークン数が上限以内のグループにまとめる"""
+        groups: list[list[str]] = []
+        current: list[str] = []
+        current_tokens = 0
+        for summary in summaries:
+            tokens = count_tokens(summary)
+            if current and current_tokens + tokens > self.reduce_max_tokens:
+                groups.append(current)
+                current, current_tokens = [], 0
+            current.append(summary)
+            current_tokens += tokens
+        if current:
+            groups.append(current)
+        # 1件ずつのグループしか作れない場合も最低2件ずつまとめて数を減らす
+        if len(groups) == len(summaries):
+            groups = [summaries[i : i + 2] for i in range(0, len(summaries), 2)]
+        return groups
+
+    async def _summarize_final(
+        self,
+        chunk_summaries: list[str],
+        on_token: Callable[[str], None] | None = None,
+        on_reset: Callable[[], None] | None = None,
+    ) -> str:
         """チャンク要約をまとめて最終要約を生成"""
         combined_text = "\n".join(chunk_summaries)
         final_prompt = generate_prompt(combined_text)
-        return await self._az_openai_client.get_summary(final_prompt)
+        return await self._summarize_with_retry(
+            final_prompt, on_token, on_reset, priority=PRIORITY_FINAL
+        )
+
+    async def _summarize_with_retry(
+        self,
+        prompt_messages: list[dict[str, Any]],
+        on_token: Callable[[str], None] | None = None,
+        on_reset: Callable[[], None] | None = None,
+        priority: int = PRIORITY_MAP,
+    ) -> str:
+        """
+        同じプロンプト・モデルの要約がキャッシュにあればそれを返す。
+        なければレート制限の枠を確保してから要約を取得し、一時的なエラーは再試行する。
+        priority が小さい呼び出しほどレート制限の待ち行列で先に通す。
+        """
+        cache_key = None
+        if self._content_cache is not None:
+            cache_key = ContentCache.make_key(
+                self._az_openai_client.model, prompt_messages
+            )
+            cached = await asyncio.to_thread(
+                self._content_cache.get, "summary", cache_key
+            )
+            if cached is not None:
+                if on_token is not None:
+                    on_token(cached)
+                return cached
+
+        # レート制限の枠は入力トークン数と最大出力トークン数の合計で見積もる
+        prompt_tokens = sum(count_tokens(m["content"]) for m in prompt_messages)
+        estimated_tokens = prompt_tokens + self._az_openai_client.max_output_tokens
+        kind = PRIORITY_KINDS.get(priority, "map")
+        streamed = False
+
+        def emit(delta: str) -> None:
+            nonlocal streamed
+            streamed = True
+            on_token(delta)
+
+        async def call() -> str:
+            with tracer.start_as_current_span(
+                "openai.summarize",
+                attributes={"openai.kind": kind, "openai.input_tokens": prompt_tokens},
+            ) as span:
+                summary = await request()
+                span.set_attribute("openai.output_tokens", count_tokens(summary))
+                return summary
+
+        async def request() -> str:
+            nonlocal streamed
+            if streamed and on_reset is not None:
+                on_reset()
+            streamed = False
+            # 枠の待ち時間(スロットリング)をOpenAIの処理時間と分けて確認できるようにする
+            with tracer.start_as_current_span(
+                "openai.rate_limit_wait", attributes={"openai.priority": priority}
+            ):
+                await self._rate_limiter.acquire(estimated_tokens, priority)
+            started = time.perf_counter()
+            try:
+                summary = await self._az_openai_client.get_summary(
+                    prompt_messages,
+                    on_token=emit if on_token is not None else None,
+                    on_headers=self._rate_limiter.update_from_headers,
+                )
+            except HTTPException as e:
+                if e.status_code == 429:
+                    self._rate_limiter.release_throttled(self._retry_after(e.headers))
+                    outcome = "throttled"
+                else:
+                    self._rate_limiter.release(succeeded=False)
+                    outcome = "error"
+                self._observe_call(kind, outcome, started)
+                raise
+            except BaseException:
+                self._rate_limiter.release(succeeded=False)
+                raise
+            self._rate_limiter.release()
+            self._observe_call(kind, "ok", started)
+            OPENAI_CALL_TOKENS.labels(kind=kind, direction="input").observe(prompt_tokens)
+            OPENAI_CALL_TOKENS.labels(kind=kind, direction="output").observe(
+                count_tokens(summary)
+            )
+            return summary
+
+        summary = await self._retry(call)
+        if cache_key is not None:
+            await asyncio.to_thread(
+                self._content_cache.set, "summary", cache_key, summary
+            )
+        return summary
+
+    @staticmethod
+    def _observe_call(kind: str, outcome: str, started: float) -> None:
+        OPENAI_CALL_SECONDS.labels(kind=kind, outcome=outcome).observe(
+            time.perf_counter() - started
+        )
+
+    async def _retry(self, call: Callable[[], Awaitable[T]]) -> T:
+        """429/5xxなどの一時的なエラーをジッター付き指数バックオフで再試行する"""
+        attempt = 0
+        while True:
+            try:
+                return await call()
+            except HTTPException as e:
+                attempt += 1
+                if not self._is_retryable(e) or attempt > self.max_retries:
+                    raise
+                delay = self._retry_delay(attempt, e)
+                logger.warning(
+                    f"OpenAI呼び出しに失敗、{delay:.1f}秒後に再試行 "
+                    f"({attempt}/{self.max_retries}): {e.detail}"
+                )
+                await asyncio.sleep(delay)
+
+    @staticmethod
+    def _is_retryable(e: HTTPException) -> bool:
+        """APIが返した一時的なエラーのみ再試行する(コード内の不具合による500は再試行しない)"""
+        return isinstance(e, OpenAIAPIError) and (
+            e.status_code in RETRYABLE_STATUS_CODES or e.status_code >= 500
+        )
+
+    def _retry_delay(self, attempt: int, e: HTTPException) -> float:
+        """
+        429の場合はレート制限がRetry-Afterの間すべての呼び出しを止めているため、
+        同時に再試行が集中しないようジッターのみ待つ。
+        それ以外はRetry-Afterがあればそれを優先し、なければフルジッターの指数バックオフ。
+        """
+        if e.status_code == 429:
+            return random.uniform(0, self.retry_base_seconds)
+        retry_after = self._retry_after(e.headers)
+        if retry_after is not None:
+            return retry_after + random.uniform(0, self.retry_base_seconds)
+        cap = min(self.retry_max_seconds, self.retry_base_seconds * 2**attempt)
+        return random.uniform(0, cap)
+
+    @staticmethod
+    def _retry_after(headers: dict[str, str] | None) -> float | None:
+        retry_after = (headers or {}).get("Retry-After")
+        if retry_after is None:
+            return None
+        try:
+            return float(retry_after)
+        except ValueError:
+            return None
@@ -1,73 +1,119 @@
+import asyncio
 import logging
-from pathlib import Path
 import tempfile
-import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from io import BytesIO
+from typing import Any, BinaryIO
+
 from docx import Document
 from docx.shared import Pt
 from docx.enum.text import WD_ALIGN_PARAGRAPH
-from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+# これを超えるサイズの文書は一時ファイルに書き出す
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+
+@dataclass
+class WordDocument:
+    """生成したWord文書(メモリ上、大きい場合は一時ファイル)"""
+    file_name: str
+    file: BinaryIO
+    size: int
+
+    def close(self) -> None:
+        self.file.close()
+
 
 class WordGeneratingService:
-    """Word文書の生成を行うサービス"""
-    def __init__(self):
-        self.doc = None
-        self.temp_dir = None
-        self.temp_file_path = None
+    """
+    Word文書の生成を行うサービス。
+    文書の組み立てと保存は専用のスレッドプールで行い、イベントループを止めない。
+    タイトルまで作成したテンプレートを起動時に1度だけ作り、文書ごとにそこから生成する。
+    文書ごとの状態はインスタンスに持たないため、複数のタスクで共有できる。
+    """
+    def __init__(
+        self,
+        template_path: str | None = None,
+        max_workers: int = 2,
+    ):
+        self._template = self._build_template(template_path)
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="word"
+        )
 
     async def create_word_document(
-        self, transcribed_text: str, summarized_text: str
-    ) -> Path:
-        """文字起こしと要約からWord文書を生成する"""
-        if not transcribed_text or not summarized_text:
+        self, speaker_blocks: list[dict[str, Any]], summarized_text: str
+    ) -> WordDocument:
+        """話者ブロックごとの文字起こしと要約からWord文書を生成する"""
+        if not speaker_blocks or not summarized_text:
             raise ValueError("文字起こしテキストと要約テキストは必須です")
         try:
-            self._initialize_document()
-            self._add_sections(summarized_text, transcribed_text)
-            self._save_document()
-            logger.info(f"Word文書を生成: {self.temp_file_path}")
-            return self.temp_file_path
+            loop = asyncio.get_running_loop()
+            document = await loop.run_in_executor(
+                self._executor, self._render, speaker_blocks, summarized_text
+            )
+            logger.info(f"Word文書を生成: {document.file_name} ({document.size} bytes)")
+            return document
         except Exception as e:
             logger.error(f"Word文書の生成に失敗: {str(e)}")
             raise Exception(f"Word文書の生成に失敗しました: {str(e)}")
 
-    def _initialize_document(self) -> None:
-        """一時ディレクトリとWord文書の初期化"""
-        self.temp_dir = Path(tempfile.mkdtemp())
-        now = datetime.now()
-        filename = f"{now.year}_{now.month:02d}{now.day:02d}_{now.hour:02d}{now.minute:02d}_議事録.docx"
-        self.temp_file_path = self.temp_dir / filename
-        self.doc = Document()
-
-    def _add_sections(self, summary_text: str, transcribed_text: str) -> None:
-        """タイトル・要約・文字起こしセクションをまとめて追加"""
-        self._add_title()
-        self._add_section("要約", summary_text)
-        self._add_section("文字起こし", transcribed_text)
-
-    def _add_title(self) -> None:
-        """タイトルを追加"""
-        title = self.doc.add_heading("文字起こしと要約", 0)
+    async def cleanup_word_file(self, document: WordDocument) -> None:
+        """生成したWord文書を破棄する"""
+        try:
+            document.close()
+        except Exception as e:
+            logger.warning(f"Word文書の破棄に失敗: {str(e)}")
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    @staticmethod
+    def _build_template(template_path: str | None) -> bytes:
+        """テンプレート(指定がなければ既定の文書)にタイトルを追加し、保存済みのバイト列にする"""
+        doc = Document(template_path) if template_path else Document()
+        title = doc.add_heading("文字起こしと要約", 0)
         title.alignment = WD_ALIGN_PARAGRAPH.CENTER
+        buffer = BytesIO()
+        doc.save(buffer)
+        return buffer.getvalue()
 
-    def _add_section(self, heading: str, content: str) -> None:
-        """見出しと本文を追加"""
-        self.doc.add_heading(heading, level=1)
-        para = self.doc.add_paragraph(content)
-        for run in para.runs:
+    def _render(
+        self, speaker_blocks: list[dict[str, Any]], summarized_text: str
+    ) -> WordDocument:
+        """テンプレートから文書を組み立て、SpooledTemporaryFile に保存する(ワーカースレッドで実行)"""
+        doc = Document(BytesIO(self._template))
+
+        doc.add_heading("要約", level=1)
+        self._add_paragraph(doc, summarized_text)
+
+        doc.add_heading("文字起こし", level=1)
+        for block in speaker_blocks:
+            para = doc.add_paragraph()
+            if block.get("speaker") is not None:
+                speaker_run = para.add_run(f"[話者{block['speaker']}]\n")
+                speaker_run.bold = True
+                speaker_run.font.size = Pt(11)
+            run = para.add_run(block["text"])
             run.font.size = Pt(11)
 
-    def _save_document(self) -> None:
-        """文書を保存"""
-        self.doc.save(str(self.temp_file_path))
+        file = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+        doc.save(file)
+        size = file.tell()
+        file.seek(0)
+        return WordDocument(file_name=self._file_name(), file=file, size=size)
 
-    async def cleanup_word_file(self, file_path: str) -> None:
-        """生成したWord文書を削除する"""
-        try:
-            if os.path.exists(file_path):
-                os.remove(file_path)
-                logger.info(f"Word文書を削除: {file_path}")
-        except Exception as e:
-            logger.warning(f"Word文書の削除に失敗: {str(e)}")
+    @staticmethod
+    def _add_paragraph(doc: Any, content: str) -> None:
+        para = doc.add_paragraph(content)
+        for run in para.runs:
+            run.font.size = Pt(11)
+
+    @staticmethod
+    def _file_name() -> str:
+        now = datetime.now()
+        return f"{now.year}_{now.month:02d}{now.day:02d}_{now.hour:02d}{now.minute:02d}_議事録.docx"
@@ -1,5 +1,7 @@
+import asyncio
 from typing import Any
 from pathlib import Path
+import json
 import logging
 
 from app.services.task_managing_service import TaskManagingService
@@ -9,9 +11,16 @@ from app.infrastructure.az_openai import AzOpenAIClient
 from app.infrastructure.ms_sharepoint import MsSharePointClient
 from app.infrastructure.az_blob import AzBlobClient
 from app.infrastructure.az_speech import AzSpeechClient
+from app.infrastructure.content_cache import ContentCache
 from app.services.audio.mp4_processing_service import MP4ProcessingService
 from app.services.text_summarization_service import TextSummarizationService
 from app.services.audio.audio_transcription_service import AudioTranscriptionService
+from app.services.audio.transcription_batcher import TranscriptionBatcher
+from app.utils.stage_limiter import StageLimiter
+from app.utils.rate_limiter import RateLimiter
+from app.utils.transcript import Transcript
+from app.utils.speaker_blocks import parse_speaker_blocks
+from app.utils.metrics import TASKS_IN_FLIGHT, time_stage
 
 logger = logging.getLogger(__name__)
 
@@ -27,48 +36,124 @@ class AudioProcessingUseCase:
         az_speech_client: AzSpeechClient,
         az_openai_client: AzOpenAIClient,
         ms_sharepoint_client: MsSharePointClient,
+        stage_limiter: StageLimiter | None = None,
+        transcription_batcher: TranscriptionBatcher | None = None,
+        openai_rate_limiter: RateLimiter | None = None,
+        content_cache: ContentCache | None = None,
+        summary_overlap_tokens: int = 0,
+        archive_audio: bool = False,
     ):
         self._task_managing_service = task_managing_service
+        self._stage_limiter = stage_limiter or StageLimiter({})
+        self._content_cache = content_cache
         self._audio_processing_service = AudioProcessingService(
             az_speech_client=az_speech_client,
             az_blob_client=az_blob_client,
             mp4_processing_service=mp4_processing_service,
-            audio_transcription_service=AudioTranscriptionService(az_speech_client),
+            audio_transcription_service=AudioTranscriptionService(
+                az_speech_client, transcription_batcher
+            ),
+            stage_limiter=self._stage_limiter,
         )
         self._text_summarization_service = TextSummarizationService(
-            az_openai_client=az_openai_client, max_tokens=7500, batch_size=5
+            az_openai_client=az_openai_client,
+            max_tokens=7500,
+            overlap_tokens=summary_overlap_tokens,
+            max_concurrency=5,
+            rate_limiter=openai_rate_limiter,
+            content_cache=content_cache,
         )
         self._word_generating_service = word_generating_service
         self._ms_sharepoint_client = ms_sharepoint_client
+        self._archive_audio = archive_audio
 
     async def execute(
-        self, task_id: str, site_data: dict[str, Any] | None, file_path: str
+        self,
+        task_id: str,
+        site_data: dict[str, Any] | None,
+        file_path: str,
+        mark_failed: bool = True,
+        file_hash: str | None = None,
+    ) -> None:
+        """
+        音声文字起こしの実行。
+        mark_failed が False の場合、失敗してもタスクを失敗状態にしない(リトライ予定の場合)。
+        file_hash が指定され、同じ音声の文字起こし結果がキャッシュにあれば音声処理を省略する。
+        """
+        with TASKS_IN_FLIGHT.track_inprogress():
+            await self._execute(task_id, site_data, file_path, mark_failed, file_hash)
+
+    async def _execute(
+        self,
+        task_id: str,
+        site_data: dict[str, Any] | None,
+        file_path: str,
+        mark_failed: bool,
+        file_hash: str | None,
     ) -> None:
-        """音声文字起こしの実行"""
         try:
-            self._task_managing_service.initialize_task(task_id)
+            await self._task_managing_service.initialize_task(task_id)
 
             # 音声処理と文字起こし、要約を実行
-            transcribed_text = await self._audio_processing_service.process_audio(
-                file_path
-            )
-            summarized_text = await self._text_summarization_service.summarize_text(
-                transcribed_text
-            )
-            self._task_managing_service.complete_task(
-                task_id, transcribed_text, summarized_text
+            self._publish_stage(task_id, "transcribing")
+            with time_stage("transcription"):
+                transcript = await self._transcribe(file_path, file_hash)
+            await self._task_managing_service.save_transcript(task_id, transcript)
+
+            self._publish_stage(task_id, "summarizing")
+            async with self._stage_limiter.limit("openai"):
+                with time_stage("summarization"):
+                    summarized_text = await self._text_summarization_service.summarize_text(
+                        transcript.to_text(),
+                        on_token=lambda delta: self._task_managing_service.publish_event(
+                            task_id, "summary_delta", {"text": delta}
+                        ),
+                        on_reset=lambda: self._task_managing_service.publish_event(
+                            task_id, "summary_reset", {}
+                        ),
+                    )
+            await self._task_managing_service.complete_task(
+                task_id, transcript, summarized_text
             )
 
             # SharePointへのアップロードが必要な場合のみWordファイル処理を実行
             if self._should_upload_to_sharepoint(site_data):
                 await self._generate_and_upload_word(task_id, site_data)
+                if self._archive_audio:
+                    await self._archive_audio_file(task_id, site_data, file_path)
 
         except Exception as e:
             error_message = str(e)
             logger.error(f"タスク {task_id} の処理中にエラー: {error_message}")
-            self._task_managing_service.fail_task(task_id, error_message)
+            if mark_failed:
+                await self._task_managing_service.fail_task(task_id, error_message)
             raise
 
+    def _publish_stage(self, task_id: str, stage: str) -> None:
+        """処理段階の変化を配信する"""
+        self._task_managing_service.publish_event(task_id, "stage", {"stage": stage})
+
+    async def _transcribe(self, file_path: str, file_hash: str | None) -> Transcript:
+        """音声を文字起こしする(同じ音声の結果がキャッシュにあればそれを返す)"""
+        use_cache = self._content_cache is not None and file_hash is not None
+        if use_cache:
+            cached = await asyncio.to_thread(
+                self._content_cache.get, "transcript_model", file_hash
+            )
+            if cached is not None:
+                logger.info(f"文字起こし結果をキャッシュから取得: {file_hash}")
+                return Transcript.from_dict(json.loads(cached))
+
+        transcript = await self._audio_processing_service.process_audio(file_path)
+        if use_cache:
+            await asyncio.to_thread(
+                self._content_cache.set,
+                "transcript_model",
+                file_hash,
+                json.dumps(transcript.to_dict(), ensure_ascii=False),
+            )
+        return transcript
+
     def _should_upload_to_sharepoint(self, site_data: dict[str, Any] | None) -> bool:
         """SharePointアップロードが必要か判定"""
         return site_data is not None and all(
@@ -79,23 +164,58 @@ class AudioProcessingUseCase:
         self, task_id: str, site_data: dict[str, Any]
     ) -> None:
         """Wordファイルの生成とアップロード(必要な場合のみ)"""
-        transcribed_text = self._task_managing_service.transcribed_text[task_id]
-        summarized_text = self._task_managing_service.summarized_text[task_id]
+        task = await self._task_managing_service.get_task(task_id) or {}
+        summarized_text = task.get("summarized_text")
+        transcript = await self._task_managing_service.get_transcript(task_id)
+        speaker_blocks = (
+            transcript.speaker_blocks()
+            if transcript is not None
+            else parse_speaker_blocks(task.get("transcribed_text") or "")
+        )
 
-        if not transcribed_text or not summarized_text:
+        if not speaker_blocks or not summarized_text:
             raise ValueError("文字起こしまたは要約テキストが存在しません")
 
-        word_file_path = await self._word_generating_service.create_word_document(
-            transcribed_text, summarized_text
-        )
+        with time_stage("docx_build"):
+            document = await self._word_generating_service.create_word_document(
+                speaker_blocks, summarized_text
+            )
 
         try:
-            self._ms_sharepoint_client.upload_file(
-                site_data["site"], site_data["directory"], word_file_path
-            )
+            with time_stage("sharepoint_upload"):
+                await self._ms_sharepoint_client.upload_fileobj(
+                    site_data["site"],
+                    site_data["directory"],
+                    document.file_name,
+                    document.file,
+                    document.size,
+                    on_progress=self._progress_reporter(task_id, "word_upload"),
+                )
         except Exception as e:
             logger.warning(
                 f"Wordファイルの処理中にエラーが発生しましたが、文字起こしは正常に完了しています: {str(e)}"
             )
         finally:
-            await self._word_generating_service.cleanup_word_file(word_file_path)
+            await self._word_generating_service.cleanup_word_file(document)
+
+    async def _archive_audio_file(
+        self, task_id: str, site_data: dict[str, Any], file_path: str
+    ) -> None:
+        """元の音声ファイルをSharePointに保管する(失敗しても処理結果には影響させない)"""
+        try:
+            await self._ms_sharepoint_client.upload_file(
+                site_data["site"],
+                site_data["directory"],
+                Path(file_path),
+                on_progress=self._progress_reporter(task_id, "audio_archive"),
+            )
+        except Exception as e:
+            logger.warning(f"音声ファイルのSharePointへの保管に失敗: {str(e)}")
+
+    def _progress_reporter(self, task_id: str, stage: str):
+        """アップロードの進捗をタスクの状態に記録する関数を返す"""
+
+        async def report(done: int, total: int) -> None:
+            await self._task_managing_service.report_progress(task_id, stage, done, total)
+
+        return report
@@ -1,34 +1,81 @@
 import os
+import hashlib
 import tempfile
 from pathlib import Path
-from fastapi import UploadFile
+from typing import Any
+from fastapi import UploadFile, HTTPException
+from aiofiles import open as aio_open
 import logging
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
 
 async def save_file_temporarily(file: UploadFile) -> str:
     """アップロードされたファイルを一時的に保存する"""
+    saved = await save_file_in_chunks(file)
+    return saved["file_path"]
+
+
+async def save_file_in_chunks(
+    file: UploadFile,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    max_size: int | None = None,
+) -> dict[str, Any]:
+    """
+    アップロードされたファイルを固定サイズのチャンク単位で一時ファイルに書き込む。
+    メモリ使用量はファイルサイズに関係なくチャンクサイズ分に抑えられる。
+    """
+    temp_path = None
     try:
         suffix = Path(file.filename).suffix
-        temp_file = _create_temp_file(suffix)
-        await _write_file_content(file, temp_file)
-        return temp_file.name
+        temp_path = _create_temp_file(suffix)
+        size, checksum = await _write_file_in_chunks(
+            file, temp_path, chunk_size, max_size
+        )
+        logger.info(f"ファイルを保存: {temp_path} ({size} bytes, sha256={checksum})")
+        return {"file_path": temp_path, "size": size, "sha256": checksum}
+    except HTTPException:
+        _remove_partial_file(temp_path)
+        raise
     except Exception as e:
+        _remove_partial_file(temp_path)
         _handle_save_error(e)
 
 
-def _create_temp_file(suffix: str) -> tempfile._TemporaryFileWrapper:
-    """一時ファイルを作成する"""
-    return tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
+def _create_temp_file(suffix: str) -> str:
+    """一時ファイルを作成し、そのパスを返す"""
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_file:
+        return temp_file.name
+
+
+async def _write_file_in_chunks(
+    file: UploadFile, temp_path: str, chunk_size: int, max_size: int | None
+) -> tuple[int, str]:
+    """チャンク単位で書き込みつつ、サイズとチェックサムを計算する"""
+    digest = hashlib.sha256()
+    size = 0
+    async with aio_open(temp_path, "wb") as f:
+        while chunk := await file.read(chunk_size):
+            size += len(chunk)
+            if max_size is not None and size > max_size:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"ファイルサイズが上限({max_size} bytes)を超えています",
+                )
+            digest.update(chunk)
+            await f.write(chunk)
+    return size, digest.hexdigest()
 
 
-async def _write_file_content(
-    file: UploadFile, temp_file: tempfile._TemporaryFileWrapper
-) -> None:
-    """ファイルの内容を書き込む"""
-    content = await file.read()
-    temp_file.write(content)
+def _remove_partial_file(temp_path: str | None) -> None:
+    """書き込み途中の一時ファイルを削除する"""
+    if temp_path and os.path.exists(temp_path):
+        try:
+            os.remove(temp_path)
+        except OSError as e:
+            logger.warning(f"一時ファイル削除失敗: {temp_path} ({e})")
 
 
 def _handle_save_error(e: Exception) -> None:
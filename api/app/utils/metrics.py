@@ -0,0 +1,112 @@
+import asyncio
+import os
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+from app.utils.tracing import detached_span
+
+# 数十ミリ秒(ファイル保存など)から1時間(長時間の文字起こし)までを対象にする
+STAGE_BUCKETS = (
+    0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1200, 1800, 3600,
+)
+OPENAI_SECONDS_BUCKETS = (0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300)
+OPENAI_TOKEN_BUCKETS = (100, 250, 500, 1000, 2000, 4000, 8000, 12000, 16000, 32000)
+
+PIPELINE_STAGE_SECONDS = Histogram(
+    "audio_pipeline_stage_seconds",
+    "文字起こしパイプラインの段階ごとの処理時間(秒)",
+    ["stage"],
+    buckets=STAGE_BUCKETS,
+)
+OPENAI_CALL_SECONDS = Histogram(
+    "openai_call_seconds",
+    "OpenAI呼び出し1回あたりの処理時間(秒)。kind は map / reduce / final",
+    ["kind", "outcome"],
+    buckets=OPENAI_SECONDS_BUCKETS,
+)
+OPENAI_CALL_TOKENS = Histogram(
+    "openai_call_tokens",
+    "OpenAI呼び出し1回あたりのトークン数。direction は input / output",
+    ["kind", "direction"],
+    buckets=OPENAI_TOKEN_BUCKETS,
+)
+TASKS_IN_FLIGHT = Gauge(
+    "audio_tasks_in_flight",
+    "処理中の文字起こしタスク数",
+    multiprocess_mode="livesum",
+)
+# 以下は各コンポーネントの状態から設定する。ワーカーを動かすプロセスは定期的に、
+# /metrics を返すプロセスは取得時にも自身の状態を反映し、multiprocess_mode で集計する
+JOB_QUEUE_DEPTH = Gauge(
+    "job_queue_depth", "ジョブキューに残っているジョブ数", multiprocess_mode="max"
+)
+TRANSCODE_QUEUE_DEPTH = Gauge(
+    "transcode_queue_depth", "FFmpegの実行枠を待っている変換数", multiprocess_mode="livesum"
+)
+TRANSCODE_RUNNING = Gauge(
+    "transcode_running", "実行中のFFmpeg変換数", multiprocess_mode="livesum"
+)
+OPENAI_WAITING = Gauge(
+    "openai_requests_waiting", "レート制限の枠を待っているOpenAI呼び出し数", multiprocess_mode="livesum"
+)
+OPENAI_IN_FLIGHT = Gauge(
+    "openai_requests_in_flight", "実行中のOpenAI呼び出し数", multiprocess_mode="livesum"
+)
+OPENAI_CONCURRENCY_LIMIT = Gauge(
+    "openai_concurrency_limit", "AIMDで調整中のOpenAI同時実行数の上限", multiprocess_mode="livesum"
+)
+SPEECH_JOBS_PENDING = Gauge(
+    "speech_jobs_pending", "完了を待っている文字起こしジョブ数", multiprocess_mode="livesum"
+)
+
+
+@contextmanager
+def time_stage(stage: str) -> Iterator[None]:
+    """
+    with ブロックの処理時間を段階 stage のヒストグラムに記録し、同じ区間のスパンを作成する。
+    非同期ジェネレーター内でも使えるよう、スパンは現在のコンテキストに設定しない。
+    """
+    with detached_span(f"stage.{stage}"):
+        with PIPELINE_STAGE_SECONDS.labels(stage=stage).time():
+            yield
+
+
+async def update_state_gauges(state: Any) -> None:
+    """アプリケーションの状態(キューの深さなど)をゲージに反映する"""
+    if hasattr(state, "job_queue"):
+        # ジョブキューの深さはSQLiteから読むため、イベントループの外で取得する
+        JOB_QUEUE_DEPTH.set(await asyncio.to_thread(state.job_queue.depth))
+    if hasattr(state, "transcoding_executor"):
+        transcoding = state.transcoding_executor.metrics()
+        TRANSCODE_QUEUE_DEPTH.set(transcoding["queue_depth"])
+        TRANSCODE_RUNNING.set(transcoding["running"])
+    if hasattr(state, "openai_rate_limiter"):
+        openai = state.openai_rate_limiter.metrics()
+        OPENAI_WAITING.set(openai["waiting"])
+        OPENAI_IN_FLIGHT.set(openai["in_flight"])
+        OPENAI_CONCURRENCY_LIMIT.set(openai["concurrency_limit"] or 0)
+    if hasattr(state, "az_client_factory"):
+        poller = state.az_client_factory.transcription_poller
+        SPEECH_JOBS_PENDING.set(poller.pending_count if poller is not None else 0)
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """
+    Prometheusのテキスト形式でメトリクスを出力する。
+    PROMETHEUS_MULTIPROC_DIR が設定されている場合はワーカープロセスの分も集計する。
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
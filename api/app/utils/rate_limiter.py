@@ -0,0 +1,192 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Any, Callable, Mapping
+
+from app.infrastructure.rate_limit_store import RateLimitStore
+
+logger = logging.getLogger(__name__)
+
+# 優先度(小さいほど先に実行する)。完了間近のタスクの呼び出しを先に通す
+PRIORITY_FINAL = 0
+PRIORITY_REDUCE = 1
+PRIORITY_MAP = 2
+
+# Retry-Afterがない429の後に全体の送信を止める秒数
+DEFAULT_THROTTLE_PAUSE_SECONDS = 1.0
+# 同時実行数を半減させた後、次に半減させるまでの最短間隔(同時に返った429で何度も下げないため)
+DECREASE_COOLDOWN_SECONDS = 1.0
+# ストアの読み書きに失敗した場合に、次に枠の確保を試みるまでの秒数
+STORE_ERROR_RETRY_SECONDS = 1.0
+
+
+class RateLimiter:
+    """
+    TPM/RPMのトークンバケットと、AIMDで調整する同時実行数でAPI呼び出しを制限する。
+    - 待機中の呼び出しは優先度順(同じ優先度なら先着順)に通す
+    - 成功するたびに同時実行数を少しずつ増やし、429で半減させる
+    - 応答の x-ratelimit-remaining-* ヘッダーでバケットの残量を補正する
+    バケットはストアに保持するため、SQLiteストアを使えば複数のワーカープロセスで共有できる。
+    ストアの読み書きはイベントループを止めないよう別スレッドで行い、枠の判定は1つのタスクで順に行う。
+    同時実行数の調整はプロセスごとに行う。max_concurrency が0以下の場合は同時実行数を制限しない。
+    """
+
+    def __init__(
+        self,
+        store: RateLimitStore,
+        max_concurrency: int = 0,
+        min_concurrency: int = 1,
+    ):
+        self._store = store
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self._concurrency = float(max_concurrency)
+        self._in_flight = 0
+        self._waiters: list[tuple[int, int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._timer: asyncio.TimerHandle | None = None
+        self._dispatcher: asyncio.Task | None = None
+        self._redispatch = False
+        self._store_updates: set[asyncio.Task] = set()
+        self._last_decrease = 0.0
+        self._throttled = 0
+
+    @property
+    def tokens_per_minute(self) -> int:
+        return self._store.tokens_per_minute
+
+    @property
+    def requests_per_minute(self) -> int:
+        return self._store.requests_per_minute
+
+    @property
+    def concurrency_limit(self) -> int:
+        return max(self.min_concurrency, int(self._concurrency))
+
+    async def acquire(self, tokens: int, priority: int = PRIORITY_MAP) -> None:
+        """
+        指定トークン数と1リクエスト分の枠が空くまで待機して確保する。
+        確保した後は呼び出しの結果に応じて release / release_throttled を必ず呼ぶこと。
+        """
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), tokens, future))
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            # 枠を確保した直後にキャンセルされた場合は返却する
+            if future.done() and not future.cancelled():
+                self.release(succeeded=False)
+            raise
+
+    def release(self, succeeded: bool = True) -> None:
+        """呼び出しの終了を通知する。成功した場合は同時実行数を加算的に増やす"""
+        self._in_flight -= 1
+        if succeeded and self.max_concurrency > 0:
+            self._concurrency = min(
+                float(self.max_concurrency), self._concurrency + 1 / self._concurrency
+            )
+        self._dispatch()
+
+    def release_throttled(self, retry_after: float | None = None) -> None:
+        """429で終了したことを通知する。同時実行数を半減させ、全体の送信を一時停止する"""
+        self._in_flight -= 1
+        self._throttled += 1
+        now = time.monotonic()
+        if self.max_concurrency > 0 and now - self._last_decrease >= DECREASE_COOLDOWN_SECONDS:
+            self._concurrency = max(float(self.min_concurrency), self._concurrency / 2)
+            self._last_decrease = now
+        # 一時停止を記録してから待機者を通す
+        self._update_store(
+            self._store.pause,
+            retry_after if retry_after is not None else DEFAULT_THROTTLE_PAUSE_SECONDS,
+        )
+
+    def update_from_headers(self, headers: Mapping[str, str]) -> None:
+        """応答ヘッダーの x-ratelimit-remaining-tokens / -requests でバケットを補正する"""
+        remaining_tokens = self._parse_int(headers.get("x-ratelimit-remaining-tokens"))
+        remaining_requests = self._parse_int(headers.get("x-ratelimit-remaining-requests"))
+        if remaining_tokens is None and remaining_requests is None:
+            return
+        self._update_store(self._store.clamp, remaining_tokens, remaining_requests)
+
+    def metrics(self) -> dict[str, Any]:
+        return {
+            "concurrency_limit": self.concurrency_limit if self.max_concurrency > 0 else None,
+            "in_flight": self._in_flight,
+            "waiting": sum(1 for *_, f in self._waiters if not f.done()),
+            "throttled": self._throttled,
+        }
+
+    def close(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+        self._store.close()
+
+    def _update_store(self, update: Callable[..., None], *args: Any) -> None:
+        """ストアの更新を別スレッドで行い、完了後に待機者を通せるか判定し直す"""
+        task = asyncio.get_running_loop().create_task(self._apply_store(update, *args))
+        self._store_updates.add(task)
+        task.add_done_callback(self._store_updates.discard)
+
+    async def _apply_store(self, update: Callable[..., None], *args: Any) -> None:
+        try:
+            await asyncio.to_thread(update, *args)
+        except Exception as e:
+            logger.warning(f"レート制限のストアの更新に失敗: {str(e)}")
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """待機者を通せるか判定する。判定中に呼ばれた場合は、判定中のタスクにやり直させる"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._dispatcher is not None and not self._dispatcher.done():
+            self._redispatch = True
+            return
+        if self._waiters:
+            self._dispatcher = asyncio.get_running_loop().create_task(
+                self._dispatch_waiters()
+            )
+
+    async def _dispatch_waiters(self) -> None:
+        """先頭(最も優先度の高い)待機者から順に、枠が空いている限り実行を許可する"""
+        while self._waiters:
+            self._redispatch = False
+            _, _, tokens, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            if self.max_concurrency > 0 and self._in_flight >= self.concurrency_limit:
+                # release で再開する
+                return
+            try:
+                wait = await asyncio.to_thread(self._store.try_consume, tokens)
+            except Exception as e:
+                logger.warning(f"レート制限の枠の確保に失敗: {str(e)}")
+                wait = STORE_ERROR_RETRY_SECONDS
+            if wait > 0:
+                if self._redispatch:
+                    # 待機中に枠の返却や優先度の高い待機者の追加があった
+                    continue
+                # 優先度の低い呼び出しが先に枠を使わないよう、先頭が通るまで待つ
+                self._timer = asyncio.get_running_loop().call_later(wait, self._dispatch)
+                return
+            # 確保を待つ間に先頭が入れ替わっている場合があるため、確保した待機者を直接通す
+            # (その間にキャンセルされていた場合、確保した枠は使われない)
+            if not future.done():
+                self._in_flight += 1
+                future.set_result(None)
+
+    @staticmethod
+    def _parse_int(value: str | None) -> int | None:
+        if value is None:
+            return None
+        try:
+            return int(float(value))
+        except ValueError:
+            return None
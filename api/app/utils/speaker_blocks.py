@@ -0,0 +1,28 @@
+import re
+from typing import Any
+
+# format_transcription_by_speaker が出力する "[話者N]" ブロックの区切り
+SPEAKER_BLOCK_PATTERN = re.compile(r"\n\n(?=\[話者\d+\]\n)")
+SPEAKER_HEADER_PATTERN = re.compile(r"\[話者(\d+)\]\n")
+
+
+def split_blocks(text: str) -> list[str]:
+    """文字起こしテキストを話者ブロックごとの文字列に分ける"""
+    if not text:
+        return []
+    return SPEAKER_BLOCK_PATTERN.split(text.strip("\n"))
+
+
+def parse_speaker_blocks(text: str) -> list[dict[str, Any]]:
+    """
+    文字起こしテキストを {"speaker": 話者番号, "text": 発話} のリストに変換する。
+    見出しのないブロック(エラーメッセージなど)の話者はNone。
+    """
+    blocks = []
+    for block in split_blocks(text):
+        match = SPEAKER_HEADER_PATTERN.match(block)
+        if match:
+            blocks.append({"speaker": int(match.group(1)), "text": block[match.end() :]})
+        else:
+            blocks.append({"speaker": None, "text": block})
+    return blocks
@@ -0,0 +1,25 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+
+class StageLimiter:
+    """
+    パイプラインの処理段階(ffmpeg, speech, openai など)ごとに同時実行数を制限する。
+    上限が設定されていない段階は制限しない。
+    """
+
+    def __init__(self, limits: dict[str, int]):
+        self._semaphores = {
+            stage: asyncio.Semaphore(limit) for stage, limit in limits.items() if limit > 0
+        }
+
+    @asynccontextmanager
+    async def limit(self, stage: str) -> AsyncIterator[None]:
+        """指定した段階の実行枠を確保する"""
+        semaphore = self._semaphores.get(stage)
+        if semaphore is None:
+            yield
+            return
+        async with semaphore:
+            yield
@@ -0,0 +1,42 @@
+from typing import Iterator
+
+from app.utils.transcript import Transcript
+
+SUBTITLE_MEDIA_TYPES = {
+    "srt": "application/x-subrip",
+    "vtt": "text/vtt",
+}
+
+
+def iter_subtitles(transcript: Transcript, subtitle_format: str) -> Iterator[str]:
+    """
+    文字起こし結果からSRT/WebVTT字幕をキュー単位で順に生成する(ファイル全体をメモリに持たない)。
+    キューはフレーズ単位で、話者を付けて出力する。
+    """
+    if subtitle_format not in SUBTITLE_MEDIA_TYPES:
+        raise ValueError(f"未対応の字幕形式: {subtitle_format}")
+
+    if subtitle_format == "vtt":
+        yield "WEBVTT\n\n"
+    cue_number = 0
+    for phrase in transcript:
+        if not phrase.text:
+            continue
+        cue_number += 1
+        if subtitle_format == "srt":
+            start = _format_timestamp(phrase.start_seconds, ",")
+            end = _format_timestamp(phrase.end_seconds, ",")
+            yield f"{cue_number}\n{start} --> {end}\n[話者{phrase.speaker}] {phrase.text}\n\n"
+        else:
+            start = _format_timestamp(phrase.start_seconds, ".")
+            end = _format_timestamp(phrase.end_seconds, ".")
+            yield f"{start} --> {end}\n<v 話者{phrase.speaker}>{phrase.text}\n\n"
+
+
+def _format_timestamp(seconds: float, decimal_separator: str) -> str:
+    """秒を HH:MM:SS,mmm (SRT) / HH:MM:SS.mmm (WebVTT) 形式にする"""
+    milliseconds = int(round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3_600_000)
+    minutes, milliseconds = divmod(milliseconds, 60_000)
+    secs, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02}:{minutes:02}:{secs:02}{decimal_separator}{milliseconds:03}"
@@ -1,5 +1,20 @@
+from functools import lru_cache
+
 import tiktoken
 
+from app.utils.speaker_blocks import split_blocks
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model: str = "gpt-4o") -> tiktoken.Encoding:
+    """モデルに対応するエンコーダを取得する(初回のみ読み込み)"""
+    return tiktoken.encoding_for_model(model)
+
+
+def count_tokens(text: str) -> int:
+    """テキストのトークン数を数える"""
+    return len(get_encoding().encode(text))
+
 
 def split_token(text: str, max_tokens: int) -> list[str]:
     """
@@ -8,7 +23,7 @@ def split_token(text: str, max_tokens: int) -> list[str]:
     if not text:
         return []
 
-    encoding = tiktoken.encoding_for_model("gpt-4o")
+    encoding = get_encoding()
     tokens = encoding.encode(text)
 
     # トークンを文字列チャンクに変換
@@ -19,3 +34,139 @@ def split_token(text: str, max_tokens: int) -> list[str]:
         chunks.append(chunk_text)
 
     return chunks
+
+
+def split_speaker_blocks(
+    text: str, max_tokens: int, overlap_tokens: int = 0
+) -> list[str]:
+    """
+    話者ブロック([話者N])単位でテキストを分割し、最大トークン数以下のチャンクに詰める。
+    各ブロックは1度だけエンコードし、チャンクのトークン数は加算で求める(全文を再エンコードしない)。
+    1ブロックが上限を超える場合は発話(行)単位で分け、各部分に話者の見出しを付け直す。
+    overlap_tokens を指定すると、直前チャンクの末尾のブロックをその範囲で次のチャンクの先頭に重ねる。
+    """
+    if not text:
+        return []
+
+    encoding = get_encoding()
+    separator_tokens = len(encoding.encode("\n\n"))
+
+    units: list[tuple[str, int]] = []
+    for block in split_blocks(text):
+        units.extend(_split_block(encoding, block, max_tokens))
+
+    chunks: list[str] = []
+    current: list[tuple[str, int]] = []
+    current_tokens = 0
+    carried = 0
+    for unit in units:
+        added_tokens = unit[1] + (separator_tokens if current else 0)
+        if current and current_tokens + added_tokens > max_tokens:
+            # 重ねたブロックだけのチャンクは出力しない
+            if len(current) > carried:
+                chunks.append("\n\n".join(u[0] for u in current))
+            current = _overlap_tail(current, overlap_tokens, separator_tokens)
+            # 重ねる分を含めて上限を超える場合は重ねない
+            current_tokens = _joined_tokens(current, separator_tokens)
+            if current and current_tokens + separator_tokens + unit[1] > max_tokens:
+                current, current_tokens = [], 0
+            carried = len(current)
+            added_tokens = unit[1] + (separator_tokens if current else 0)
+        current.append(unit)
+        current_tokens += added_tokens
+    if len(current) > carried:
+        chunks.append("\n\n".join(u[0] for u in current))
+    return chunks
+
+
+def _split_block(
+    encoding: tiktoken.Encoding, block: str, max_tokens: int
+) -> list[tuple[str, int]]:
+    """ブロックを(テキスト, トークン数)の組に分ける。上限以内ならブロック全体で1件"""
+    block_tokens = len(encoding.encode(block))
+    if block_tokens <= max_tokens:
+        return [(block, block_tokens)]
+
+    header, _, body = block.partition("\n")
+    if not header.startswith("[話者"):
+        header, body = "", block
+    prefix = f"{header}\n" if header else ""
+    prefix_tokens = len(encoding.encode(prefix))
+    budget = max(1, max_tokens - prefix_tokens)
+
+    parts: list[tuple[str, int]] = []
+    lines: list[str] = []
+    lines_tokens = 0
+    newline_tokens = len(encoding.encode("\n"))
+    for line in body.split("\n"):
+        for piece in _split_line(encoding, line, budget):
+            piece_tokens = len(encoding.encode(piece))
+            added = piece_tokens + (newline_tokens if lines else 0)
+            if lines and lines_tokens + added > budget:
+                parts.append((prefix + "\n".join(lines), prefix_tokens + lines_tokens))
+                lines, lines_tokens, added = [], 0, piece_tokens
+            lines.append(piece)
+            lines_tokens += added
+    if lines:
+        parts.append((prefix + "\n".join(lines), prefix_tokens + lines_tokens))
+    return parts
+
+
+def _split_line(encoding: tiktoken.Encoding, line: str, max_tokens: int) -> list[str]:
+    """
+    上限を超える1行をトークン単位で分ける。
+    マルチバイト文字の途中で切れる場合は、UTF-8として復元できるトークン境界まで戻して区切る。
+    """
+    tokens = encoding.encode(line)
+    if len(tokens) <= max_tokens:
+        return [line]
+
+    token_bytes = encoding.decode_tokens_bytes(tokens)
+    pieces: list[str] = []
+    start = 0
+    while start < len(token_bytes):
+        end = min(start + max_tokens, len(token_bytes))
+        cut = end
+        while cut > start and (piece := _decode(token_bytes[start:cut])) is None:
+            cut -= 1
+        if cut == start:
+            # 1文字だけで上限を超える場合のみ、その文字の終わりまで含める
+            cut = end
+            piece = _decode(token_bytes[start:cut])
+            while piece is None and cut < len(token_bytes):
+                cut += 1
+                piece = _decode(token_bytes[start:cut])
+            if piece is None:
+                piece = b"".join(token_bytes[start:cut]).decode("utf-8", errors="replace")
+        pieces.append(piece)
+        start = cut
+    return pieces
+
+
+def _decode(token_bytes: list[bytes]) -> str | None:
+    """トークン列のバイトをUTF-8として復元する。文字の途中で切れている場合はNone"""
+    try:
+        return b"".join(token_bytes).decode("utf-8")
+    except UnicodeDecodeError:
+        return None
+
+
+def _overlap_tail(
+    units: list[tuple[str, int]], overlap_tokens: int, separator_tokens: int
+) -> list[tuple[str, int]]:
+    """チャンク末尾から overlap_tokens 以内に収まるブロックを取り出す"""
+    tail: list[tuple[str, int]] = []
+    total = 0
+    for unit in reversed(units):
+        added = unit[1] + (separator_tokens if tail else 0)
+        if total + added > overlap_tokens:
+            break
+        tail.insert(0, unit)
+        total += added
+    return tail
+
+
+def _joined_tokens(units: list[tuple[str, int]], separator_tokens: int) -> int:
+    if not units:
+        return 0
+    return sum(u[1] for u in units) + separator_tokens * (len(units) - 1)
@@ -0,0 +1,139 @@
+import asyncio
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator, Sequence
+
+from opentelemetry import baggage, context, propagate, trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import ReadableSpan, SpanProcessor, TracerProvider
+from opentelemetry.sdk.trace.export import (
+    BatchSpanProcessor,
+    SpanExporter,
+    SpanExportResult,
+)
+
+logger = logging.getLogger(__name__)
+
+# トレーサーは設定前に取得しても、configure_tracing 後のプロバイダーに委譲される
+tracer = trace.get_tracer("app")
+
+TASK_ID_KEY = "task_id"
+
+
+class _TaskIdSpanProcessor(SpanProcessor):
+    """コンテキストのバゲージにある task_id を、タスク内で作成されたすべてのスパンの属性に付ける"""
+
+    def on_start(self, span: Any, parent_context: context.Context | None = None) -> None:
+        task_id = baggage.get_baggage(TASK_ID_KEY, parent_context)
+        if task_id is not None:
+            span.set_attribute(TASK_ID_KEY, str(task_id))
+
+
+class FileSpanExporter(SpanExporter):
+    """スパンを1行1件のJSONでファイルに追記するエクスポーター"""
+
+    def __init__(self, file_path: str):
+        self._file = open(file_path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
+        with self._lock:
+            for span in spans:
+                self._file.write(span.to_json(indent=None) + "\n")
+            self._file.flush()
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+def configure_tracing(
+    exporter: str,
+    service_name: str,
+    otlp_endpoint: str = "",
+    file_path: str = "",
+) -> TracerProvider | None:
+    """
+    トレースの出力先を設定する。exporter は none / otlp / file。
+    none の場合はプロバイダーを設定せず、スパンは作成されない(no-op)。
+    """
+    if exporter == "none":
+        return None
+    provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+    provider.add_span_processor(_TaskIdSpanProcessor())
+    provider.add_span_processor(
+        BatchSpanProcessor(_create_exporter(exporter, otlp_endpoint, file_path))
+    )
+    trace.set_tracer_provider(provider)
+    logger.info(f"トレースの出力を開始: {exporter}")
+    return provider
+
+
+def _create_exporter(exporter: str, otlp_endpoint: str, file_path: str) -> SpanExporter:
+    if exporter == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import (
+            OTLPSpanExporter,
+        )
+
+        return OTLPSpanExporter(endpoint=otlp_endpoint)
+    if exporter == "file":
+        return FileSpanExporter(file_path)
+    raise ValueError(f"不明なトレースの出力先: {exporter}")
+
+
+def inject_context() -> dict[str, str]:
+    """現在のトレースコンテキストをジョブのペイロードに保存できる形式で取り出す"""
+    carrier: dict[str, str] = {}
+    propagate.inject(carrier)
+    return carrier
+
+
+@contextmanager
+def task_context(task_id: str, carrier: dict[str, str] | None = None) -> Iterator[None]:
+    """
+    task_id をバゲージに設定したコンテキストでブロックを実行する。
+    carrier(inject_context の出力)を指定した場合は、そのトレースの続きとしてスパンを作成する。
+    """
+    ctx = propagate.extract(carrier) if carrier else context.get_current()
+    token = context.attach(baggage.set_baggage(TASK_ID_KEY, task_id, ctx))
+    try:
+        yield
+    finally:
+        context.detach(token)
+
+
+@contextmanager
+def detached_span(name: str) -> Iterator[trace.Span]:
+    """
+    現在のコンテキストに設定しないスパンでブロックを計測し、終了時に明示的に閉じる。
+    コンテキストを yield をまたいで保持しないため、非同期ジェネレーター内でも使える。
+    ブロックで発生した例外はスパンに記録する。
+    """
+    span = tracer.start_span(name)
+    try:
+        yield span
+    except Exception as e:
+        span.record_exception(e)
+        span.set_status(trace.Status(trace.StatusCode.ERROR, str(e)))
+        raise
+    finally:
+        span.end()
+
+
+def record_span(
+    name: str,
+    start_loop_time: float,
+    end_loop_time: float,
+    attributes: dict[str, Any] | None = None,
+) -> None:
+    """イベントループの時刻で計測済みの区間を、現在のコンテキストの子スパンとして記録する"""
+    offset_ns = time.time_ns() - int(asyncio.get_running_loop().time() * 1e9)
+    span = tracer.start_span(
+        name,
+        start_time=offset_ns + int(start_loop_time * 1e9),
+        attributes=attributes,
+    )
+    span.end(end_time=offset_ns + int(end_loop_time * 1e9))
@@ -0,0 +1,277 @@
+import struct
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Any, Iterator
+
+TICKS_PER_SECOND = 10_000_000
+
+# to_bytes の先頭に置くヘッダー(形式の識別子・フレーズ数・単語数)
+_BINARY_HEADER = struct.Struct("<4sII")
+_BINARY_MAGIC = b"TRS1"
+
+
+class Word:
+    """単語単位のタイムスタンプ"""
+    __slots__ = ("offset", "duration", "text")
+
+    def __init__(self, offset: int, duration: int, text: str):
+        self.offset = offset
+        self.duration = duration
+        self.text = text
+
+    @property
+    def start_seconds(self) -> float:
+        return self.offset / TICKS_PER_SECOND
+
+    @property
+    def end_seconds(self) -> float:
+        return (self.offset + self.duration) / TICKS_PER_SECOND
+
+
+class Phrase:
+    """認識フレーズ(オフセット・長さはSpeechのtick単位 = 100ナノ秒)"""
+    __slots__ = ("offset", "duration", "speaker", "confidence", "text", "words")
+
+    def __init__(
+        self,
+        offset: int,
+        duration: int,
+        speaker: int,
+        confidence: float,
+        text: str,
+        words: tuple[Word, ...] = (),
+    ):
+        self.offset = offset
+        self.duration = duration
+        self.speaker = speaker
+        self.confidence = confidence
+        self.text = text
+        self.words = words
+
+    @property
+    def start_seconds(self) -> float:
+        return self.offset / TICKS_PER_SECOND
+
+    @property
+    def end_seconds(self) -> float:
+        return (self.offset + self.duration) / TICKS_PER_SECOND
+
+
+class Transcript:
+    """
+    話者・タイムスタンプ付きの文字起こし結果。
+    フレーズの各項目は列ごとの配列で保持し、Phrase はアクセス時に生成する。
+    テキスト・話者ブロック・字幕などの出力はここから必要なときに生成する。
+    """
+
+    def __init__(self):
+        self._offsets = array("q")
+        self._durations = array("q")
+        self._speakers = array("i")
+        self._confidences = array("f")
+        self._texts: list[str] = []
+        # 単語はフラットな配列で持ち、_word_starts[i]〜_word_starts[i+1] がフレーズiの単語
+        self._word_starts = array("i", [0])
+        self._word_offsets = array("q")
+        self._word_durations = array("q")
+        self._word_texts: list[str] = []
+
+    @classmethod
+    def from_recognized_phrases(cls, recognized_phrases: list[dict[str, Any]]) -> "Transcript":
+        """Speechの recognizedPhrases から生成する(オフセット順に並べ替える)"""
+        transcript = cls()
+        for phrase in sorted(recognized_phrases, key=lambda p: p.get("offsetInTicks", 0)):
+            best = (phrase.get("nBest") or [{}])[0]
+            transcript.append(
+                Phrase(
+                    offset=int(phrase.get("offsetInTicks", 0)),
+                    duration=int(phrase.get("durationInTicks", 0)),
+                    speaker=phrase.get("speaker", 0),
+                    confidence=best.get("confidence", 0.0),
+                    text=best.get("display", ""),
+                    words=tuple(
+                        Word(
+                            int(w.get("offsetInTicks", 0)),
+                            int(w.get("durationInTicks", 0)),
+                            w.get("word", ""),
+                        )
+                        for w in best.get("words", [])
+                    ),
+                )
+            )
+        return transcript
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "Transcript":
+        """to_dict の出力から復元する"""
+        transcript = cls()
+        transcript._offsets = array("q", data["offsets"])
+        transcript._durations = array("q", data["durations"])
+        transcript._speakers = array("i", data["speakers"])
+        transcript._confidences = array("f", data["confidences"])
+        transcript._texts = list(data["texts"])
+        transcript._word_starts = array("i", data["word_starts"])
+        transcript._word_offsets = array("q", data["word_offsets"])
+        transcript._word_durations = array("q", data["word_durations"])
+        transcript._word_texts = list(data["word_texts"])
+        return transcript
+
+    def to_dict(self) -> dict[str, Any]:
+        """JSONで保存するための列形式の辞書に変換する"""
+        return {
+            "offsets": self._offsets.tolist(),
+            "durations": self._durations.tolist(),
+            "speakers": self._speakers.tolist(),
+            "confidences": [round(c, 4) for c in self._confidences],
+            "texts": self._texts,
+            "word_starts": self._word_starts.tolist(),
+            "word_offsets": self._word_offsets.tolist(),
+            "word_durations": self._word_durations.tolist(),
+            "word_texts": self._word_texts,
+        }
+
+    def to_bytes(self) -> bytes:
+        """
+        タスクストアに保存するためのバイナリ形式に変換する。
+        数値の列は配列のバイト列をそのまま連結し、テキストはUTF-8のバイト長の配列と本文を続ける。
+        配列はネイティブのバイト順のため、読み書きは同じ環境で行う前提とする。
+        """
+        texts = [text.encode() for text in self._texts]
+        word_texts = [text.encode() for text in self._word_texts]
+        lengths = array("I", [len(text) for text in texts])
+        lengths.extend(len(text) for text in word_texts)
+        return b"".join(
+            [
+                _BINARY_HEADER.pack(_BINARY_MAGIC, len(texts), len(word_texts)),
+                *(column.tobytes() for column in self._numeric_columns()),
+                lengths.tobytes(),
+                *texts,
+                *word_texts,
+            ]
+        )
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "Transcript":
+        """to_bytes の出力から復元する"""
+        magic, phrase_count, word_count = _BINARY_HEADER.unpack_from(data)
+        if magic != _BINARY_MAGIC:
+            raise ValueError("文字起こし結果の形式が不正です")
+        view = memoryview(data)
+        position = _BINARY_HEADER.size
+        transcript = cls()
+        counts = [phrase_count] * 4 + [phrase_count + 1, word_count, word_count]
+        for column, count in zip(transcript._numeric_columns(), counts):
+            del column[:]
+            size = column.itemsize * count
+            column.frombytes(view[position : position + size])
+            position += size
+        lengths = array("I")
+        size = lengths.itemsize * (phrase_count + word_count)
+        lengths.frombytes(view[position : position + size])
+        position += size
+        texts = []
+        for length in lengths:
+            texts.append(str(view[position : position + length], "utf-8"))
+            position += length
+        transcript._texts = texts[:phrase_count]
+        transcript._word_texts = texts[phrase_count:]
+        return transcript
+
+    def _numeric_columns(self) -> tuple[array, ...]:
+        """to_bytes / from_bytes で読み書きする数値の列(順序は固定)"""
+        return (
+            self._offsets,
+            self._durations,
+            self._speakers,
+            self._confidences,
+            self._word_starts,
+            self._word_offsets,
+            self._word_durations,
+        )
+
+    def append(self, phrase: Phrase) -> None:
+        """フレーズを末尾に追加する"""
+        self._offsets.append(phrase.offset)
+        self._durations.append(phrase.duration)
+        self._speakers.append(phrase.speaker)
+        self._confidences.append(phrase.confidence)
+        self._texts.append(phrase.text)
+        for word in phrase.words:
+            self._word_offsets.append(word.offset)
+            self._word_durations.append(word.duration)
+            self._word_texts.append(word.text)
+        self._word_starts.append(len(self._word_texts))
+
+    def __len__(self) -> int:
+        return len(self._texts)
+
+    def __iter__(self) -> Iterator[Phrase]:
+        for index in range(len(self)):
+            yield self.phrase(index)
+
+    def phrase(self, index: int) -> Phrase:
+        """index 番目のフレーズを取得する"""
+        start, end = self._word_starts[index], self._word_starts[index + 1]
+        return Phrase(
+            offset=self._offsets[index],
+            duration=self._durations[index],
+            speaker=self._speakers[index],
+            confidence=self._confidences[index],
+            text=self._texts[index],
+            words=tuple(
+                Word(self._word_offsets[i], self._word_durations[i], self._word_texts[i])
+                for i in range(start, end)
+            ),
+        )
+
+    def between(
+        self, start_seconds: float = 0.0, end_seconds: float | None = None
+    ) -> "Transcript":
+        """指定した時間範囲(秒)と重なるフレーズのみの文字起こしを返す。end_seconds がNoneなら末尾まで"""
+        start_ticks = int(start_seconds * TICKS_PER_SECOND)
+        # フレーズは重ならない前提で、開始位置の直前のフレーズから確認する
+        first = max(0, bisect_right(self._offsets, start_ticks) - 1)
+        last = (
+            len(self)
+            if end_seconds is None
+            else bisect_left(self._offsets, int(end_seconds * TICKS_PER_SECOND))
+        )
+        transcript = Transcript()
+        for index in range(first, last):
+            if self._offsets[index] + self._durations[index] > start_ticks:
+                transcript.append(self.phrase(index))
+        return transcript
+
+    def speaker_blocks(self) -> list[dict[str, Any]]:
+        """連続する同じ話者のフレーズをまとめたブロック(話者・開始秒・終了秒・テキスト)"""
+        blocks: list[dict[str, Any]] = []
+        for index in range(len(self)):
+            speaker = self._speakers[index]
+            end = (self._offsets[index] + self._durations[index]) / TICKS_PER_SECOND
+            if blocks and blocks[-1]["speaker"] == speaker:
+                blocks[-1]["lines"].append(self._texts[index])
+                blocks[-1]["end"] = end
+            else:
+                blocks.append(
+                    {
+                        "speaker": speaker,
+                        "start": self._offsets[index] / TICKS_PER_SECOND,
+                        "end": end,
+                        "lines": [self._texts[index]],
+                    }
+                )
+        return [
+            {
+                "speaker": b["speaker"],
+                "start": b["start"],
+                "end": b["end"],
+                "text": "\n".join(b["lines"]),
+            }
+            for b in blocks
+        ]
+
+    def to_text(self) -> str:
+        """[話者N] ブロック形式のテキストに変換する"""
+        return "\n\n".join(
+            f"[話者{block['speaker']}]\n{block['text']}" for block in self.speaker_blocks()
+        )
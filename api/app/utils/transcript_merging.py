@@ -0,0 +1,99 @@
+from collections import Counter
+from typing import Any
+
+from app.utils.transcript import TICKS_PER_SECOND
+
+
+def merge_segment_phrases(
+    segment_results: list[tuple[float, list[dict[str, Any]]]],
+) -> list[dict[str, Any]]:
+    """
+    区間ごとの認識結果(区間開始秒, recognizedPhrases)を1つの時系列に統合する。
+    各フレーズ・単語のオフセットを区間開始分ずらし、話者番号を全体で通しの番号に振り直す。
+    """
+    merged: list[dict[str, Any]] = []
+    previous_speakers: list[int] = []
+    last_global_speaker: int | None = None
+    next_speaker = 1
+
+    for segment_start, phrases in sorted(segment_results, key=lambda r: r[0]):
+        phrases = sorted(phrases, key=lambda p: p.get("offsetInTicks", 0))
+        mapping, next_speaker = _map_speakers(
+            phrases, previous_speakers, last_global_speaker, next_speaker
+        )
+        shift = int(segment_start * TICKS_PER_SECOND)
+
+        segment_merged = []
+        for phrase in phrases:
+            shifted = _shift_phrase(phrase, shift)
+            shifted["speaker"] = mapping.get(phrase.get("speaker", 0), 0)
+            segment_merged.append(shifted)
+
+        if segment_merged:
+            last_global_speaker = segment_merged[-1]["speaker"]
+            previous_speakers = _rank_speakers(segment_merged)
+        merged.extend(segment_merged)
+
+    merged.sort(key=lambda p: p.get("offsetInTicks", 0))
+    return merged
+
+
+def _map_speakers(
+    phrases: list[dict[str, Any]],
+    previous_speakers: list[int],
+    last_global_speaker: int | None,
+    next_speaker: int,
+) -> tuple[dict[int, int], int]:
+    """
+    区間内の話者番号を全体の話者番号に対応付ける(音声特徴を使わない推定)。
+    区間の最初の話者は直前区間の最後の話者と同一とみなし、
+    残りは発話時間の多い順に直前区間の話者へ順に割り当てる。
+    """
+    mapping: dict[int, int] = {}
+    local_ranked = _rank_speakers(phrases)
+    if not local_ranked:
+        return mapping, next_speaker
+
+    available = list(previous_speakers)
+    first_local = phrases[0].get("speaker", 0)
+    if last_global_speaker is not None:
+        mapping[first_local] = last_global_speaker
+        if last_global_speaker in available:
+            available.remove(last_global_speaker)
+
+    for local in local_ranked:
+        if local in mapping:
+            continue
+        if available:
+            mapping[local] = available.pop(0)
+        else:
+            mapping[local] = next_speaker
+            next_speaker += 1
+
+    next_speaker = max(next_speaker, max(mapping.values()) + 1)
+    return mapping, next_speaker
+
+
+def _rank_speakers(phrases: list[dict[str, Any]]) -> list[int]:
+    """発話時間の多い順に話者番号を並べる"""
+    durations: Counter = Counter()
+    for phrase in phrases:
+        durations[phrase.get("speaker", 0)] += phrase.get("durationInTicks", 0)
+    return [speaker for speaker, _ in durations.most_common()]
+
+
+def _shift_phrase(phrase: dict[str, Any], shift: int) -> dict[str, Any]:
+    """フレーズと単語のオフセットをずらしたコピーを返す"""
+    shifted = dict(phrase)
+    shifted["offsetInTicks"] = phrase.get("offsetInTicks", 0) + shift
+    shifted["nBest"] = [
+        {
+            **candidate,
+            "words": [
+                {**word, "offsetInTicks": word.get("offsetInTicks", 0) + shift}
+                for word in candidate.get("words", [])
+            ],
+        }
+        for candidate in phrase.get("nBest", [])
+    ]
+    return shifted
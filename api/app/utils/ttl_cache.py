@@ -0,0 +1,84 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable
+
+
+class AsyncTTLCache:
+    """
+    有効期限と件数上限を持つ非同期キャッシュ。
+    同じキーの読み込みが同時に要求された場合は1回の読み込みにまとめる。
+    読み込みに失敗した結果はキャッシュしない。
+    """
+
+    def __init__(self, ttl_seconds: float = 60.0, max_entries: int = 256):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._loading: dict[Hashable, asyncio.Task] = {}
+        # 破棄のたびに進め、読み込み中に破棄された古い値を保存しないようにする
+        self._epoch = 0
+        self._hits = 0
+        self._misses = 0
+        self._coalesced = 0
+
+    async def get_or_load(
+        self, key: Hashable, loader: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """キャッシュが有効ならその値を返し、なければ loader で読み込んで保存する"""
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry[1]
+
+        task = self._loading.get(key)
+        if task is None:
+            self._misses += 1
+            task = asyncio.create_task(self._load(key, loader))
+            self._loading[key] = task
+        else:
+            self._coalesced += 1
+        # 待機側がキャンセルされても、他の待機者のために読み込みは続ける
+        return await asyncio.shield(task)
+
+    def invalidate(self, key: Hashable) -> None:
+        """指定したキーのキャッシュを破棄する(読み込み中の結果も以降の要求には使わない)"""
+        self.invalidate_where(lambda k: k == key)
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]) -> None:
+        """条件に一致するキーのキャッシュをすべて破棄する"""
+        self._epoch += 1
+        for key in [k for k in self._entries if predicate(k)]:
+            del self._entries[key]
+        for key in [k for k in self._loading if predicate(k)]:
+            del self._loading[key]
+
+    def clear(self) -> None:
+        self.invalidate_where(lambda k: True)
+
+    def metrics(self) -> dict[str, Any]:
+        total = self._hits + self._misses
+        return {
+            "entries": len(self._entries),
+            "loading": len(self._loading),
+            "hits": self._hits,
+            "misses": self._misses,
+            "coalesced": self._coalesced,
+            "hit_ratio": self._hits / total if total else 0.0,
+        }
+
+    async def _load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        epoch = self._epoch
+        task = asyncio.current_task()
+        try:
+            value = await loader()
+            if self._epoch == epoch:
+                self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            return value
+        finally:
+            if self._loading.get(key) is task:
+                del self._loading[key]
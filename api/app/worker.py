@@ -0,0 +1,37 @@
+import asyncio
+import logging
+import signal
+from types import SimpleNamespace
+
+from app.di.app_state import init_app_state, close_app_state
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    handlers=[logging.StreamHandler()],
+)
+
+logger = logging.getLogger(__name__)
+
+
+async def main() -> None:
+    """
+    ジョブワーカー専用プロセスのエントリポイント。
+    JOB_WORKER_MODE=external のAPIプロセスがキューに追加したジョブを処理する。
+    """
+    state = SimpleNamespace()
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    try:
+        await init_app_state(state, run_workers=True, serves_api=False)
+        logger.info("ジョブワーカープロセスを起動しました")
+        await stop_event.wait()
+    finally:
+        await close_app_state(state)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,103 @@
+"""
+大きなファイルのBlobアップロード中にイベントループの遅延を計測するベンチマーク
+
+Azurite(ローカルのBlobエミュレータ)を起動した状態で実行する:
+    docker run -p 10000:10000 mcr.microsoft.com/azure-storage/azurite azurite-blob --blobHost 0.0.0.0
+    python -m benchmarks.blob_upload_event_loop_latency --size-mb 256
+
+--mode sync は従来の同期SDKをイベントループ上で直接呼んだ場合の比較用。
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+from azure.storage.blob import BlobServiceClient as SyncBlobServiceClient
+
+from app.infrastructure.az_blob import AzBlobClient
+
+AZURITE_CONNECTION = (
+    "DefaultEndpointsProtocol=http;AccountName=devstoreaccount1;"
+    "AccountKey=Eby8vdM02xNOcqFlqUwJPLlmEtlCDXJ1OUzFT50uSRZ6IFsuFq2UVErCz4I6tq"
+    "/K1SZFPTOtr/KBHBeksoGMGw==;BlobEndpoint=http://127.0.0.1:10000/devstoreaccount1;"
+)
+TICK_INTERVAL = 0.01
+
+
+async def _measure_loop_lag(stop: asyncio.Event, lags: list[float]) -> None:
+    """一定間隔でsleepし、予定時刻からの遅れを記録する"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + TICK_INTERVAL
+        await asyncio.sleep(TICK_INTERVAL)
+        lags.append(max(0.0, loop.time() - expected))
+
+
+async def _upload_async(args: argparse.Namespace, data: bytes) -> None:
+    client = AzBlobClient(
+        az_blob_connection=args.connection,
+        az_container_name=args.container,
+        block_size=args.block_size_mb * 1024 * 1024,
+        max_concurrency=args.concurrency,
+    )
+    try:
+        await client.upload_blob("benchmark.bin", data)
+        await client.delete_blob("benchmark.bin")
+    finally:
+        await client.close()
+
+
+async def _upload_sync(args: argparse.Namespace, data: bytes) -> None:
+    # 変更前の実装と同じく、同期SDKをasync関数内から直接呼ぶ
+    service = SyncBlobServiceClient.from_connection_string(args.connection)
+    container = service.get_container_client(args.container)
+    container.get_blob_client("benchmark.bin").upload_blob(data, overwrite=True)
+    container.delete_blob("benchmark.bin")
+
+
+async def run(args: argparse.Namespace) -> None:
+    data = os.urandom(args.size_mb * 1024 * 1024)
+    container = SyncBlobServiceClient.from_connection_string(
+        args.connection
+    ).get_container_client(args.container)
+    if not container.exists():
+        container.create_container()
+
+    stop = asyncio.Event()
+    lags: list[float] = []
+    ticker = asyncio.create_task(_measure_loop_lag(stop, lags))
+    await asyncio.sleep(0.1)
+
+    upload = _upload_async if args.mode == "async" else _upload_sync
+    started = time.perf_counter()
+    await upload(args, data)
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await ticker
+
+    lags_ms = sorted(lag * 1000 for lag in lags) or [0.0]
+    p99 = lags_ms[min(len(lags_ms) - 1, int(len(lags_ms) * 0.99))]
+    print(f"mode={args.mode} size={args.size_mb}MB elapsed={elapsed:.2f}s")
+    print(
+        f"event loop lag: samples={len(lags)} "
+        f"p50={statistics.median(lags_ms):.1f}ms p99={p99:.1f}ms max={lags_ms[-1]:.1f}ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--mode", choices=["async", "sync"], default="async")
+    parser.add_argument("--size-mb", type=int, default=256)
+    parser.add_argument("--block-size-mb", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument(
+        "--connection", default=os.getenv("AZ_BLOB_CONNECTION", AZURITE_CONNECTION)
+    )
+    parser.add_argument("--container", default="benchmark")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
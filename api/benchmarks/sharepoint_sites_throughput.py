@@ -0,0 +1,180 @@
+"""
+/sites のスループット(requests/sec)を従来方式と共有クライアント方式で比較するベンチマーク
+
+Graph APIとトークンエンドポイントはローカルのスタブ(遅延を指定可能)で代用する:
+    python -m benchmarks.sharepoint_sites_throughput --requests 500 --concurrency 20
+
+legacy は従来と同じく、リクエストごとに同期HTTPでトークンを取得してからサイト一覧を取得する
+(スレッドプールで実行される同期ルート)。
+shared はアプリ全体で共有する MsSharePointClient(aiohttp、トークンキャッシュ)を使う非同期ルート。
+"""
+import argparse
+import asyncio
+import statistics
+import threading
+import time
+from contextlib import asynccontextmanager
+
+import aiohttp
+import requests
+import uvicorn
+from aiohttp import web
+from fastapi import FastAPI, Request
+
+from app.infrastructure.ms_sharepoint import MsSharePointClient
+from app.routers import sharepoint_router
+
+TENANT_ID = "tenant"
+
+
+def _create_graph_stub(token_latency: float, graph_latency: float) -> web.Application:
+    """トークンエンドポイントとGraph APIのスタブ"""
+    counts = {"token": 0, "sites": 0}
+
+    async def token(request: web.Request) -> web.Response:
+        counts["token"] += 1
+        await asyncio.sleep(token_latency)
+        return web.json_response({"access_token": "stub-token", "expires_in": 3600})
+
+    async def sites(request: web.Request) -> web.Response:
+        counts["sites"] += 1
+        await asyncio.sleep(graph_latency)
+        return web.json_response(
+            {"value": [{"id": f"site-{i}", "name": f"site{i}"} for i in range(20)]}
+        )
+
+    app = web.Application()
+    app["counts"] = counts
+    app.router.add_post(f"/{TENANT_ID}/oauth2/v2.0/token", token)
+    app.router.add_get("/v1.0/sites", sites)
+    return app
+
+
+def _create_api(stub_url: str) -> FastAPI:
+    """legacy と shared の2種類の /sites を持つAPI"""
+
+    class _Factory:
+        def __init__(self, client: MsSharePointClient):
+            self._client = client
+
+        def create_ms_sharepoint_client(self) -> MsSharePointClient:
+            return self._client
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        async with aiohttp.ClientSession() as session:
+            app.state.az_client_factory = _Factory(
+                MsSharePointClient(
+                    session=session,
+                    client_id="client",
+                    client_secret="secret",
+                    tenant_id=TENANT_ID,
+                    graph_endpoint=f"{stub_url}/v1.0",
+                    authority_host=stub_url,
+                )
+            )
+            yield
+
+    app = FastAPI(lifespan=lifespan)
+
+    @app.get("/legacy/sites")
+    def legacy_sites() -> dict:
+        token = requests.post(
+            f"{stub_url}/{TENANT_ID}/oauth2/v2.0/token",
+            data={"grant_type": "client_credentials"},
+        ).json()["access_token"]
+        return requests.get(
+            f"{stub_url}/v1.0/sites", headers={"Authorization": f"Bearer {token}"}
+        ).json()
+
+    @app.get("/shared/sites")
+    async def shared_sites(request: Request) -> dict:
+        return await sharepoint_router.get_sites(request)
+
+    return app
+
+
+def _run_in_thread(coro_factory) -> None:
+    thread = threading.Thread(target=lambda: asyncio.run(coro_factory()), daemon=True)
+    thread.start()
+
+
+async def _serve_stub(app: web.Application, port: int) -> None:
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    await asyncio.Event().wait()
+
+
+async def _load(url: str, total: int, concurrency: int) -> tuple[float, list[float]]:
+    """total 件のリクエストを concurrency 並列で送信し、所要時間と各レイテンシを返す"""
+    latencies: list[float] = []
+    queue: asyncio.Queue = asyncio.Queue()
+    for _ in range(total):
+        queue.put_nowait(None)
+
+    async with aiohttp.ClientSession() as session:
+
+        async def worker() -> None:
+            while not queue.empty():
+                queue.get_nowait()
+                started = time.perf_counter()
+                async with session.get(url) as response:
+                    await response.read()
+                    response.raise_for_status()
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        return time.perf_counter() - started, latencies
+
+
+async def _wait_until_ready(url: str) -> None:
+    async with aiohttp.ClientSession() as session:
+        for _ in range(100):
+            try:
+                async with session.get(url):
+                    return
+            except aiohttp.ClientError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError(f"起動しませんでした: {url}")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--token-latency", type=float, default=0.05)
+    parser.add_argument("--graph-latency", type=float, default=0.02)
+    parser.add_argument("--stub-port", type=int, default=18080)
+    parser.add_argument("--api-port", type=int, default=18000)
+    args = parser.parse_args()
+
+    stub_url = f"http://127.0.0.1:{args.stub_port}"
+    api_url = f"http://127.0.0.1:{args.api_port}"
+    stub = _create_graph_stub(args.token_latency, args.graph_latency)
+    _run_in_thread(lambda: _serve_stub(stub, args.stub_port))
+    server = uvicorn.Server(
+        uvicorn.Config(_create_api(stub_url), port=args.api_port, log_level="warning")
+    )
+    _run_in_thread(server.serve)
+    await _wait_until_ready(f"{api_url}/docs")
+
+    for mode in ("legacy", "shared"):
+        before = dict(stub["counts"])
+        elapsed, latencies = await _load(
+            f"{api_url}/{mode}/sites", args.requests, args.concurrency
+        )
+        token_calls = stub["counts"]["token"] - before["token"]
+        print(
+            f"{mode:7s} {args.requests / elapsed:8.1f} req/s "
+            f"p50={statistics.median(latencies) * 1000:6.1f}ms "
+            f"p95={statistics.quantiles(latencies, n=20)[-1] * 1000:6.1f}ms "
+            f"token_requests={token_calls}"
+        )
+
+    server.should_exit = True
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
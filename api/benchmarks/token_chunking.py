@@ -0,0 +1,97 @@
+"""
+2時間分の話者付き文字起こしテキストのチャンク分割を計測するベンチマーク
+
+    python -m benchmarks.token_chunking --minutes 120 --repeat 5
+
+legacy は毎回エンコーダを読み込み、全文をエンコードしてトークン単位で切る従来の方式。
+speaker は起動時に読み込んだエンコーダで話者ブロック単位に詰める方式。
+"""
+import argparse
+import random
+import statistics
+import time
+
+import tiktoken
+
+from app.utils.token_chunking import get_encoding, split_speaker_blocks
+
+PHRASES = [
+    "本日の議題は来期の予算案についてです。",
+    "前回の会議で出た課題を確認させてください。",
+    "その件については担当部署と調整中です。",
+    "スケジュールが少し厳しいかもしれません。",
+    "資料の三ページ目をご覧ください。",
+    "はい、承知しました。",
+    "コストの見積もりをもう一度見直す必要があると思います。",
+    "次回までに具体的な数字を出します。",
+]
+# 日本語の会話は1分あたりおよそ300文字
+CHARS_PER_MINUTE = 300
+
+
+def _generate_transcript(minutes: int, speakers: int, seed: int) -> str:
+    """[話者N] ブロック形式のダミー文字起こしを生成する"""
+    rng = random.Random(seed)
+    blocks = []
+    total_chars = 0
+    while total_chars < minutes * CHARS_PER_MINUTE:
+        lines = [rng.choice(PHRASES) for _ in range(rng.randint(1, 6))]
+        block = f"[話者{rng.randint(1, speakers)}]\n" + "\n".join(lines)
+        blocks.append(block)
+        total_chars += len(block)
+    return "\n\n".join(blocks)
+
+
+def _legacy_split(text: str, max_tokens: int) -> list[str]:
+    encoding = tiktoken.encoding_for_model("gpt-4o")
+    tokens = encoding.encode(text)
+    return [
+        encoding.decode(tokens[i : i + max_tokens])
+        for i in range(0, len(tokens), max_tokens)
+    ]
+
+
+def _measure(name: str, func, repeat: int) -> list[str]:
+    durations = []
+    chunks: list[str] = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        chunks = func()
+        durations.append(time.perf_counter() - started)
+    broken = sum("�" in c for c in chunks)
+    print(
+        f"{name:8s} chunks={len(chunks):4d} "
+        f"median={statistics.median(durations) * 1000:8.1f}ms "
+        f"max={max(durations) * 1000:8.1f}ms broken_chars={broken}"
+    )
+    return chunks
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--minutes", type=int, default=120)
+    parser.add_argument("--speakers", type=int, default=4)
+    parser.add_argument("--max-tokens", type=int, default=7500)
+    parser.add_argument("--overlap-tokens", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    text = _generate_transcript(args.minutes, args.speakers, args.seed)
+    started = time.perf_counter()
+    get_encoding()
+    print(f"encoder load: {(time.perf_counter() - started) * 1000:.1f}ms")
+    print(f"transcript: {len(text)} chars, {len(get_encoding().encode(text))} tokens")
+
+    _measure("legacy", lambda: _legacy_split(text, args.max_tokens), args.repeat)
+    _measure(
+        "speaker",
+        lambda: split_speaker_blocks(
+            text, args.max_tokens, overlap_tokens=args.overlap_tokens
+        ),
+        args.repeat,
+    )
+
+
+if __name__ == "__main__":
+    main()
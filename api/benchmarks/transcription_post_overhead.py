@@ -0,0 +1,163 @@
+"""
+POST /transcription のリクエストあたりのオーバーヘッドを計測するベンチマーク
+
+外部サービスには接続しない(ジョブは登録のみでワーカーは起動しない):
+    python -m benchmarks.transcription_post_overhead --requests 500 --concurrency 20
+
+legacy は従来と同じく、リクエストごとに Blob / OpenAI / SharePoint のクライアントを生成してから処理する。
+shared はアプリ起動時に生成した AzClientFactory のクライアントを共有する(現在の実装)。
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+import aiohttp
+import uvicorn
+
+# 必須の環境変数はダミー値で補う(実際の接続は行わない)
+_work_dir = tempfile.mkdtemp(prefix="benchmark-")
+for _name, _value in {
+    "AZ_SPEECH_KEY": "key",
+    "AZ_SPEECH_ENDPOINT": "http://127.0.0.1:9",
+    "AZ_OPENAI_KEY": "key",
+    "AZ_OPENAI_ENDPOINT": "http://127.0.0.1:9",
+    "AZ_BLOB_CONNECTION": (
+        "DefaultEndpointsProtocol=http;AccountName=devstoreaccount1;"
+        "AccountKey=Eby8vdM02xNOcqFlqUwJPLlmEtlCDXJ1OUzFT50uSRZ6IFsuFq2UVErCz4I6tq"
+        "/K1SZFPTOtr/KBHBeksoGMGw==;BlobEndpoint=http://127.0.0.1:10000/devstoreaccount1;"
+    ),
+    "CLIENT_ID": "client",
+    "CLIENT_SECRET": "secret",
+    "TENANT_ID": "tenant",
+    "JOB_WORKER_MODE": "external",
+    "JOB_QUEUE_PATH": os.path.join(_work_dir, "jobs.sqlite3"),
+    "TASK_STORE_PATH": os.path.join(_work_dir, "tasks.sqlite3"),
+    "CONTENT_CACHE_PATH": "",
+}.items():
+    os.environ.setdefault(_name, _value)
+
+from app.infrastructure.az_blob import AzBlobClient  # noqa: E402
+from app.infrastructure.az_openai import AzOpenAIClient  # noqa: E402
+from app.infrastructure.ms_sharepoint import MsSharePointClient  # noqa: E402
+from app.main import app  # noqa: E402
+
+
+class _PerRequestClients:
+    """/legacy 配下のリクエストごとに従来と同じクライアントを生成してから本来のルートに渡す"""
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith("/legacy/"):
+            return await app(scope, receive, send)
+        config = app.state.config
+        clients = [
+            AzBlobClient(
+                az_blob_connection=config.AZ_BLOB_CONNECTION,
+                az_container_name=config.AZ_CONTAINER_NAME,
+            ),
+            AzOpenAIClient(
+                az_openai_key=config.AZ_OPENAI_KEY,
+                az_openai_endpoint=config.AZ_OPENAI_ENDPOINT,
+            ),
+            MsSharePointClient(
+                session=app.state.session,
+                client_id=config.CLIENT_ID,
+                client_secret=config.CLIENT_SECRET,
+                tenant_id=config.TENANT_ID,
+            ),
+        ]
+        path = scope["path"][len("/legacy"):]
+        try:
+            await app(dict(scope, path=path, raw_path=path.encode()), receive, send)
+        finally:
+            for client in clients:
+                await client.close()
+
+
+def _drain_jobs() -> None:
+    """登録されたジョブと一時ファイルを片付ける"""
+    job_queue = app.state.job_queue
+    while (job := job_queue.claim("benchmark", 60)) is not None:
+        try:
+            os.remove(job["payload"]["file_path"])
+        except OSError:
+            pass
+        job_queue.complete(job["job_id"])
+
+
+async def _load(
+    url: str, total: int, concurrency: int, payload: bytes
+) -> tuple[float, list[float]]:
+    """total 件のPOSTを concurrency 並列で送信し、所要時間と各レイテンシを返す"""
+    latencies: list[float] = []
+    queue: asyncio.Queue = asyncio.Queue()
+    for _ in range(total):
+        queue.put_nowait(None)
+
+    async with aiohttp.ClientSession() as session:
+
+        async def worker() -> None:
+            while not queue.empty():
+                queue.get_nowait()
+                form = aiohttp.FormData()
+                form.add_field("file", payload, filename="audio.mp3")
+                started = time.perf_counter()
+                async with session.post(url, data=form) as response:
+                    await response.read()
+                    response.raise_for_status()
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        return time.perf_counter() - started, latencies
+
+
+async def _wait_until_ready(url: str) -> None:
+    async with aiohttp.ClientSession() as session:
+        for _ in range(100):
+            try:
+                async with session.get(url):
+                    return
+            except aiohttp.ClientError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError(f"起動しませんでした: {url}")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--payload-kb", type=int, default=64)
+    parser.add_argument("--port", type=int, default=18001)
+    args = parser.parse_args()
+
+    api_url = f"http://127.0.0.1:{args.port}"
+    server = uvicorn.Server(
+        uvicorn.Config(_PerRequestClients(), port=args.port, log_level="warning")
+    )
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    await _wait_until_ready(f"{api_url}/docs")
+
+    payload = os.urandom(args.payload_kb * 1024)
+    for mode in ("legacy", "shared"):
+        prefix = "/legacy" if mode == "legacy" else ""
+        elapsed, latencies = await _load(
+            f"{api_url}{prefix}/transcription", args.requests, args.concurrency, payload
+        )
+        _drain_jobs()
+        print(
+            f"{mode:7s} {args.requests / elapsed:8.1f} req/s "
+            f"p50={statistics.median(latencies) * 1000:6.1f}ms "
+            f"p95={statistics.quantiles(latencies, n=20)[-1] * 1000:6.1f}ms"
+        )
+
+    server.should_exit = True
+    thread.join()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())